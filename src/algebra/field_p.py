@@ -1,3 +1,6 @@
+from array import array
+from itertools import izip
+
 def is_field_p_element(f, p = None):
     """
     >>> is_field_p_element(field_p(5)(3),5)
@@ -58,17 +61,18 @@ def field_p(p):
     2
     """
     
-    assert isinstance(p,int)
-    assert p >= 2
-    for i in range(2, p-1):
-        assert p % i, "field_p(%d): %d is not prime" % (p,p)
-    
     if not _field_cache.has_key(p):
-        _field_cache[p] = type('field_%d' % p, (_field_p,), dict(p=p))
+        assert isinstance(p,int)
+        assert p >= 2
+        i = 2
+        while i * i <= p:
+            assert p % i, "field_p(%d): %d is not prime" % (p,p)
+            i += 1
 
-    return _field_cache[p]
+        _field_cache[p] = type('field_%d' % p, (_field_p,),
+                               dict(p=p, _inverses=None))
 
-_division_cache = {}
+    return _field_cache[p]
 
 class _field_p(object):
     @classmethod
@@ -83,6 +87,20 @@ class _field_p(object):
     def elements(cls):
         return [cls(x) for x in range(cls.p)]
 
+    @classmethod
+    def inverses(cls):
+        """
+        Table of the inverses of 1, ..., p - 1 (index 0 is unused),
+        computed once per p using Fermat's little theorem.
+
+        >>> field_p(7).inverses()
+        [0, 1, 4, 5, 2, 3, 6]
+        """
+        if cls._inverses is None:
+            cls._inverses = [0] + [pow(x, cls.p - 2, cls.p)
+                                   for x in range(1, cls.p)]
+        return cls._inverses
+
     @classmethod
     def type_name(cls):
         return "field_p(%d)" % cls.p
@@ -100,16 +118,13 @@ class _field_p(object):
         return self.x
 
     def __add__(self,other):
-        assert isinstance(other,_field_p)
-        assert self.p==other.p
+        assert type(other) is type(self)
         return type(self)((self.x + other.x) % self.p)
     def __sub__(self,other):
-        assert isinstance(other,_field_p)
-        assert self.p==other.p
+        assert type(other) is type(self)
         return type(self)((self.x - other.x) % self.p)
     def __mul__(self,other):
-        assert isinstance(other,_field_p)
-        assert self.p==other.p
+        assert type(other) is type(self)
         return type(self)((self.x * other.x) % self.p)
     def __neg__(self):
         return type(self)((-self.x) % self.p)
@@ -120,6 +135,8 @@ class _field_p(object):
         else:
             assert isinstance(other,int)
             return (self.x-other) % self.p == 0
+    def __nonzero__(self):
+        return self.x != 0
     def __repr__(self):
         return "field_p(%d)(%d)" % (self.p,self.x)
     def __str__(self):
@@ -128,19 +145,204 @@ class _field_p(object):
         return hash((self.x,self.p))
 
     def __div__(self,other):
-        assert isinstance(other,_field_p)
-        assert self.p==other.p
-        assert not other.x % self.p == 0
-        if not _division_cache.has_key(self.p):
-            _division_cache[self.p]=range(self.p)
-            for i in range(1,self.p):
-                for j in range(1,self.p):
-                    if i * j % self.p == 1:
-                        _division_cache[self.p][i]=type(self)(j)
-        return _division_cache[self.p][other.x % self.p]*self
-        
+        assert type(other) is type(self)
+        assert not other.x == 0
+        return type(self)(self.x * self.inverses()[other.x] % self.p)
+
     def get_p(self):
         return self.p
 
     def __int__(self):
         return self.x % self.p
+
+class FieldPVector(object):
+    """
+    A vector over Z/p stored as an array of ints x with 0 <= x < p.
+
+    >>> v = FieldPVector(5, [1, 2, 3])
+    >>> w = FieldPVector(5, [field_p(5)(4), 4, 4])
+    >>> v + w
+    FieldPVector(5, [0, 1, 2])
+    >>> v - w
+    FieldPVector(5, [2, 3, 4])
+    >>> v.scale(2)
+    FieldPVector(5, [2, 4, 1])
+    >>> v.dot(w)
+    field_p(5)(4)
+    >>> v[2]
+    field_p(5)(3)
+    >>> v.to_list()
+    [field_p(5)(1), field_p(5)(2), field_p(5)(3)]
+    """
+
+    def __init__(self, p, values):
+        self.p = p
+        self.values = array('l', [ int(x) % p for x in values ])
+
+    @classmethod
+    def _from_array(cls, p, values):
+        v = cls.__new__(cls)
+        v.p = p
+        v.values = values
+        return v
+
+    def field(self):
+        return field_p(self.p)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.field()(self.values[i])
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self):
+        field = self.field()
+        return [ field(x) for x in self.values ]
+
+    def __eq__(self, other):
+        return self.p == other.p and self.values == other.values
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "FieldPVector(%d, %s)" % (self.p, list(self.values))
+
+    def __add__(self, other):
+        assert self.p == other.p and len(self) == len(other)
+        p = self.p
+        return FieldPVector._from_array(
+            p, array('l', [ (x + y) % p
+                            for x, y in izip(self.values, other.values) ]))
+
+    def __sub__(self, other):
+        assert self.p == other.p and len(self) == len(other)
+        p = self.p
+        return FieldPVector._from_array(
+            p, array('l', [ (x - y) % p
+                            for x, y in izip(self.values, other.values) ]))
+
+    def __neg__(self):
+        p = self.p
+        return FieldPVector._from_array(
+            p, array('l', [ -x % p for x in self.values ]))
+
+    def scale(self, c):
+        c = int(c)
+        p = self.p
+        return FieldPVector._from_array(
+            p, array('l', [ c * x % p for x in self.values ]))
+
+    def dot(self, other):
+        assert self.p == other.p and len(self) == len(other)
+        return self.field()(
+            sum([ x * y for x, y in izip(self.values, other.values) ])
+            % self.p)
+
+class FieldPMatrix(object):
+    """
+    A matrix over Z/p with each row stored as an array of ints x with
+    0 <= x < p.
+
+    >>> from algebra.matrix import matrix
+    >>> m = FieldPMatrix.from_matrix(matrix([[1, 2], [3, 4], [0, 1]],
+    ...                                     field_p(5)))
+    >>> m.no_rows(), m.no_columns()
+    (3, 2)
+    >>> m * FieldPVector(5, [1, 1])
+    FieldPVector(5, [3, 2, 1])
+    >>> m * [2, 1]
+    FieldPVector(5, [4, 0, 1])
+    >>> m.transpose() * m
+    FieldPMatrix(5, [[0, 4], [4, 1]])
+    >>> m.to_matrix()
+    matrix([
+            [ 1, 2],
+            [ 3, 4],
+            [ 0, 1]
+           ], the_type = field_p(5))
+    """
+
+    def __init__(self, p, values, no_columns = None):
+        self.p = p
+        self.rows = [ array('l', [ int(x) % p for x in row ])
+                      for row in values ]
+        if no_columns is None:
+            if self.rows:
+                no_columns = len(self.rows[0])
+            else:
+                no_columns = 0
+        self._no_columns = no_columns
+
+        for row in self.rows:
+            assert len(row) == no_columns
+
+    # converts an algebra.matrix.matrix with entries in field_p(p)
+    @classmethod
+    def from_matrix(cls, m):
+        assert is_field_p_class(m.the_type)
+        return cls(m.the_type.p, m.values, m.no_columns())
+
+    def to_matrix(self):
+        from algebra.matrix import matrix
+        return matrix([ list(row) for row in self.rows ], field_p(self.p))
+
+    def field(self):
+        return field_p(self.p)
+
+    def no_rows(self):
+        return len(self.rows)
+
+    def no_columns(self):
+        return self._no_columns
+
+    def __eq__(self, other):
+        return (self.p == other.p and
+                self._no_columns == other._no_columns and
+                self.rows == other.rows)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "FieldPMatrix(%d, %s)" % (
+            self.p, [ list(row) for row in self.rows ])
+
+    def transpose(self):
+        return FieldPMatrix(self.p,
+                            [ [ row[j] for row in self.rows ]
+                              for j in range(self._no_columns) ],
+                            len(self.rows))
+
+    # multiplication with a FieldPMatrix, FieldPVector or a list of ints or
+    # field_p elements
+    def __mul__(self, other):
+        p = self.p
+
+        if isinstance(other, FieldPMatrix):
+            assert self.p == other.p
+            assert self._no_columns == other.no_rows()
+            result = []
+            for row in self.rows:
+                r = [ 0 ] * other._no_columns
+                for x, other_row in izip(row, other.rows):
+                    if x:
+                        for j, y in enumerate(other_row):
+                            r[j] += x * y
+                result.append(r)
+            return FieldPMatrix(p, result, other._no_columns)
+
+        if isinstance(other, FieldPVector):
+            assert self.p == other.p
+            values = other.values
+        else:
+            values = [ int(x) for x in other ]
+
+        assert self._no_columns == len(values)
+
+        return FieldPVector._from_array(
+            p, array('l', [ sum([ x * y for x, y in izip(row, values) ]) % p
+                            for row in self.rows ]))
@@ -0,0 +1,210 @@
+from algebra.field_p import field_p
+from algebra.matrix import matrix
+
+class GF2Matrix(object):
+    """
+    Represents a matrix over Z/2. Each row is stored as a python int whose
+    bit j is the entry in column j, so adding rows is a single XOR.
+
+    >>> from algebra.matrix import matrix
+    >>> m = GF2Matrix.from_matrix(matrix([[1, 1, 0], [0, -1, 1]], int))
+    >>> m
+    GF2Matrix([
+            [ 1, 1, 0],
+            [ 0, 1, 1]
+           ])
+    >>> m.transpose()
+    GF2Matrix([
+            [ 1, 0],
+            [ 1, 1],
+            [ 0, 1]
+           ])
+    >>> m * m.transpose()
+    GF2Matrix([
+            [ 0, 1],
+            [ 1, 0]
+           ])
+    >>> m * [1, 1, 1]
+    [0, 0]
+    >>> m.to_matrix()
+    matrix([
+            [ 1, 1, 0],
+            [ 0, 1, 1]
+           ], the_type = field_p(2))
+    """
+
+    def __init__(self, rows, no_columns):
+        self.rows = list(rows)
+        self._no_columns = no_columns
+
+    # converts an algebra.matrix.matrix with int or field_p(2) entries
+    @classmethod
+    def from_matrix(cls, m):
+        rows = [ list_to_bits(r) for r in m.values ]
+        if m.values:
+            no_columns = len(m.values[0])
+        else:
+            no_columns = 0
+        return cls(rows, no_columns)
+
+    # converts an algebra.sparse_matrix.SparseMatrix with int or
+    # field_p(2) entries
+    @classmethod
+    def from_sparse_matrix(cls, m):
+        rows = []
+        for row in m.rows:
+            bits = 0
+            for j, x in row.iteritems():
+                if int(x) % 2:
+                    bits |= 1 << j
+            rows.append(bits)
+        return cls(rows, m.no_columns())
+
+    def to_matrix(self):
+        return matrix([ self.row(i) for i in range(self.no_rows()) ],
+                      field_p(2))
+
+    # the entries of row i as list of 0 and 1
+    def row(self, i):
+        return bits_to_list(self.rows[i], self._no_columns)
+
+    def no_rows(self):
+        return len(self.rows)
+
+    def no_columns(self):
+        return self._no_columns
+
+    def __eq__(self, other):
+        return (self._no_columns == other._no_columns and
+                self.rows == other.rows)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return ("GF2Matrix(["
+                + "\n        "
+                + ",\n        ".join(
+                    [ '[ ' + ', '.join([ str(x) for x in self.row(i) ]) + ']'
+                      for i in range(self.no_rows()) ])
+                + "\n       ])")
+
+    def transpose(self):
+        rows = [ 0 ] * self._no_columns
+        for i, r in enumerate(self.rows):
+            bit = 1 << i
+            for j in set_bits(r):
+                rows[j] |= bit
+        return GF2Matrix(rows, len(self.rows))
+
+    # multiplication with a GF2Matrix or a vector given as list of ints or
+    # field_p(2) elements, the result for a vector is a list of 0 and 1
+    def __mul__(self, other):
+        if isinstance(other, GF2Matrix):
+            assert self._no_columns == other.no_rows()
+            return GF2Matrix([ combine_rows(other.rows, r)
+                               for r in self.rows ],
+                             other._no_columns)
+
+        assert self._no_columns == len(other)
+        v = list_to_bits(other)
+        return [ parity(r & v) for r in self.rows ]
+
+    def row_echelon_form(self, start_row = 0):
+        """
+        The analogue of algebra.homology.reduced_row_echelon_form with the
+        same choice of pivots and row operations.
+
+        Returns (rows, A, Ainv_transpose) as lists of rows such that rows
+        is A * self in row echelon form (except for the first start_row
+        rows) and Ainv_transpose is the transpose of the inverse of A.
+
+        >>> m = GF2Matrix([1, 3, 2], 2)
+        >>> rows, A, AinvT = m.row_echelon_form()
+        >>> GF2Matrix(rows, 2)
+        GF2Matrix([
+                [ 1, 0],
+                [ 0, 1],
+                [ 0, 0]
+               ])
+        >>> GF2Matrix(A, 3) * m == GF2Matrix(rows, 2)
+        True
+        >>> GF2Matrix(A, 3) * GF2Matrix(AinvT, 3).transpose() == (
+        ...     GF2Matrix([1, 2, 4], 3))
+        True
+        """
+
+        rows = list(self.rows)
+        n = len(rows)
+        A = [ 1 << i for i in range(n) ]
+        AinvT = [ 1 << i for i in range(n) ]
+
+        current_row = start_row
+        current_column = 0
+
+        while current_row < n and current_column < self._no_columns:
+            bit = 1 << current_column
+
+            if not rows[current_row] & bit:
+                for r in range(current_row + 1, n):
+                    if rows[r] & bit:
+                        rows[current_row], rows[r] = rows[r], rows[current_row]
+                        A[current_row], A[r] = A[r], A[current_row]
+                        AinvT[current_row], AinvT[r] = (
+                            AinvT[r], AinvT[current_row])
+                        break
+
+            if rows[current_row] & bit:
+                pivot_row = rows[current_row]
+                pivot_A = A[current_row]
+                for j in range(current_row + 1, n):
+                    if rows[j] & bit:
+                        rows[j] ^= pivot_row
+                        A[j] ^= pivot_A
+                        AinvT[current_row] ^= AinvT[j]
+                current_row += 1
+
+            current_column += 1
+
+        return rows, A, AinvT
+
+### Helper functions
+
+def list_to_bits(values):
+    """
+    >>> list_to_bits([1, 0, 1, 1])
+    13
+    """
+    bits = 0
+    for j, x in enumerate(values):
+        if int(x) % 2:
+            bits |= 1 << j
+    return bits
+
+def bits_to_list(bits, length):
+    """
+    >>> bits_to_list(13, 5)
+    [1, 0, 1, 1, 0]
+    """
+    return [ 1 if (bits >> j) & 1 else 0 for j in range(length) ]
+
+# the indices of the bits set in bits
+def set_bits(bits):
+    """
+    >>> list(set_bits(13))
+    [0, 2, 3]
+    """
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+# XOR of the rows selected by the bits of selection
+def combine_rows(rows, selection):
+    result = 0
+    for i in set_bits(selection):
+        result ^= rows[i]
+    return result
+
+def parity(bits):
+    return bin(bits).count('1') % 2
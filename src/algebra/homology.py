@@ -1,5 +1,16 @@
 import random
+from itertools import izip
 from matrix import *
+from field_p import field_p, is_field_p_class
+from gf2_matrix import GF2Matrix, combine_rows, bits_to_list
+import sparse_matrix
+from sparse_matrix import SparseMatrix
+
+import globalsettings
+
+# If set, the base changes computed when eliminating are checked by
+# multiplying the matrices, this is expensive
+globalsettings.registerSetting("checkMatrixIdentities", False)
 
 def non_zero_column(m,j):
     zero=m.the_type.zero()
@@ -22,45 +33,64 @@ def reduced_row_echelon_form(m,start_row=0):
     mA is in reduced row echelon form
     """
 
-
-    A=identity_matrix(m.no_rows(),m.the_type)
-    Ainv=identity_matrix(m.no_rows(),m.the_type)
-    m=matrix(m)
+    one = m.the_type.one()
+    zero = m.the_type.zero()
+    no_rows = m.no_rows()
+    no_columns = m.no_columns()
+
+    def identity_rows():
+        return [[one if i==j else zero for j in range(no_rows)]
+                for i in range(no_rows)]
+
+    # each row holds the row of mA followed by the row of A so that
+    # every row operation is applied to both at once. The inverse of A is
+    # changed by column operations which are row operations on its
+    # transpose.
+    rows = [r + a for r, a in zip(m.values, identity_rows())]
+    AinvT = identity_rows()
     
     current_row=start_row
     current_column=0
 
-    while current_row < m.no_rows() and current_column < m.no_columns():
+    while current_row < no_rows and current_column < no_columns:
         
-        if m.values[current_row][current_column]==0:
-            for r in range(current_row+1, m.no_rows()):
-                if not m.values[r][current_column]==0:
-                    m.swap_rows(current_row, r)
-                    A.swap_rows(current_row, r)
-                    Ainv.swap_columns(r, current_row)
+        if rows[current_row][current_column]==0:
+            for r in range(current_row+1, no_rows):
+                if not rows[r][current_column]==0:
+                    rows[current_row], rows[r] = rows[r], rows[current_row]
+                    AinvT[current_row], AinvT[r] = AinvT[r], AinvT[current_row]
                     break
                 
-        if m.values[current_row][current_column] == 0:
+        if rows[current_row][current_column] == 0:
             current_column += 1
 
         else:
-            t = m.the_type.one() / m.values[current_row][current_column]
-            m.multiply_row(current_row, t)
-            A.multiply_row(current_row, t)
-            Ainv.multiply_column(current_row, m.the_type.one() / t)
+            t = one / rows[current_row][current_column]
+            pivot_row = [t * x for x in rows[current_row]]
+            rows[current_row] = pivot_row
+            s = one / t
+            AinvT[current_row] = [s * x for x in AinvT[current_row]]
             
-            for j in range(current_row+1, m.no_rows()):
-                t = -m.values[j][current_column]
-                m.add_to_row_p_times_row(j, t, current_row)
-                A.add_to_row_p_times_row(j, t, current_row)
-                Ainv.add_to_column_p_times_column(current_row, -t, j)
+            for j in range(current_row+1, no_rows):
+                if rows[j][current_column] == 0:
+                    continue
+                t = -rows[j][current_column]
+                rows[j] = [x + t * y for x, y in izip(rows[j], pivot_row)]
+                p = -t
+                AinvT[current_row] = [x + p * y for x, y in
+                                      izip(AinvT[current_row], AinvT[j])]
 
             current_column+=1
             current_row+=1
 
-    assert A * Ainv == identity_matrix(m.no_rows(),m.the_type)
+    mA = matrix._from_values([r[:no_columns] for r in rows], m.the_type)
+    A = matrix._from_values([r[no_columns:] for r in rows], m.the_type)
+    Ainv = matrix._from_values(AinvT, m.the_type).transpose()
 
-    return m, A, Ainv
+    if globalsettings.getSetting("checkMatrixIdentities"):
+        assert A * Ainv == identity_matrix(no_rows,m.the_type)
+
+    return mA, A, Ainv
 
 def transpose_reduced_row_echelon_form(m, start_column=0):
     m, A, Ainv = reduced_row_echelon_form(m.transpose(), start_column)
@@ -141,12 +171,13 @@ def base_change_chain_complex(d2, d1): # such that d1 * d2 = 0
     inv_base = base_2_inv * base_1
     base = base_1_inv * base_2
 
-    assert d2_n1 == base_1 * d2
-    assert d1 * d2 == d1_n1 * d2_n1
-    assert d1_n2 == d1_n1 * base_2
-    assert d1 * d2 == d1_n2 * d2_n2
-    assert d2_n2 == inv_base * d2
-    assert d1_n2 == d1 * base 
+    if globalsettings.getSetting("checkMatrixIdentities"):
+        assert d2_n1 == base_1 * d2
+        assert d1 * d2 == d1_n1 * d2_n1
+        assert d1_n2 == d1_n1 * base_2
+        assert d1 * d2 == d1_n2 * d2_n2
+        assert d2_n2 == inv_base * d2
+        assert d1_n2 == d1 * base 
 
     return d2_n2, d1_n2, base, inv_base
 
@@ -251,8 +282,48 @@ def homology_generators(d2, d1, as_matrix_with_column_vectors = False):
     ...     for i in d1 * h:
     ...         if not i == Fraction(0, 1):
     ...             raise Exception  
+
+    Over Z/2, the computation is done with GF2Matrix and gives the same
+    result.
+
+    >>> field = field_p(2)
+    >>> d2, d1 = generate_test_example_homology_generators(field,6,12,20,3,4)
+    >>> H = homology_generators(d2, d1)
+    >>> len(H)
+    4
+    >>> H == _homology_generators_generic(d2, d1)
+    True
+    >>> homology_generators(GF2Matrix.from_matrix(d2),
+    ...                     GF2Matrix.from_matrix(d1)) == H
+    True
+
+    SparseMatrix uses sparse elimination, again with the same result.
+
+    >>> d2, d1 = generate_test_example_homology_generators(Fraction,5,10,15,3,2)
+    >>> homology_generators(SparseMatrix.from_matrix(d2),
+    ...                     SparseMatrix.from_matrix(d1)) == (
+    ...     homology_generators(d2, d1))
+    True
     """
-    
+
+    if isinstance(d1, GF2Matrix) or is_field_p_class(d1.the_type, 2):
+        the_type = field_p(2)
+        elements = [ the_type(0), the_type(1) ]
+        gens = [ [ elements[x] for x in g ]
+                 for g in _homology_generators_gf2(d2, d1) ]
+    elif isinstance(d1, SparseMatrix):
+        the_type = d1.the_type
+        gens = _homology_generators_sparse(d2, d1)
+    else:
+        the_type = d1.the_type
+        gens = _homology_generators_generic(d2, d1)
+
+    if as_matrix_with_column_vectors:
+        return matrix(gens, the_type).transpose()
+    else:
+        return gens
+
+def _homology_generators_generic(d2, d1):
     gens=[]
     
     n_d2, n_d1, base, base_inv = base_change_chain_complex(d2, d1)
@@ -261,9 +332,83 @@ def homology_generators(d2, d1, as_matrix_with_column_vectors = False):
         if (not non_zero_column(n_d1, i)) and (not non_zero_row(n_d2, i)):
             gens.append([r[i] for r in base.values])
 
-    if as_matrix_with_column_vectors:
-        return matrix(gens, d1.the_type).transpose()
-    else:
-        return gens
+    return gens
+
+def _homology_generators_gf2(d2, d1):
+    """
+    homology_generators over Z/2 for GF2Matrix or field_p(2) matrices
+    d2 and d1, the representatives are returned as lists of 0 and 1.
+
+    This follows base_change_chain_complex step by step, with the
+    inverse base changes kept as transposes so that all operations are
+    XORs of rows.
+    """
+
+    d2 = _to_gf2_matrix(d2)
+    d1 = _to_gf2_matrix(d1)
+
+    dim = d2.no_rows()
+
+    # d2_n1 = base_1 * d2
+    d2_n1, base_1, base_1_inv_t = d2.row_echelon_form()
+    dim_img_d2 = len([ r for r in d2_n1 if r ])
+
+    # d1_n1 = d1 * base_1_inv, its transpose is base_1_inv^t * d1^t
+    d1_t = d1.transpose().rows
+    d1_n1_t = GF2Matrix([ combine_rows(d1_t, r) for r in base_1_inv_t ],
+                        d1.no_rows())
+
+    # d1_n2 = d1_n1 * base_2 with base_2 the transpose of A
+    d1_n2_t, A, Ainv_t = d1_n1_t.row_echelon_form(dim_img_d2)
+
+    gens = []
+    for i in range(dim):
+        # column i of d1_n2 is zero
+        if d1_n2_t[i]:
+            continue
+        # row i of d2_n2 = base_2_inv * d2_n1 is zero
+        if combine_rows(d2_n1, Ainv_t[i]):
+            continue
+        # column i of base = base_1_inv * base_2
+        gens.append(bits_to_list(combine_rows(base_1_inv_t, A[i]), dim))
+
+    return gens
 
     
+
+def _to_gf2_matrix(m):
+    if isinstance(m, GF2Matrix):
+        return m
+    if isinstance(m, SparseMatrix):
+        return GF2Matrix.from_sparse_matrix(m)
+    return GF2Matrix.from_matrix(m)
+
+def _homology_generators_sparse(d2, d1):
+    """
+    homology_generators for SparseMatrix d2 and d1, organized like
+    _homology_generators_gf2.
+    """
+
+    dim = d2.no_rows()
+    zero = d1.the_type.zero()
+
+    d2_n1, base_1, base_1_inv_t = d2.row_echelon_form()
+    dim_img_d2 = len([ r for r in d2_n1 if r ])
+
+    d1_t = d1.transpose().rows
+    d1_n1_t = SparseMatrix(
+        [ sparse_matrix.combine_rows(d1_t, r) for r in base_1_inv_t ],
+        d1.no_rows(), d1.the_type)
+
+    d1_n2_t, A, Ainv_t = d1_n1_t.row_echelon_form(dim_img_d2)
+
+    gens = []
+    for i in range(dim):
+        if d1_n2_t[i]:
+            continue
+        if sparse_matrix.combine_rows(d2_n1, Ainv_t[i]):
+            continue
+        gen = sparse_matrix.combine_rows(base_1_inv_t, A[i])
+        gens.append([ gen.get(j, zero) for j in range(dim) ])
+
+    return gens
@@ -1,4 +1,5 @@
 import re
+import cStringIO
 from algebra.polynomial import Polynomial
 
 def quote_string(s):
@@ -58,17 +59,31 @@ def ideal_to_magma(polys, term_order):
           x * z>;
     <BLANKLINE>
     """
-    return (  "P<%s> := " % ", ".join(term_order)
-            + "  PolynomialRing(RationalField(), %d);\n" % len(term_order)
-            + "I := ideal<P |\n"
-            +    "      "
-            + ",\n      ".join(map(str, polys))
-            + ">;\n")
+    buffer = cStringIO.StringIO()
+    write_ideal_to_magma(buffer, polys, term_order)
+    return buffer.getvalue()
+
+def write_ideal_to_magma(stream, polys, term_order):
+    """
+    Like ideal_to_magma but writes to stream (e.g., a file) one polynomial
+    at a time instead of building the whole string.
+    """
+    stream.write("P<%s> := " % ", ".join(term_order))
+    stream.write("  PolynomialRing(RationalField(), %d);\n" % len(term_order))
+    stream.write("I := ideal<P |\n")
+    stream.write("      ")
+    for i, poly in enumerate(polys):
+        if i:
+            stream.write(",\n      ")
+        poly.writeMagma(stream)
+    stream.write(">;\n")
 
 
 def get_term_order(polys, pre_vars = [], post_vars = []):
-    all_vars = sum([p.variables() for p in polys], [])
-    sort_vars = set(all_vars) - set(pre_vars) - set(post_vars)
+    all_vars = set()
+    for p in polys:
+        all_vars.update(p.variables())
+    sort_vars = all_vars - set(pre_vars) - set(post_vars)
     sort_vars = list(sort_vars)
     sort_vars.sort()
 
@@ -98,13 +113,22 @@ def primary_decomposition(polys, term_order):
     <BLANKLINE>
     print "CPUTIME          :", Cputime(cputime);
     """
-    
-    return (  ideal_to_magma(polys, term_order) + "\n\n"
-            + 'cputime := Cputime();\n'
-            + 'print "PRIMARY=DECOMPOSITION=BEGINS=HERE";\n'
-            + "PrimaryDecomposition(I);\n"
-            + 'print "PRIMARY=DECOMPOSITION=ENDS=HERE";\n\n\n'
-            + 'print "CPUTIME          :", Cputime(cputime);')
+    buffer = cStringIO.StringIO()
+    write_primary_decomposition(buffer, polys, term_order)
+    return buffer.getvalue()
+
+def write_primary_decomposition(stream, polys, term_order):
+    """
+    Like primary_decomposition but writes to stream (e.g., a file).
+    """
+    write_ideal_to_magma(stream, polys, term_order)
+    stream.write(  "\n\n"
+                 + 'cputime := Cputime();\n'
+                 + 'print "PRIMARY=DECOMPOSITION=BEGINS=HERE";\n'
+                 + "PrimaryDecomposition(I);\n"
+                 + 'print "PRIMARY=DECOMPOSITION=ENDS=HERE";\n\n\n'
+                 + 'print "CPUTIME          :", Cputime(cputime);')
+
 
 def ideal_to_magma_curve(polys, term_order):
     return (  "A<%s> := " % ", ".join(term_order)
@@ -140,15 +164,15 @@ class PrimeIdeal(list):
             numberOfPoints = self.numberOfPoints)
             
 def processEndOfLineBackslashes(s_with_backslash):
-    s=""
+    lines = []
     for line in s_with_backslash.split('\n'):
         line=line.strip()
         if line and line[-1]=='\\':
             line=line[0:-1]
         else:
             line=line+' '
-        s = s + line
-    return s
+        lines.append(line)
+    return "".join(lines)
 
 def parse_primary_decomposition(s_with_backslash):
     """
@@ -1,3 +1,5 @@
+from itertools import izip
+
 def identity_matrix(size,the_type):
     return matrix([[the_type.one() if i==j else the_type.zero()
                     for j in range(size)]
@@ -34,25 +36,34 @@ class matrix(object):
            ], the_type = polynomial)
     
     """
-    def _add_rows(x):
-        return reduce(lambda x,y:map(lambda x,y:x+y,x,y),x)
+    # product of matrices given as lists of rows, each row of the result
+    # is accumulated from the rows of n skipping zero entries of m (those
+    # for which bool is False)
+    @staticmethod
     def _mult(m,n):
-        def mult_vec_mat(x,m=n): 
-            return matrix._add_rows(
-                   map(
-                         lambda x,y:map(lambda x,y=y:x*y,x),
-                         m,x
-                      ) 
-                                   )
-        return map(mult_vec_mat,m)
-    _mult = staticmethod(_mult)
-    _add_rows = staticmethod(_add_rows)
+        result = []
+        for row in m:
+            r = [ y * row[0] for y in n[0] ]
+            for x, n_row in izip(row[1:], n[1:]):
+                if x:
+                    r = [ z + y * x for z, y in izip(r, n_row) ]
+            result.append(r)
+        return result
+
+    # constructs a matrix from a list of rows without converting the
+    # entries to the_type
+    @classmethod
+    def _from_values(cls, values, the_type):
+        m = matrix.__new__(cls)
+        m.values = values
+        m.the_type = the_type
+        return m
 
     def __init__(self,values,the_type=None):
         
         if isinstance(values,matrix):
             if the_type==None:
-                self.values=[[x for x in y] for y in values.values]
+                self.values=[list(y) for y in values.values]
                 self.the_type=values.the_type
             else:
                 self.values=[[the_type(x) for x in y] for y in values.values]
@@ -73,28 +84,25 @@ class matrix(object):
     def __mul__(self,other):
         if isinstance(other,matrix):
             assert self.no_columns() == other.no_rows()            
-            return matrix(matrix._mult(self.values,other.values),self.the_type)
+            return matrix._from_values(matrix._mult(self.values,other.values),
+                                       self.the_type)
         if isinstance(other,list):
             assert self.no_columns() == len(other)
             if len(other)== 0:
                 return []
-            def inner_product(v1,v2=other):
-                return reduce(lambda x, y: x+y,
-                              map(lambda x, y: x*y, v1,v2))
-            return map(inner_product,self.values)
+            def inner_product(row):
+                r = row[0] * other[0]
+                for x, y in izip(row[1:], other[1:]):
+                    r = r + x * y
+                return r
+            return [inner_product(row) for row in self.values]
         return other.__matrix_action__(self)
     def __add__(self,other):
-        new_values=[[None for x in y] for y in self.values]
-        for i in range(len(self.values)):
-            for j in range(len(self.values[0])):
-                new_values[i][j]=self.values[i][j]+other.values[i][j]
-        return matrix(new_values)
+        return matrix([[x+y for x, y in izip(r1, r2)]
+                       for r1, r2 in izip(self.values, other.values)])
     def __sub__(self,other):
-        new_values=[[None for x in y] for y in self.values]
-        for i in range(len(self.values)):
-            for j in range(len(self.values[0])):
-                new_values[i][j]=self.values[i][j]-other.values[i][j]
-        return matrix(new_values)
+        return matrix([[x-y for x, y in izip(r1, r2)]
+                       for r1, r2 in izip(self.values, other.values)])
         
     def __eq__(self,other):
         if other==None:
@@ -169,9 +177,8 @@ class matrix(object):
         if len(self.values) == 0:
             return matrix([[]],
                           self.the_type)
-        return matrix([[self.values[j][i] for j in range(len(self.values))]
-                       for i in range(len(self.values[0]))],
-                      self.the_type)
+        return matrix._from_values([list(c) for c in zip(*self.values)],
+                                   self.the_type)
 
     def swap_columns(self,i,j):
         for r in self.values:
@@ -189,12 +196,12 @@ class matrix(object):
             r[j]=r[j]+p*r[i]
 
     def add_to_row_p_times_row(self,j,p,i):
-        self.values[j]=[self.values[j][t]+p*self.values[i][t]
-                        for t in range(len(self.values[i]))]
+        self.values[j]=[x+p*y for x, y in izip(self.values[j],
+                                               self.values[i])]
 
     def multiply_column(self,i,p):
-        for t in range(len(self.values)):
-            self.values[t][i]=p*self.values[t][i]
+        for r in self.values:
+            r[i]=p*r[i]
 
     def multiply_row(self,i,p):
         self.values[i]=[p*t for t in self.values[i]]
@@ -46,7 +46,7 @@ def getReducedPolynomial(p, timeout = None):
     assert isinstance(p, Polynomial)
     
     return Polynomial.parseFromMagma(
-        pari_eval("polredabs(%s)" % p.printMagma(), timeout))
+        pari_eval("polredabs(%s)" % p.printPari(), timeout))
 
 _precision = 0
 _error = 0
@@ -1,9 +1,17 @@
 import re
+import heapq
+import cStringIO
 import operator
-from fractions import Fraction
+import weakref
+from fractions import Fraction, gcd
 
 from utilities import basicAlgorithms
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ###############################################################
 ### Default functions for parsing and printing the coefficients
 
@@ -54,6 +62,100 @@ def uncomparablePrintCoefficientMethod(i):
     else:
         return '+', printStr
 
+###########################################################
+### Interned variable table and packed exponent vectors
+
+### Every variable name is interned once and gets a small integer index.
+### The variables and exponents of a monomial are stored as a key, which
+### is a tuple of packed integers (index << _EXPONENT_BITS) | exponent
+### sorted by index. Since the index sits in the high bits, sorting the
+### packed integers sorts by variable index.
+###
+### A polynomial is a dictionary key -> coefficient. Multiplying two
+### monomials merges their keys, adding two polynomials merges the
+### dictionaries. The canonical order (by variable names and exponents)
+### used for printing is only computed when it is actually needed.
+
+_EXPONENT_BITS = 32
+_EXPONENT_MASK = (1 << _EXPONENT_BITS) - 1
+
+_variableNames = []
+_variableIndices = {}
+
+def _internVariable(var):
+    index = _variableIndices.get(var)
+    if index is None:
+        index = len(_variableNames)
+        _variableNames.append(var)
+        _variableIndices[var] = index
+    return index
+
+def _varsToKey(vars):
+    # vars is a tuple of pairs (variableName, exponent)
+    return tuple(sorted([(_internVariable(var) << _EXPONENT_BITS) | expo
+                         for var, expo in vars]))
+
+# the canonical order of monomials is the order of the tuples returned here
+def _keyToVars(key):
+    return tuple(sorted([(_variableNames[k >> _EXPONENT_BITS],
+                          k & _EXPONENT_MASK)
+                         for k in key]))
+
+def _keyDegree(key):
+    return sum([k & _EXPONENT_MASK for k in key])
+
+# returns a pair
+# * dictionary variable index -> maximal exponent of the variable
+# * total degree
+# for a dictionary key -> coefficient
+def _termsDegrees(terms):
+    variableDegrees = {}
+    degree = 0
+    for key in terms:
+        keyDegree = 0
+        for k in key:
+            index, expo = k >> _EXPONENT_BITS, k & _EXPONENT_MASK
+            if variableDegrees.get(index, 0) < expo:
+                variableDegrees[index] = expo
+            keyDegree += expo
+        if degree < keyDegree:
+            degree = keyDegree
+    return variableDegrees, degree
+
+def _mulKeys(key1, key2):
+    """
+    Multiplies two monomials given as keys, i.e. adds exponent vectors.
+
+    >>> x, y = _varsToKey((('x', 1),)), _varsToKey((('y', 2),))
+    >>> _keyToVars(_mulKeys(_mulKeys(x, y), x))
+    (('x', 2), ('y', 2))
+    """
+
+    if not key1:
+        return key2
+    if not key2:
+        return key1
+
+    return _normalizedKey(key1 + key2)
+
+# turns a sequence of packed integers into a key, i.e., sorts them and
+# adds the exponents of entries belonging to the same variable
+def _normalizedKey(packed):
+    if not packed:
+        return ()
+
+    merged = sorted(packed)
+
+    # combine consecutive entries belonging to the same variable
+    result = [merged[0]]
+    for k in merged[1:]:
+        if (k >> _EXPONENT_BITS) == (result[-1] >> _EXPONENT_BITS):
+            result[-1] += k & _EXPONENT_MASK
+        else:
+            result.append(k)
+
+    return tuple(result)
+
 #######################################################
 ### Public Definitions of Monomial and Polynomial class
 
@@ -65,6 +167,9 @@ def uncomparablePrintCoefficientMethod(i):
 
 class Monomial(object):
 
+    # Monomials are immutable, the hash is computed when first needed
+    __slots__ = ('_coefficient', '_vars', '_key', '_hash', '__weakref__')
+
     # Construct a monomial with a single variable given as string
     @classmethod
     def fromVariableName(cls, var):
@@ -101,6 +206,20 @@ class Monomial(object):
                 assert expo > 0
             self._vars = vars
 
+        self._key = _varsToKey(self._vars)
+        self._hash = None
+
+    # Constructs a monomial from a coefficient and a key, see
+    # the description of the interned variable table above
+    @classmethod
+    def _fromKey(cls, coefficient, key):
+        monomial = Monomial.__new__(Monomial)
+        monomial._coefficient = coefficient
+        monomial._vars = _keyToVars(key)
+        monomial._key = key
+        monomial._hash = None
+        return monomial
+
     def __repr__(self):
         return "Monomial(%s, %s)" % (repr(self._coefficient),
                                     repr(self._vars))
@@ -162,12 +281,9 @@ class Monomial(object):
         coefficient = _operatorTypePolicy(
             self._coefficient, other._coefficient, operator.mul)
 
-        # Compute the variables
-        varDict = basicAlgorithms.combineDicts(
-            [dict(self._vars),dict(other._vars)],
-            operator.add)
-
-        return Monomial(coefficient, varDict)
+        # Compute the variables by adding the exponent vectors
+        return Monomial._fromKey(coefficient,
+                                 _mulKeys(self._key, other._key))
 
     def __pow__(self, other):
         
@@ -183,7 +299,7 @@ class Monomial(object):
         return (self * self) ** (other/2)
     # Negate a monomial
     def __neg__(self):
-        return Monomial(-self._coefficient, self._vars)
+        return Monomial._fromKey(-self._coefficient, self._key)
 
     # Check whether two monomials are equal
     def __eq__(self,other):
@@ -192,12 +308,34 @@ class Monomial(object):
 
         return (
             self._coefficient == other._coefficient and
-            self._vars == other._vars)
+            self._key == other._key)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self._coefficient, self._key))
+        return self._hash
+
+    # Returns the canonical instance of all monomials equal to this one
+    # which are still alive
+    def intern(self):
+        """
+        >>> m = Monomial(2, (('a', 2),))
+        >>> Monomial(2, (('a', 2),)).intern() is m.intern()
+        True
+        """
+        key = (self._coefficient, self._key)
+        canonical = _internedMonomials.get(key)
+        if canonical is None:
+            _internedMonomials[key] = canonical = self
+        return canonical
 
     def convertCoefficient(self, conversionFunction):
-        return Monomial(
+        return Monomial._fromKey(
             conversionFunction(self._coefficient),
-            self._vars)
+            self._key)
 
     def degree(self):
         return sum([expo for var, expo in self._vars])
@@ -270,8 +408,24 @@ class Polynomial(object):
 
     #>>> str(Polynomial.parseFromMagma('4+3*x').makeMonic())
     #'(4/3) + x'
+
+    Polynomials are immutable and hashable:
+
+    >>> len(set([p1, p2, p3, p4]))
+    2
+    >>> p1.intern() is p2.intern()
+    True
     """
 
+    # The dictionary of terms is never changed after construction,
+    # the hash and the monomials in canonical order are computed
+    # when first needed.
+    # The variables and degrees are computed at construction or carried
+    # forward by the operators, see _setTerms.
+    __slots__ = ('_terms', '_canonicalMonomials', '_hash',
+                 '_variableDegrees', '_degree', '_variables',
+                 '__weakref__')
+
     # construct a constant polynomial
     @classmethod
     def constantPolynomial(cls,constant):
@@ -286,48 +440,118 @@ class Polynomial(object):
 
     def __init__(self, monomials = ()):
 
-        # combine monomials with the same variables and exponents
-        # and bring them into canonical order
+        # combine monomials with the same variables and exponents,
+        # the canonical order is only computed when needed
 
         assert isinstance(monomials, tuple)
 
-        # create for each monomial a dictionary
-        # with key being the variables and exponents
+        # dictionary with key being the packed exponent vector
         # and value being the coefficient
+        terms = {}
+        for monomial in monomials:
+            _addTerm(terms, monomial._key, monomial._coefficient)
 
-        listOfVarsCoeffDicts = [
-            { monomial.getVars() : monomial.getCoefficient() }
-            for monomial in monomials]
+        self._setTerms(terms)
 
-        # combine the dictionaries using sum
-        combinedVarsCoeffDict = basicAlgorithms.combineDicts(
-            listOfVarsCoeffDicts,
-            _operatorTypePolicy)
+    # constructs a polynomial from a dictionary key -> coefficient
+    # the dictionary is not copied
+    # degrees is an optional pair (variableDegrees, degree), see _setTerms
+    @classmethod
+    def _fromTerms(cls, terms, degrees = None):
+        polynomial = Polynomial.__new__(Polynomial)
+        polynomial._setTerms(terms, degrees)
+        return polynomial
+
+    # degrees is a pair
+    # * dictionary variable index -> maximal exponent of that variable
+    # * total degree
+    # valid for the terms before the trivial monomials are removed.
+    # It is only used if no monomial was removed, otherwise the
+    # degrees are computed from the terms.
+    def _setTerms(self, terms, degrees = None):
+
+        # skip trivial monomials
+        trivialKeys = [key for key, coefficient in terms.items()
+                       if not _coefficientIsNonTrivial(coefficient)]
+        for key in trivialKeys:
+            del terms[key]
+
+        if trivialKeys or degrees is None:
+            degrees = _termsDegrees(terms)
+
+        self._terms = terms
+        self._canonicalMonomials = None
+        self._hash = None
+
+        self._variableDegrees, self._degree = degrees
+        self._variables = [ _variableNames[index]
+                            for index in self._variableDegrees ]
+        self._variables.sort()
+
+    # the monomials in canonical order, computed lazily
+    @property
+    def _monomials(self):
+        if self._canonicalMonomials is None:
+            keys = self._terms.keys()
+            keys.sort(key = _keyToVars)
+            self._canonicalMonomials = tuple(
+                [Monomial._fromKey(self._terms[key], key) for key in keys])
+        return self._canonicalMonomials
 
-        # turn dictionary into a list of pairs (vars, coefficient)
-        # in canonical order
-        orderedTupleOfVarsCoeffPairs = (
-            basicAlgorithms.dictToOrderedTupleOfPairs(combinedVarsCoeffDict))
+    def __eq__(self, other):
+        return self._terms == other._terms
 
-        # turn pairs into monomials, skip trivial monomials
-        combinedMonomials = [
-            Monomial(coefficient, vars)
-            for vars, coefficient in orderedTupleOfVarsCoeffPairs
-            if _coefficientIsNonTrivial(coefficient)]
+    def __ne__(self, other):
+        return not self == other
 
-        # convert to tuple
-        self._monomials = tuple(combinedMonomials)
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._terms.iteritems()))
+        return self._hash
 
-    def __eq__(self, other):
-        return self._monomials == other._monomials
+    # Returns the canonical instance of all polynomials equal to this one
+    # which are still alive
+    def intern(self):
+        """
+        >>> import gc
+        >>> def count():
+        ...     return len([ p for p in _internedPolynomials.values()
+        ...                  if p.variables() == ['t'] ])
+        >>> ps = [ Polynomial((Monomial(k, (('t', 1),)),)).intern()
+        ...        for k in range(2, 1002) ]
+        >>> count()
+        1000
+        >>> del ps
+        >>> _ = gc.collect()
+        >>> count()
+        0
+        """
+        key = frozenset(self._terms.iteritems())
+        canonical = _internedPolynomials.get(key)
+        if canonical is None:
+            _internedPolynomials[key] = canonical = self
+        return canonical
 
     def __add__(self, other):
         assert isinstance(other, Polynomial)
-        return Polynomial(self._monomials + other._monomials)
+        terms = dict(self._terms)
+        for key, coefficient in other._terms.iteritems():
+            _addTerm(terms, key, coefficient)
+
+        # without cancellation, the degrees are the maxima
+        variableDegrees = dict(self._variableDegrees)
+        for index, expo in other._variableDegrees.iteritems():
+            if variableDegrees.get(index, 0) < expo:
+                variableDegrees[index] = expo
+
+        return Polynomial._fromTerms(
+            terms, (variableDegrees, max(self._degree, other._degree)))
 
     def __neg__(self):
-        return Polynomial(
-            tuple([-monomial for monomial in self._monomials]))
+        return Polynomial._fromTerms(
+            dict([(key, -coefficient)
+                  for key, coefficient in self._terms.iteritems()]),
+            (self._variableDegrees, self._degree))
 
     def __sub__(self, other):
         return self + (-other)
@@ -349,40 +573,41 @@ class Polynomial(object):
         return (self * self) ** (other/2)
 
     def __mul__(self, other):
-        monomials = []
-        
-        for m in self._monomials:
-            for n in other._monomials:
-                monomials.append(m * n)
-                
-        return Polynomial(tuple(monomials))
+        terms = _mulTerms(self._terms, other._terms,
+                          self._variableDegrees, other._variableDegrees)
+
+        if not terms:
+            return Polynomial._fromTerms(terms)
+
+        # The product of the monomials of highest degree in a variable
+        # (or of highest total degree) is a term of the product. So without
+        # cancellation, the degrees add up.
+        variableDegrees = dict(self._variableDegrees)
+        for index, expo in other._variableDegrees.iteritems():
+            variableDegrees[index] = variableDegrees.get(index, 0) + expo
+
+        return Polynomial._fromTerms(
+            terms, (variableDegrees, self._degree + other._degree))
 
     def __mod__(self, other):
-        
-#        print "mod", str(self), str(other)
+
+        # the remainder is computed by the dense univariate
+        # representation
+        from algebra.univariatePolynomial import UnivariatePolynomial
 
         assert isinstance(other, Polynomial)
         assert self.isUnivariate()
         assert other.isUnivariate()
         self.coefficientType(Fraction)
         other = other.convertCoefficients(Fraction)
-        other = other * Polynomial.constantPolynomial(
-            Fraction(1,1) / other.leadingCoefficient())
 
         variable = other.variables()[0]
-        assert ((not other.variables()) 
-                or other.variables()[0] == variable)
-
-        rest = self
-        while rest.degree() >= other.degree():
-            degreeDiff = rest.degree() - other.degree()
-            leadingCoeff = rest.leadingCoefficient()
-            rest = rest - (
-                Polynomial.constantPolynomial(leadingCoeff)
-                * Polynomial.fromVariableName(variable) ** degreeDiff
-                * other)
-
-        return rest
+        assert ((not self.variables())
+                or self.variables()[0] == variable)
+
+        return (UnivariatePolynomial.fromPolynomial(self, variable) %
+                UnivariatePolynomial.fromPolynomial(other, variable)
+                ).toPolynomial()
         
     def __str__(self):
         return self.printMagma()
@@ -395,88 +620,159 @@ class Polynomial(object):
 
     def printMagma(self,
                    printCoefficientMethod = defaultPrintCoefficientMethod):
-        s = " ".join([monomial.printMagma(printCoefficientMethod,
-                                          forcePrintSign = True)
-                      for monomial in self._monomials])
-        if s and s[0] == '+':
-            return s[1:].lstrip()
-        return s
+        buffer = cStringIO.StringIO()
+        self.writeMagma(buffer, printCoefficientMethod)
+        return buffer.getvalue()
+
+    # writes the polynomial using magma printing conventions to stream,
+    # e.g., a file or a StringIO, without building the whole string
+    def writeMagma(self, stream,
+                   printCoefficientMethod = defaultPrintCoefficientMethod):
+        """
+        >>> import sys
+        >>> p = Polynomial.parseFromMagma('- x^2 * y + 3 * x - 1')
+        >>> p.writeMagma(sys.stdout)
+        - 1 + 3 * x - x^2 * y
+        """
+
+        write = stream.write
+        first = True
+
+        for monomial in self._monomials:
+            coefficientSign, coefficientStr = (
+                printCoefficientMethod(monomial._coefficient))
+
+            v = [ _variablePowerString(var, expo)
+                  for var, expo in monomial._vars ]
+            if coefficientStr: v.insert(0, coefficientStr)
+            if not v: v = [ "1" ]
+
+            if first:
+                first = False
+                if coefficientSign == '+':
+                    write(" * ".join(v))
+                    continue
+            else:
+                write(" ")
+            write(coefficientSign)
+            write(" ")
+            write(" * ".join(v))
+
+    # print in a form suitable for pari
+    # Univariate polynomials with integral or rational coefficients are
+    # given as Pol applied to the vector of coefficients which is shorter
+    # and faster to read for pari, others are printed like printMagma.
+    def printPari(self):
+        """
+        >>> Polynomial.parseFromMagma('x^3 - 2/3 * x + 1').printPari()
+        "Pol([1, 0, -2/3, 1], 'x)"
+        >>> Polynomial.parseFromMagma('x + y').printPari()
+        'x + y'
+        """
+        buffer = cStringIO.StringIO()
+        self.writePari(buffer)
+        return buffer.getvalue()
+
+    def writePari(self, stream):
+        if not (self.isUnivariate() and not self.isConstant() and
+                _hasRationalCoefficients(self._terms)):
+            self.writeMagma(stream)
+            return
+
+        stream.write("Pol([")
+        stream.write(", ".join([ str(coefficient)
+                                 for coefficient in self.getCoefficients() ]))
+        stream.write("], '%s)" % self._variables[0])
 
     # convert all coefficients using conversionFunction
     def convertCoefficients(self, conversionFunction):
 
-        return Polynomial(tuple(
-                [monomial.convertCoefficient(conversionFunction)
-                 for monomial in self._monomials]))
+        return Polynomial._fromTerms(
+            dict([(key, conversionFunction(coefficient))
+                  for key, coefficient in self._terms.iteritems()]),
+            (self._variableDegrees, self._degree))
     
-    # takes a dictionary variable name -> polynomial
+    # takes a dictionary variable name -> polynomial or a SubstitutionPlan
     # replaces a variable by the corresponding polynomial
     def substitute(self, d):
+        if not isinstance(d, SubstitutionPlan):
+            d = SubstitutionPlan(d)
+        return d.substitute(self)
+                                    
+    # renames variables, possibly flipping signs
+    # mapping is a dictionary variable name -> (sign, new variable name)
+    # where sign is +1 or -1. Instead of a pair, the new variable name
+    # or a polynomial can also be given. If any of these polynomials is not
+    # of the form +/- variable, this falls back to substitute.
+    def renameVariables(self, mapping):
+        """
+        >>> p = Polynomial.parseFromMagma('a * b^3 + 2 * c - b')
+        >>> str(p.renameVariables({'a' : (-1, 'x'), 'b' : (-1, 'c')}))
+        '3 * c + c^3 * x'
+        >>> str(p.renameVariables({'b' : 'c', 'c' : 'b'}))
+        'a * c^3 + 2 * b - c'
+        >>> str(p.renameVariables({'b' : -Polynomial.fromVariableName('a')}))
+        'a - a^4 + 2 * c'
+        >>> str(p.renameVariables({'b' : Polynomial.parseFromMagma('a + 1')}))
+        '- 1 + 3 * a^2 + 3 * a^3 + a^4 + 2 * c'
+        """
 
-        def substituteMonomial(monomial):
-            vars = monomial.getVars()
-            newVars = []
-            #poly = Polynomial.constantPolynomial(1)
-
-            for var, expo in vars:
-                if not d.has_key(var):
-                    newVars.append((var,expo))
-
-            poly = Polynomial((
-                    Monomial(monomial.getCoefficient(),
-                             tuple(newVars)),))
-
-            for var, expo in vars:
-                if d.has_key(var):
-                    poly = poly * (d[var] ** expo)
-
-            return poly
-            #return poly * Polynomial((
-            #    Monomial(monomial.getCoefficient(),
-            #              tuple(newVars)),))
+        renames = {}
+        for var, value in mapping.items():
+            rename = _linearRename(value)
+            if rename is None:
+                return self.substitute(
+                    dict([ (var, _renameToPolynomial(value))
+                           for var, value in mapping.items() ]))
+            renames[_internVariable(var)] = rename
+
+        terms = {}
+        for key, coefficient in self._terms.iteritems():
+            newKey = []
+            sign = +1
+            for k in key:
+                rename = renames.get(k >> _EXPONENT_BITS)
+                if rename is None:
+                    newKey.append(k)
+                else:
+                    newIndex, newSign = rename
+                    expo = k & _EXPONENT_MASK
+                    newKey.append((newIndex << _EXPONENT_BITS) | expo)
+                    if newSign == -1 and expo % 2:
+                        sign = -sign
+            if sign == -1:
+                coefficient = -coefficient
+            _addTerm(terms, _normalizedKey(newKey), coefficient)
+
+        return Polynomial._fromTerms(terms)
 
-        return sum([substituteMonomial(monomial)
-                     for monomial in self._monomials], Polynomial(()))
-                                    
     # returns a list of all variables in the polynomial
     def variables(self):
-        allVariables = [monomial.variables() for monomial in self._monomials]
-        allVariables = sum(allVariables, [])
-        allVariables = list(set(allVariables))
-        allVariables.sort()
-        return allVariables
+        return list(self._variables)
 
     # is the polynomial constant
     def isConstant(self):
-        return not self.variables()
+        return not self._variableDegrees
 
     # returns the constant of a polynomial
     def getConstant(self):
-        constants = [monomial.getCoefficient()
-                     for monomial in self._monomials
-                     if not monomial.getVars()]
-        assert len(constants) <= 1
-        if constants:
-            return constants[0]
-        else:
-            return 0
+        return self._terms.get((), 0)
 
     # true if the polynomial is in at most one variable
     def isUnivariate(self):
-        return len(self.variables()) <= 1
+        return len(self._variableDegrees) <= 1
 
     # true if the polynomial is linear
     def isLinear(self):
-        return self.isUnivariate() and self.degree() == 1
+        return self.isUnivariate() and self._degree == 1
 
     # get leading coefficient
     def leadingCoefficient(self):
         assert self.isUnivariate()
-        # use that monomials are sorted by degree
-        if self._monomials:
-            return self._monomials[-1].getCoefficient()
-        else:
-            return 0
+        if not self._variableDegrees:
+            return self.getConstant()
+        index, expo = self._variableDegrees.items()[0]
+        return self._terms[((index << _EXPONENT_BITS) | expo,)]
 
     def isMonic(self):
         return self.leadingCoefficient() == 1
@@ -486,27 +782,283 @@ class Polynomial(object):
         assert self.isUnivariate()
         degree = self.degree()
         listOfCoefficients = (degree + 1) * [ conversionFunction(0) ]
-        for monomial in self._monomials:
-            listOfCoefficients[degree - monomial.degree()] = (
-                conversionFunction(monomial.getCoefficient()))
+        for key, coefficient in self._terms.iteritems():
+            listOfCoefficients[degree - _keyDegree(key)] = (
+                conversionFunction(coefficient))
         return listOfCoefficients
 
-    # returns the degree of the polynomial
-    def degree(self):
-        return max([monomial.degree() for monomial in self._monomials] + [0])
+    # returns the total degree of the polynomial or the degree in the
+    # given variable
+    def degree(self, var = None):
+        """
+        >>> p = Polynomial.parseFromMagma('x^3 * y + y^2 + 1')
+        >>> p.degree(), p.degree('x'), p.degree('y'), p.degree('z')
+        (4, 3, 2, 0)
+        """
+        if var is None:
+            return self._degree
+        index = _variableIndices.get(var)
+        return self._variableDegrees.get(index, 0)
 
     # constructs a polynomial from a magma string
-    # a function to parse the coefficients can be supplied
+    # a function to parse the coefficients can be supplied, it takes the
+    # rest of the string and returns the coefficient (or None) and the
+    # rest after the coefficient, see parseIntOrFraction.
+    # Parsing is linear in the length of the string only for the built-in
+    # parseIntOrFraction and parseIntCoefficient. Any other function is
+    # called with a copy of the rest of the string at every operand, which
+    # makes parsing quadratic.
     @classmethod
     def parseFromMagma(cls, s, parseCoefficientFunction = parseIntOrFraction):
         return _parsePolynomialFromMagma(s, parseCoefficientFunction)
 
     # returns the coefficient type
     def coefficientType(self, theType = int):
-        for monomial in self._monomials:
-            theType = _storageTypePolicy(theType, monomial.coefficientType())
+        for coefficient in self._terms.itervalues():
+            theType = _storageTypePolicy(theType, type(coefficient))
         return theType
 
+    # evaluates the polynomial
+    # assignment is a dictionary variable name -> value
+    def evaluate(self, assignment):
+        result = 0
+        for key, coefficient in self._terms.iteritems():
+            for k in key:
+                coefficient = coefficient * (
+                    assignment[_variableNames[k >> _EXPONENT_BITS]]
+                    ** (k & _EXPONENT_MASK))
+            result = result + coefficient
+        return result
+
+    # returns a CompiledPolynomial to evaluate the polynomial at many points
+    # varOrder is the list of variable names giving the order of the
+    # values in a point
+    def compile(self, varOrder):
+        return CompiledPolynomial(self, varOrder)
+
+### Definition of CompiledPolynomial class
+
+class CompiledPolynomial(object):
+
+    """
+    A polynomial prepared for evaluation at a batch of points. Calling it
+    with a list of points (each point a list of values in the order given
+    by varOrder) returns the list of values. If NumPy is available, a
+    complex array of shape (number of points, number of variables) can
+    be given instead and the values are returned as complex array.
+
+    >>> p = Polynomial.parseFromMagma('x^2 * y - 3 * y + 1')
+    >>> p.evaluate({'x' : 2, 'y' : 5})
+    6
+    >>> f = p.compile(['x', 'y'])
+    >>> f([[2, 5], [0, 1], [1, 1]])
+    [6, -2, -1]
+    >>> f.evaluatePoint([2, 5])
+    6
+    >>> f(numpy.array([[2, 5], [1j, 1]]))
+    array([ 6.+0.j, -3.+0.j])
+    """
+
+    def __init__(self, polynomial, varOrder):
+        assert isinstance(polynomial, Polynomial)
+
+        positions = dict([(var, i) for i, var in enumerate(varOrder)])
+        self._numberOfVariables = len(varOrder)
+
+        # For each term a pair (coefficient, list of (position, exponent))
+        self._terms = []
+
+        # For each position the largest exponent occuring
+        self._maxExponents = [ 0 ] * len(varOrder)
+
+        for key, coefficient in polynomial._terms.iteritems():
+            factors = []
+            for k in key:
+                var = _variableNames[k >> _EXPONENT_BITS]
+                assert positions.has_key(var), (
+                    "Variable %s not in varOrder" % var)
+                position, expo = positions[var], k & _EXPONENT_MASK
+                factors.append((position, expo))
+                self._maxExponents[position] = max(
+                    self._maxExponents[position], expo)
+            self._terms.append((coefficient, factors))
+
+    def __call__(self, points):
+        if numpy and isinstance(points, numpy.ndarray):
+            return self._evaluateArray(points)
+        return [ self.evaluatePoint(point) for point in points ]
+
+    # evaluates at a single point, each power is computed only once
+    def evaluatePoint(self, point):
+        assert len(point) == self._numberOfVariables
+
+        powers = []
+        for value, maxExponent in zip(point, self._maxExponents):
+            p = [ 1, value ]
+            for i in range(2, maxExponent + 1):
+                p.append(p[-1] * value)
+            powers.append(p)
+
+        result = 0
+        for coefficient, factors in self._terms:
+            for position, expo in factors:
+                coefficient = coefficient * powers[position][expo]
+            result = result + coefficient
+        return result
+
+    # evaluates at all points given as rows of an array at double precision
+    def _evaluateArray(self, points):
+        points = numpy.asarray(points, dtype = complex)
+        assert points.ndim == 2
+        assert points.shape[1] == self._numberOfVariables
+
+        result = numpy.zeros(points.shape[0], dtype = complex)
+        for coefficient, factors in self._terms:
+            term = numpy.empty(points.shape[0], dtype = complex)
+            term.fill(complex(coefficient))
+            for position, expo in factors:
+                term *= points[:, position] ** expo
+            result += term
+        return result
+
+### Definition of SubstitutionPlan class
+
+class SubstitutionPlan(object):
+
+    """
+    A substitution variable name -> polynomial which can be applied to many
+    polynomials. The powers of the substituted polynomials and the products
+    of them needed for each monomial are computed only once and are shared
+    by all polynomials the plan is applied to.
+
+    >>> plan = SubstitutionPlan({'x' : Polynomial.parseFromMagma('y + 1')})
+    >>> str(Polynomial.parseFromMagma('x^2 * z + x').substitute(plan))
+    '1 + y + 2 * y * z + y^2 * z + z'
+    >>> str(plan.substitute(Polynomial.parseFromMagma('x^2 - 1')))
+    '2 * y + y^2'
+    """
+
+    def __init__(self, d):
+        # variable index -> polynomial
+        self._substitutions = dict(
+            [ (_internVariable(var), poly) for var, poly in d.items() ])
+        # packed (index, exponent) -> power of polynomial
+        self._powers = {}
+        # key of substituted variables -> product of powers
+        self._products = {}
+
+    def substitute(self, polynomial):
+        assert isinstance(polynomial, Polynomial)
+
+        result = PolynomialBuilder()
+        terms = result._terms
+
+        for key, coefficient in polynomial._terms.iteritems():
+
+            # split the key into the variables not affected and
+            # the variables affected by the substitution
+            keptKey = []
+            substitutedKey = []
+            for k in key:
+                if (k >> _EXPONENT_BITS) in self._substitutions:
+                    substitutedKey.append(k)
+                else:
+                    keptKey.append(k)
+
+            if not substitutedKey:
+                _addTerm(terms, key, coefficient)
+                continue
+
+            keptKey = tuple(keptKey)
+            for key2, coefficient2 in self._product(
+                    tuple(substitutedKey))._terms.iteritems():
+                _addTerm(terms,
+                         _mulKeys(keptKey, key2),
+                         _operatorTypePolicy(coefficient, coefficient2,
+                                             operator.mul))
+
+        return result.freeze()
+
+    # the product of the powers of the substituted polynomials
+    def _product(self, substitutedKey):
+        product = self._products.get(substitutedKey)
+        if product is None:
+            product = self._power(substitutedKey[0])
+            for k in substitutedKey[1:]:
+                product = product * self._power(k)
+            self._products[substitutedKey] = product
+        return product
+
+    def _power(self, k):
+        power = self._powers.get(k)
+        if power is None:
+            power = (self._substitutions[k >> _EXPONENT_BITS]
+                     ** (k & _EXPONENT_MASK))
+            self._powers[k] = power
+        return power
+
+### Definition of PolynomialBuilder class
+
+class PolynomialBuilder(object):
+
+    """
+    A mutable accumulator for building large polynomials in place.
+    Zero terms are only removed once when freeze is called.
+
+    >>> b = PolynomialBuilder(Polynomial.parseFromMagma('x + 1'))
+    >>> b.add_monomial(Monomial(3, (('y', 2),)))
+    >>> b.iadd(Polynomial.parseFromMagma('- x + y'))
+    >>> b.imul_by_monomial(Monomial.fromVariableName('z'))
+    >>> str(b.freeze())
+    'y * z + 3 * y^2 * z + z'
+    >>> str(b.freeze())
+    ''
+    >>> b.add_monomial(Monomial.fromVariableName('x'))
+    >>> b.imul(Polynomial.parseFromMagma('x - 1'))
+    >>> str(b.freeze())
+    '- x + x^2'
+    """
+
+    # starts with the given polynomial or with zero
+    def __init__(self, polynomial = None):
+        if polynomial is None:
+            self._terms = {}
+        else:
+            assert isinstance(polynomial, Polynomial)
+            self._terms = dict(polynomial._terms)
+
+    # adds a monomial
+    def add_monomial(self, monomial):
+        assert isinstance(monomial, Monomial)
+        _addTerm(self._terms, monomial._key, monomial._coefficient)
+
+    # adds a polynomial
+    def iadd(self, polynomial):
+        assert isinstance(polynomial, Polynomial)
+        terms = self._terms
+        for key, coefficient in polynomial._terms.iteritems():
+            _addTerm(terms, key, coefficient)
+
+    # multiplies by a monomial, this does not combine any terms
+    def imul_by_monomial(self, monomial):
+        assert isinstance(monomial, Monomial)
+        key2, coefficient2 = monomial._key, monomial._coefficient
+        self._terms = dict(
+            [(_mulKeys(key1, key2),
+              _operatorTypePolicy(coefficient1, coefficient2, operator.mul))
+             for key1, coefficient1 in self._terms.iteritems()])
+
+    # multiplies by a polynomial
+    def imul(self, polynomial):
+        assert isinstance(polynomial, Polynomial)
+        self._terms = _mulTerms(self._terms, polynomial._terms)
+
+    # returns the accumulated polynomial and resets the builder to zero
+    def freeze(self):
+        terms = self._terms
+        self._terms = {}
+        return Polynomial._fromTerms(terms)
+
 
 ##############################################################################
 ### Private Definitions
@@ -530,186 +1082,653 @@ def _storageTypePolicy(typeA, typeB):
 
     return typeA
 
+# The functions to combine two coefficients of given types are looked up
+# in the table _operatorHandlers (typeA, typeB) -> function(objA, objB, op)
+# which is filled by _operatorHandler when a pair of types is first seen.
+
 def _operatorTypePolicy(objA, objB, op = operator.add):
 
-    try:
+    typeA, typeB = type(objA), type(objB)
 
-        if type(objA) == type(objB):
-            return op(objA, objB)
-        if type(objA) in [int, long]:
-            return op(type(objB)(objA), objB)
-        if type(objB) in [int, long]:
-            return op(type(objA)(objB), objA)
+    if typeA is typeB:
+        return op(objA, objB)
 
-        raise Exception
+    handler = _operatorHandlers.get((typeA, typeB))
+    if handler is None:
+        handler = _operatorHandler(typeA, typeB)
+        _operatorHandlers[(typeA, typeB)] = handler
 
-    except:
+    return handler(objA, objB, op)
 
-        print objA, objB
-        print type(objA), type(objB)
+_operatorHandlers = {}
+
+# types that can be combined with int and long directly
+_typesMixingWithInt = [int, long, Fraction, float, complex]
+
+def _operatorHandler(typeA, typeB):
+    """
+    >>> _operatorTypePolicy(Fraction(1, 2), 3, operator.sub)
+    Fraction(-5, 2)
+    >>> _operatorTypePolicy(2, 3L, operator.mul)
+    6L
+    >>> _operatorTypePolicy(Fraction(1, 2), 0.5)
+    Traceback (most recent call last):
+    ...
+    Exception: In _operatorTypePolicy, cannot apply operator to <class 'fractions.Fraction'> and <type 'float'>
+    """
+
+    if typeA == typeB:
+        return _applyOperator
     
-        raise Exception, "In _operatoreTypePolicy, cannot apply operator"
+    if typeA in [int, long]:
+        if typeB in _typesMixingWithInt:
+            return _applyOperator
+        return _applyOperatorConvertingFirst
 
-### Definitions of parsable operators and their precedence
+    if typeB in [int, long]:
+        if typeA in _typesMixingWithInt:
+            return _applyOperator
+        return _applyOperatorConvertingSecond
+
+    return _raiseTypePolicyException
 
-_operators = {
-    '+' : operator.add,
-    '-' : operator.sub,
-    '*' : operator.mul,
-    '^' : operator.pow
-    }
+def _applyOperator(objA, objB, op):
+    return op(objA, objB)
 
-_operatorPrecedence = {
-    None : 0,
-    '+' : 1,
-    '-' : 1,
-    '*' : 2,
-    '^' : 3
-    }
+def _applyOperatorConvertingFirst(objA, objB, op):
+    return op(type(objB)(objA), objB)
 
-def _applyOperator(op, l, r):
-    return _operators[op](l,r)
+def _applyOperatorConvertingSecond(objA, objB, op):
+    return op(objA, type(objA)(objB))
+
+def _raiseTypePolicyException(objA, objB, op):
+    raise Exception, (
+        "In _operatorTypePolicy, cannot apply operator to %s and %s" % (
+            type(objA), type(objB)))
 
 ### Helper functions for parsing
 
 def _coefficientIsNonTrivial(c):
 
     if isinstance(c, Polynomial):
-        return c._monomials
+        return c._terms
     
     return not c == 0
 
-def _parseVariable(s):
-    r = re.match(r'([_A-Za-z][_A-Za-z0-9]*)(.*)$',s)
-    if r:
-        return r.groups()
+# Tables for Monomial.intern and Polynomial.intern, keyed by the
+# coefficient and key of a monomial, respectively the frozen terms of a
+# polynomial. Since the keys do not refer to the canonical instance, an
+# entry disappears when the last reference to it is dropped
+
+_internedMonomials = weakref.WeakValueDictionary()
+_internedPolynomials = weakref.WeakValueDictionary()
+
+# Helper function for writeMagma, caches the strings such as "x^2"
+
+_variablePowerStrings = {}
+
+def _variablePowerString(var, expo):
+    s = _variablePowerStrings.get((var, expo))
+    if s is None:
+        if expo == 1:
+            s = var
+        else:
+            s = "%s^%s" % (var, expo)
+        _variablePowerStrings[(var, expo)] = s
+    return s
+
+# Helper functions for renameVariables
+
+# returns a pair (variable index, sign) if value describes +/- a variable
+# otherwise None
+def _linearRename(value):
+    if isinstance(value, str):
+        return _internVariable(value), +1
+
+    if isinstance(value, tuple):
+        sign, var = value
+        assert sign in [-1, +1]
+        return _internVariable(var), sign
+
+    assert isinstance(value, Polynomial)
+    if not len(value._terms) == 1:
+        return None
+    key, coefficient = value._terms.items()[0]
+    if not (len(key) == 1 and (key[0] & _EXPONENT_MASK) == 1):
+        return None
+    if coefficient == 1:
+        return key[0] >> _EXPONENT_BITS, +1
+    if coefficient == -1:
+        return key[0] >> _EXPONENT_BITS, -1
+    return None
+
+def _renameToPolynomial(value):
+    if isinstance(value, Polynomial):
+        return value
+    if isinstance(value, str):
+        return Polynomial.fromVariableName(value)
+    sign, var = value
+    if sign == +1:
+        return Polynomial.fromVariableName(var)
+    return -Polynomial.fromVariableName(var)
+
+# adds coefficient to the term with the given key in the dictionary terms
+def _addTerm(terms, key, coefficient):
+    if terms.has_key(key):
+        terms[key] = _operatorTypePolicy(terms[key], coefficient)
     else:
-        return None, s
+        terms[key] = coefficient
+
+### Multiplication engine
+
+### _mulTerms chooses one of the following methods to multiply two
+### dictionaries key -> coefficient:
+### * schoolbook: multiplies every pair of monomials merging the keys
+### * heap: packs every key into a single integer (see _ExponentPacking)
+###   and merges the rows of the product table with a heap (Johnson's
+###   algorithm)
+### * Kronecker: packs the whole polynomial into a big integer and uses
+###   the big integer multiplication of python (which is Karatsuba),
+###   only for integral or rational coefficients
+###
+### The packed methods pay for every possible exponent of the product,
+### so they are only used if the polynomials are dense after packing,
+### e.g., for number field polynomials. The Ptolemy relations are too
+### sparse and always use schoolbook.
+### bin/SnapReprBenchmarkPolynomialMultiplication.py measures the
+### crossover points the thresholds below are based on.
+
+# products of at most this many pairs of monomials use schoolbook
+_SCHOOLBOOK_MAX_PAIRS = 32
+
+# the packed methods are only used if the product has at most this many
+# possible packed exponents per pair of monomials
+_PACKED_MAX_EXPONENTS_PER_PAIR = 1
+
+# the heap is only used for products of at least this many pairs
+_HEAP_MIN_PAIRS = 64
+
+# multiplies two dictionaries key -> coefficient, zero terms are not removed
+# variableDegrees1 and variableDegrees2 can be given if known, see
+# Polynomial._setTerms
+def _mulTerms(terms1, terms2, variableDegrees1 = None, variableDegrees2 = None):
+    """
+    >>> p = Polynomial.parseFromMagma('x^2 - x + 1/2') ** 4
+    >>> q = p.convertCoefficients(float)
+    >>> r = Polynomial._fromTerms(_mulTermsSchoolbook(p._terms, p._terms))
+    >>> p * p == r, q * q == r.convertCoefficients(float)
+    (True, True)
+
+    The coefficients have the types schoolbook gives them, i.e., a
+    coefficient is a Fraction if a Fraction contributes to it
+
+    >>> p = Polynomial.parseFromMagma('1/2+x+x^2+x^3+x^4+x^5+x^6+x^7+x^8')
+    >>> q = Polynomial.parseFromMagma('1+x+x^2+x^3+x^4+x^5+x^6+x^7')
+    >>> print p * q
+    1/2 + 3/2 * x + 5/2 * x^2 + 7/2 * x^3 + 9/2 * x^4 + 11/2 * x^5 + 13/2 * x^6 + 15/2 * x^7 + 8 * x^8 + 7 * x^9 + 6 * x^10 + 5 * x^11 + 4 * x^12 + 3 * x^13 + 2 * x^14 + x^15
+    >>> p = Polynomial.parseFromMagma('1+x+x^2+x^3+x^4+x^5+x^6+2/2*x^7')
+    >>> print p * q
+    1 + 2 * x + 3 * x^2 + 4 * x^3 + 5 * x^4 + 6 * x^5 + 7 * x^6 + 8 * x^7 + 7 * x^8 + 6 * x^9 + 5 * x^10 + 4 * x^11 + 3 * x^12 + 2 * x^13 + 1 * x^14
+    >>> def types(terms):
+    ...     return sorted([ (key, type(c)) for key, c in terms.items() ])
+    >>> p = Polynomial.parseFromMagma('(1+x^2+3/3*x^3+x^5+x^7) * (1+4*y)')
+    >>> q = Polynomial.parseFromMagma('1+x+x^2+x^3+x^4+x^5+x^6+x^7+%d*y' % 2**70)
+    >>> types(_mulTerms(p._terms, q._terms)) == types(
+    ...     _mulTermsSchoolbook(p._terms, q._terms))
+    True
+    """
 
-### Parsing function for Polynomial
+    numberOfPairs = len(terms1) * len(terms2)
+
+    if numberOfPairs <= _SCHOOLBOOK_MAX_PAIRS:
+        return _mulTermsSchoolbook(terms1, terms2)
+
+    if variableDegrees1 is None:
+        variableDegrees1 = _termsDegrees(terms1)[0]
+    if variableDegrees2 is None:
+        variableDegrees2 = _termsDegrees(terms2)[0]
+
+    packing = _ExponentPacking(variableDegrees1, variableDegrees2)
+
+    if packing.size > _PACKED_MAX_EXPONENTS_PER_PAIR * numberOfPairs:
+        return _mulTermsSchoolbook(terms1, terms2)
+
+    if (_hasRationalCoefficients(terms1) and
+        _hasRationalCoefficients(terms2)):
+        return _mulTermsKronecker(terms1, terms2, packing)
+
+    if numberOfPairs >= _HEAP_MIN_PAIRS:
+        return _mulTermsHeap(terms1, terms2, packing)
+
+    return _mulTermsSchoolbook(terms1, terms2)
+
+def _mulTermsSchoolbook(terms1, terms2):
+    terms = {}
+    for key1, coefficient1 in terms1.iteritems():
+        for key2, coefficient2 in terms2.iteritems():
+            _addTerm(terms,
+                     _mulKeys(key1, key2),
+                     _operatorTypePolicy(coefficient1, coefficient2,
+                                         operator.mul))
+    return terms
+
+def _mulTermsHeap(terms1, terms2, packing):
+    row = sorted([ (packing.pack(key), coefficient)
+                   for key, coefficient in terms1.iteritems() ])
+    column = sorted([ (packing.pack(key), coefficient)
+                      for key, coefficient in terms2.iteritems() ])
+
+    # the heap contains for each row the product with the smallest
+    # exponent not yet processed
+    firstExponent = column[0][0]
+    heap = [ (exponent + firstExponent, i, 0)
+             for i, (exponent, coefficient) in enumerate(row) ]
+
+    # the products come out of the heap sorted by exponent, so equal
+    # exponents are consecutive
+    exponents = []
+    coefficients = []
+    lastColumn = len(column) - 1
+
+    while heap:
+        exponent, i, j = heap[0]
+        coefficient = _operatorTypePolicy(row[i][1], column[j][1],
+                                          operator.mul)
+        if exponents and exponents[-1] == exponent:
+            coefficients[-1] = _operatorTypePolicy(coefficients[-1],
+                                                   coefficient)
+        else:
+            exponents.append(exponent)
+            coefficients.append(coefficient)
 
-def _parsePolynomialFromMagma(s, parseCoefficient = parseIntOrFraction):
+        if j < lastColumn:
+            heapq.heapreplace(heap, (row[i][0] + column[j + 1][0], i, j + 1))
+        else:
+            heapq.heappop(heap)
+
+    return dict(zip([ packing.unpack(exponent) for exponent in exponents ],
+                    coefficients))
+
+def _mulTermsKronecker(terms1, terms2, packing):
+    numerators1, denominator1 = _integralNumerators(terms1, packing)
+    numerators2, denominator2 = _integralNumerators(terms2, packing)
+
+    # bound for the absolute value of the coefficients of the product
+    bound = (max([ abs(n) for n in numerators1.itervalues() ]) *
+             max([ abs(n) for n in numerators2.itervalues() ]) *
+             min(len(numerators1), len(numerators2)))
+
+    # number of bits for each coefficient, a multiple of 4 so that
+    # a coefficient is a fixed number of hex digits
+    bits = bound.bit_length() + 1
+    bits += (-bits) % 4
+
+    product = (_packInteger(numerators1, bits) *
+               _packInteger(numerators2, bits))
+
+    productNumerators = _unpackInteger(product, bits,
+                                       packing.size)
+
+    # the coefficients get the types _mulTermsSchoolbook would give them:
+    # Fraction if a Fraction contributes, long if a long contributes,
+    # int otherwise
+    fractionExponents = _pairExponents(terms1, terms2, Fraction, packing)
+    longExponents = _pairExponents(terms1, terms2, (long, Fraction), packing)
+
+    denominator = denominator1 * denominator2
+    terms = {}
+    for exponent, numerator in productNumerators:
+        if exponent in fractionExponents:
+            coefficient = Fraction(numerator, denominator)
+        elif exponent in longExponents:
+            coefficient = long(numerator // denominator)
+        else:
+            coefficient = int(numerator // denominator)
+        terms[packing.unpack(exponent)] = coefficient
+    return terms
+
+# the packed exponents of the products of two monomials of terms1 and
+# terms2 where at least one coefficient is an instance of types
+def _pairExponents(terms1, terms2, types, packing):
+    all1 = [ packing.pack(key) for key in terms1 ]
+    all2 = [ packing.pack(key) for key in terms2 ]
+    some1 = [ packing.pack(key)
+              for key, coefficient in terms1.iteritems()
+              if isinstance(coefficient, types) ]
+    some2 = [ packing.pack(key)
+              for key, coefficient in terms2.iteritems()
+              if isinstance(coefficient, types) ]
+
+    if len(some1) == len(all1) or len(some2) == len(all2):
+        return _sumsOfPairs(all1, all2, packing.size)
+
+    return (_sumsOfPairs(some1, all2, packing.size) |
+            _sumsOfPairs(all1, some2, packing.size))
+
+# the set of sums of an element of exponents1 and an element of
+# exponents2 which are all smaller than size, using Kronecker
+# substitution on the polynomials with coefficients 0 and 1
+def _sumsOfPairs(exponents1, exponents2, size):
+    """
+    >>> sorted(_sumsOfPairs([0, 3], [1, 2, 5], 9))
+    [1, 2, 4, 5, 8]
+    """
+    if not (exponents1 and exponents2):
+        return set()
+
+    bits = min(len(exponents1), len(exponents2)).bit_length() + 1
+    bits += (-bits) % 4
+    product = (_packInteger(dict.fromkeys(exponents1, 1), bits) *
+               _packInteger(dict.fromkeys(exponents2, 1), bits))
+    return set([ exponent for exponent, count
+                 in _unpackInteger(product, bits, size) ])
+
+# Packs a key into a single integer by assigning each variable a weight
+# such that the packed exponents of two keys can be added without
+# carrying from one variable into the next. The weights are chosen large
+# enough for the product of two polynomials with the given degrees.
+class _ExponentPacking(object):
 
-    # Stack holding the operands encountered
-    operandStack = []
-    # Stack holding the operators encountered
-    # The stack includes "("
-    operatorStack = []
-
-    # Has there been an operand since the opening parenthesis
-    # e.g. parse things like "(+ x)"
-    noOperandSinceOpeningParenthesis = [ True ] 
-
-    def debugPrint(s):
-        print "=" * 75
-        print "Remaining string : ", s
-        print "Operator Stack   : ", operatorStack
-        print "Operand Stack    : ", operandStack
-
-    # pop the top operator from the stack and apply it to the
-    # two top operands from the stack, repeat as long as there are precending
-    # operators left on the stack.
-    def evalPrecedingOperatorsOnStack(operator = None):
-        while operatorStack:
-            topOperator = operatorStack[-1]
-            
-            # stop if the top operator is "("
-            if topOperator == '(':
-                return
-            
-            # or if the top operator is not preceding
-            if (_operatorPrecedence[topOperator] <
-                _operatorPrecedence[operator]):
-                return
-            
-            topOperator = operatorStack.pop()
-            r = operandStack.pop()
-            l = operandStack.pop()
-
-            operandStack.append(
-                _applyOperator(topOperator, l, r))
-
-    # this function is called iteratively and consumes
-    # the next operator or operand from the string
-    def processNextToken(s):
-        s = s.lstrip()
-
-        # parse constants or variables and push them onto the operand stack
-        constant, rest = parseCoefficient(s)
-        if constant:
-            operandStack.append(Polynomial.constantPolynomial(constant))
-            noOperandSinceOpeningParenthesis[0] = False
-            return rest
-
-        variable, rest = _parseVariable(s)
-        if variable:
-            operandStack.append(Polynomial.fromVariableName(variable))
-            noOperandSinceOpeningParenthesis[0] = False
-            return rest
-
-        # parse an operator and push it onto the stack
-        # after evaluating all preceding operators
-        #
-        # detect strings such as "(+ 3)" and push a null string
-        # onto the operand stack as to emulate parsing "(0 + 3)"
-
-        nextChar, rest = s[0], s[1:]
-        
-        if nextChar in _operators.keys():
-            operator = nextChar
-            evalPrecedingOperatorsOnStack(operator)
-            operatorStack.append(operator)
-
-            if operator in '+-':
-                if noOperandSinceOpeningParenthesis[0]:
-                    operandStack.append(Polynomial())
-                    noOperandSinceOpeningParenthesis[0] = False
-
-            return rest
-
-        # handle parenthesis
-        # an opening parenthesis is just popped onto the stack
-        # a closing parenthesis evaluates all operators on the stack
-        # until the corresponding opening parenthesis is encountered
-        if nextChar in '()':
-            parenthesis = nextChar
-            if parenthesis == '(':
-                operatorStack.append('(')
-                noOperandSinceOpeningParenthesis[0] = True
-            else:
-                evalPrecedingOperatorsOnStack()
-                assert operatorStack.pop() == '('
-            return rest
+    """
+    >>> x, y = _internVariable('x'), _internVariable('y')
+    >>> packing = _ExponentPacking({x : 2}, {x : 1, y : 3})
+    >>> key = _varsToKey((('x', 2), ('y', 1)))
+    >>> packing.size, packing.pack(key)
+    (16, 6)
+    >>> packing.unpack(packing.pack(key)) == key
+    True
+    """
 
-        # This place should not be reached when a well-formed polynomial is supplied
-        raise Exception, "While parsing polynomial %s" % s
+    def __init__(self, variableDegrees1, variableDegrees2):
+        indices = sorted(set(variableDegrees1.keys()) |
+                         set(variableDegrees2.keys()))
+        self._weights = {}
+        self._indicesAndWeights = []
+        weight = 1
+        for index in indices:
+            self._weights[index] = weight
+            self._indicesAndWeights.append((index, weight))
+            weight *= (variableDegrees1.get(index, 0) +
+                       variableDegrees2.get(index, 0) + 1)
+        self._indicesAndWeights.reverse()
+
+        # all packed exponents of the product are smaller than size
+        self.size = weight
+
+    def pack(self, key):
+        weights = self._weights
+        return sum([ (k & _EXPONENT_MASK) * weights[k >> _EXPONENT_BITS]
+                     for k in key ])
+
+    def unpack(self, exponent):
+        key = []
+        for index, weight in self._indicesAndWeights:
+            expo, exponent = divmod(exponent, weight)
+            if expo:
+                key.append((index << _EXPONENT_BITS) | expo)
+        key.reverse()
+        return tuple(key)
+
+def _hasRationalCoefficients(terms):
+    for coefficient in terms.itervalues():
+        if not isinstance(coefficient, (int, long, Fraction)):
+            return False
+    return True
+
+# returns a dictionary packed exponent -> integer and a denominator
+# such that the quotients are the coefficients
+def _integralNumerators(terms, packing):
+    denominator = 1
+    for coefficient in terms.itervalues():
+        if isinstance(coefficient, Fraction):
+            d = coefficient.denominator
+            denominator = denominator * d // gcd(
+                denominator, d)
+
+    return (dict([ (packing.pack(key), int(coefficient * denominator))
+                   for key, coefficient in terms.iteritems() ]),
+            denominator)
+
+# The signed integers n_i with |n_i| < 2^(bits-1) are packed into the
+# integer sum_i n_i 2^(i * bits). To do this in linear time, the hex
+# representation of sum_i (n_i + 2^(bits-1)) 2^(i * bits) is built and
+# the offset sum_i 2^(bits-1) 2^(i * bits) is subtracted.
+
+def _packInteger(numerators, bits):
+    digits = bits / 4
+    half = 1 << (bits - 1)
+    length = max(numerators.keys()) + 1
+
+    halfHex = '%0*x' % (digits, half)
+    hexDigits = length * [ halfHex ]
+    for exponent, numerator in numerators.iteritems():
+        hexDigits[length - 1 - exponent] = '%0*x' % (digits, numerator + half)
+
+    return long(''.join(hexDigits), 16) - long(halfHex * length, 16)
+
+# inverse of _packInteger, returns a list of pairs (i, n_i) with n_i
+# non-zero
+def _unpackInteger(packed, bits, length):
+    digits = bits / 4
+    half = 1 << (bits - 1)
+
+    hexDigits = '%0*x' % (digits * length,
+                          packed + long(('%0*x' % (digits, half)) * length,
+                                        16))
+
+    result = []
+    for exponent in range(length):
+        start = (length - 1 - exponent) * digits
+        numerator = int(hexDigits[start : start + digits], 16) - half
+        if numerator:
+            result.append((exponent, numerator))
+    return result
 
-    # iterate through the string to parse
-    s = s.strip()
-    while s:
-        # debugPrint(s)
-        s = processNextToken(s)
+### Parsing function for Polynomial
 
-    # finish any remaining operators on the stack
-    # debugPrint(s)        
-    evalPrecedingOperatorsOnStack(None)
-    # debugPrint(s)
+# A token is an unsigned integer or fraction, a variable, an operator or
+# a parenthesis. The whitespace in front of a token is skipped.
+_tokenRegex = re.compile(
+    r'\s*(?:([0-9]+(?:/[0-9]+)?)|([_A-Za-z][_A-Za-z0-9]*)|([-+*^()]))')
 
-    # check that the operator stack is empty
-    # the operand stack should only contain the result or maybe
-    # an additional empty polynomial
+_whitespaceRegex = re.compile(r'\s*')
 
-    assert not operatorStack
+def _parsePolynomialFromMagma(s, parseCoefficient = parseIntOrFraction):
+    """
+    >>> str(_parsePolynomialFromMagma('- (x + 2/3 * y)^2 * x^0 + 3 * x^2'))
+    '- 4/3 * x * y + 2 * x^2 - 4/9 * y^2'
+    >>> str(_parsePolynomialFromMagma('0'))
+    ''
 
-    if not operandStack:
-        return Polynomial(())
+    A custom parseCoefficient sees every operand, also text that is not
+    a number
+
+    >>> def parseBracket(s):
+    ...     m = re.match(r'\[([^]]*)\](.*)', s)
+    ...     if m:
+    ...         return complex(m.group(1)), m.group(2)
+    ...     return parseIntOrFraction(s)
+    >>> p = _parsePolynomialFromMagma('[1+2j] * x^2 + y * [0.5] + 2',
+    ...                               parseBracket)
+    >>> p.printMagma(parenthesisCoefficientMethod)
+    '2 + ((1+2j)) * x^2 + ((0.5+0j)) * y'
+    >>> _parsePolynomialFromMagma('x * [2', parseBracket)
+    Traceback (most recent call last):
+    ...
+    Exception: While parsing polynomial [2
+    """
+    return _PolynomialParser(s, parseCoefficient).parse()
+
+# Recursive descent parser for the grammar
+#     expression := [ '+' | '-' ] term ( ( '+' | '-' ) term )*
+#     term       := factor ( '*' factor )*
+#     factor     := primary ( '^' primary )*
+#     primary    := number | variable | '(' expression ')'
+#
+# The string is never sliced, the tokenizer keeps the position in the
+# string, so parsing is linear in the length of the string. The terms are
+# added directly to the dictionary of a PolynomialBuilder, only
+# parenthesized subexpressions go through Polynomial arithmetic.
+#
+# A factor is either a pair (coefficient, list of packed integers) for
+# a monomial or a Polynomial.
+#
+# parseCoefficient works like parseIntOrFraction. For parseIntOrFraction and
+# parseIntCoefficient, the tokenizer recognizes the numbers itself. Other
+# functions are called with the rest of the string at every position where
+# an operand is expected, so parsing with them is quadratic (the interface
+# of parseCoefficient returns the rest of the string, a copy anyway).
+
+class _PolynomialParser(object):
+
+    def __init__(self, s, parseCoefficient):
+        self._s = s
+        self._parseCoefficient = parseCoefficient
+        self._builtinCoefficients = parseCoefficient in [parseIntOrFraction,
+                                                         parseIntCoefficient]
+        self._advance(0)
+
+    # reads the token starting at position pos (or after the whitespace)
+    # and sets _number, _variable and _operator accordingly
+    # _tokenStart is the position of the token, _end the position after
+    # the token
+    # Text that is not a token is left to a custom parseCoefficient,
+    # see _primary, which fails if it is not an operand
+    def _advance(self, pos):
+        m = _tokenRegex.match(self._s, pos)
+        if m:
+            self._number, self._variable, self._operator = m.groups()
+            self._tokenStart = m.start(m.lastindex)
+            self._end = m.end()
+            return
+
+        self._number = self._variable = self._operator = None
+        self._tokenStart = _whitespaceRegex.match(self._s, pos).end()
+        self._end = self._tokenStart
+        if self._builtinCoefficients and not self._atEnd():
+            self._error()
+
+    def _atEnd(self):
+        return self._tokenStart == len(self._s)
+
+    def _error(self):
+        raise Exception, "While parsing polynomial %s" % (
+            self._s[self._tokenStart:])
+
+    def parse(self):
+        if self._atEnd():
+            return Polynomial(())
+        result = self._expression()
+        if not self._atEnd():
+            self._error()
+        return result
+
+    def _expression(self):
+        builder = PolynomialBuilder()
+
+        sign = +1
+        if self._operator in ['+', '-']:
+            if self._operator == '-':
+                sign = -1
+            self._advance(self._end)
+
+        while True:
+            self._term(builder, sign)
+            if not self._operator in ['+', '-']:
+                return builder.freeze()
+            sign = +1 if self._operator == '+' else -1
+            self._advance(self._end)
+
+    # parses a term and adds it with the given sign to builder
+    def _term(self, builder, sign):
+        coefficient = sign
+        packed = []
+        polynomial = None
+
+        while True:
+            factor = self._factor()
+            if isinstance(factor, Polynomial):
+                if polynomial is None:
+                    polynomial = factor
+                else:
+                    polynomial = polynomial * factor
+            else:
+                factorCoefficient, factorPacked = factor
+                coefficient = _operatorTypePolicy(
+                    coefficient, factorCoefficient, operator.mul)
+                packed += factorPacked
+
+            if not self._operator == '*':
+                break
+            self._advance(self._end)
+
+        key = _normalizedKey(packed)
+        if polynomial is None:
+            _addTerm(builder._terms, key, coefficient)
+        else:
+            builder.iadd(polynomial * Polynomial._fromTerms({key: coefficient}))
 
-    assert (len(operandStack) == 1
-            or (
-                len(operandStack) == 2 and
-                operandStack[0] == Polynomial())) 
+    def _factor(self):
+        base = self._primary()
 
-    return operandStack[-1]
+        while self._operator == '^':
+            self._advance(self._end)
+            exponent = self._primary()
+            if isinstance(exponent, Polynomial):
+                assert exponent.isConstant()
+                exponent = exponent.getConstant()
+            else:
+                assert not exponent[1]
+                exponent = exponent[0]
+            assert isinstance(exponent, int) and exponent >= 0
+
+            if isinstance(base, Polynomial):
+                base = base ** exponent
+            elif exponent == 0:
+                base = (1, [])
+            else:
+                coefficient, packed = base
+                base = (coefficient ** exponent,
+                        [ (k & ~_EXPONENT_MASK) |
+                          ((k & _EXPONENT_MASK) * exponent)
+                          for k in packed ])
+
+        return base
+
+    def _primary(self):
+
+        if not self._builtinCoefficients and not self._atEnd():
+            constant, rest = self._parseCoefficient(
+                self._s[self._tokenStart:])
+            if constant is not None:
+                self._advance(len(self._s) - len(rest))
+                return (constant, [])
+
+        if self._number:
+            if '/' in self._number:
+                if not self._parseCoefficient == parseIntOrFraction:
+                    self._error()
+                numerator, denominator = self._number.split('/')
+                constant = Fraction(int(numerator), int(denominator))
+            else:
+                constant = int(self._number)
+            self._advance(self._end)
+            return (constant, [])
+
+        if self._variable:
+            index = _internVariable(self._variable)
+            self._advance(self._end)
+            return (1, [ (index << _EXPONENT_BITS) | 1 ])
+
+        if self._operator == '(':
+            self._advance(self._end)
+            result = self._expression()
+            if not self._operator == ')':
+                self._error()
+            self._advance(self._end)
+            return result
+
+        self._error()
 
 ######## OLD OBSOLETE STUFF
 
@@ -0,0 +1,258 @@
+from algebra.sparse_matrix import SparseMatrix, add_to_row
+
+def smith_normal_form(m):
+    """
+    Computes the Smith normal form of a SparseMatrix m with integer entries.
+
+    Returns (diagonal, source_basis, target_basis) where diagonal is the
+    list d_1 | d_2 | ... | d_r of the positive invariant factors and
+    source_basis and target_basis are bases of Z^no_columns and Z^no_rows
+    (each vector a dict mapping index to non-zero entry) such that
+        m * source_basis[i] = diagonal[i] * target_basis[i]  for i < r
+        m * source_basis[i] = 0                              for i >= r
+
+    >>> m = SparseMatrix([{0: 2, 1: 4}, {0: 6, 1: 6}, {2: 3}], 3)
+    >>> diagonal, source_basis, target_basis = smith_normal_form(m)
+    >>> diagonal
+    [1, 6, 6]
+    >>> check_smith_normal_form(m, diagonal, source_basis, target_basis)
+    True
+
+    >>> m = SparseMatrix([{0: 1, 1: 1}, {0: -1, 1: -1}, {}], 2)
+    >>> diagonal, source_basis, target_basis = smith_normal_form(m)
+    >>> diagonal, source_basis[1:], len(target_basis)
+    ([1], [{0: -1, 1: 1}], 3)
+    >>> check_smith_normal_form(m, diagonal, source_basis, target_basis)
+    True
+    """
+
+    no_rows = m.no_rows()
+    no_columns = m.no_columns()
+
+    # the matrix is kept both as rows and columns of dicts
+    rows = [ dict(row) for row in m.rows ]
+    cols = [ {} for j in range(no_columns) ]
+    for i, row in enumerate(rows):
+        for j, x in row.iteritems():
+            cols[j][i] = x
+
+    # the matrix is U * m * V with target the columns of U^-1 and
+    # source the columns of V
+    target = [ { i : 1 } for i in range(no_rows) ]
+    source = [ { j : 1 } for j in range(no_columns) ]
+
+    # adds q times row p to row i
+    def add_row(i, q, p):
+        for j, x in rows[p].items():
+            _add_entry(rows[i], j, q * x)
+            _add_entry(cols[j], i, q * x)
+        add_to_row(target[p], -q, target[i])
+
+    # adds q times column p to column j
+    def add_column(j, q, p):
+        for i, x in cols[p].items():
+            _add_entry(cols[j], i, q * x)
+            _add_entry(rows[i], j, q * x)
+        add_to_row(source[j], q, source[p])
+
+    pivots = []
+
+    while True:
+        pivot = _choose_pivot(rows, cols)
+        if pivot is None:
+            break
+        pivot_row, pivot_column = pivot
+
+        # clear the pivot column by row operations and the pivot row by
+        # column operations. If an entry is not divisible by the pivot,
+        # the remainder is smaller than the pivot and becomes the new pivot
+        while True:
+            a = rows[pivot_row][pivot_column]
+            new_pivot = None
+
+            for i, x in cols[pivot_column].items():
+                if not i == pivot_row:
+                    add_row(i, -(x // a), pivot_row)
+                    if pivot_column in rows[i]:
+                        new_pivot = (i, pivot_column)
+
+            if new_pivot is None:
+                for j, x in rows[pivot_row].items():
+                    if not j == pivot_column:
+                        add_column(j, -(x // a), pivot_column)
+                        if pivot_row in cols[j]:
+                            new_pivot = (pivot_row, j)
+
+            if new_pivot is None:
+                break
+            pivot_row, pivot_column = new_pivot
+
+        a = rows[pivot_row][pivot_column]
+        rows[pivot_row] = {}
+        cols[pivot_column] = {}
+        if a < 0:
+            target[pivot_row] = dict(
+                [ (k, -x) for k, x in target[pivot_row].iteritems() ])
+        pivots.append((pivot_row, pivot_column, abs(a)))
+
+    diagonal = [ d for i, j, d in pivots ]
+    source_basis = [ source[j] for i, j, d in pivots ]
+    target_basis = [ target[i] for i, j, d in pivots ]
+
+    _make_divisibility_chain(diagonal, source_basis, target_basis)
+
+    pivot_rows = set([ i for i, j, d in pivots ])
+    pivot_columns = set([ j for i, j, d in pivots ])
+    source_basis += [ source[j] for j in range(no_columns)
+                      if not j in pivot_columns ]
+    target_basis += [ target[i] for i in range(no_rows)
+                      if not i in pivot_rows ]
+
+    return diagonal, source_basis, target_basis
+
+def check_smith_normal_form(m, diagonal, source_basis, target_basis):
+    """
+    Checks the result of smith_normal_form.
+    """
+    r = len(diagonal)
+
+    for i in range(1, r):
+        if diagonal[i] % diagonal[i - 1]:
+            return False
+
+    for i, v in enumerate(source_basis):
+        image = _sparse_image(m, v)
+        expected = { }
+        if i < r:
+            add_to_row(expected, diagonal[i], target_basis[i])
+        if not image == expected:
+            return False
+
+    return (_is_basis(source_basis, m.no_columns()) and
+            _is_basis(target_basis, m.no_rows()))
+
+### Helper functions
+
+def _add_entry(row, j, x):
+    y = row.get(j, 0) + x
+    if y:
+        row[j] = y
+    else:
+        row.pop(j, None)
+
+# Prefers entries +1 or -1 with few other entries in their row and column
+# (to keep the fill-in and the coefficients small), otherwise the entry
+# of smallest absolute value. Returns None for the zero matrix.
+def _choose_pivot(rows, cols):
+    best = None
+    best_cost = None
+    smallest = None
+
+    for j, col in enumerate(cols):
+        for i, x in col.iteritems():
+            if x == 1 or x == -1:
+                cost = (len(rows[i]) - 1) * (len(col) - 1)
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = (i, j), cost
+                    if cost == 0:
+                        return best
+            elif best is None:
+                if smallest is None or abs(x) < smallest[0]:
+                    smallest = (abs(x), i, j)
+
+    if best:
+        return best
+    if smallest:
+        return smallest[1:]
+    return None
+
+# Turns diagonal into d_1 | d_2 | ... by replacing pairs (a, b) with
+# (gcd, lcm), changing the bases accordingly.
+def _make_divisibility_chain(diagonal, source_basis, target_basis):
+    r = len(diagonal)
+    for i in range(r):
+        for j in range(i + 1, r):
+            a, b = diagonal[i], diagonal[j]
+            if b % a == 0:
+                continue
+
+            g, x, y = _extended_gcd(a, b)
+            s1, s2 = source_basis[i], source_basis[j]
+            t1, t2 = target_basis[i], target_basis[j]
+
+            # m * (s1 + s2) = a t1 + b t2 = g * (a/g t1 + b/g t2)
+            new_s1 = _linear_combination([(1, s1), (1, s2)])
+            new_t1 = _linear_combination([(a // g, t1), (b // g, t2)])
+            # m * (-yb/g s1 + xa/g s2) = lcm * (-y t1 + x t2)
+            new_s2 = _linear_combination([(-y * b // g, s1), (x * a // g, s2)])
+            new_t2 = _linear_combination([(-y, t1), (x, t2)])
+
+            diagonal[i], diagonal[j] = g, a * b // g
+            source_basis[i], source_basis[j] = new_s1, new_s2
+            target_basis[i], target_basis[j] = new_t1, new_t2
+
+    # the units moved to the front by the above keep their relative order
+    order = sorted(range(r), key = lambda k: (diagonal[k] != 1, k))
+    for l in [diagonal, source_basis, target_basis]:
+        l[:r] = [ l[k] for k in order ]
+
+# returns (g, x, y) with g = gcd(a, b) = x * a + y * b, g > 0
+def _extended_gcd(a, b):
+    """
+    >>> _extended_gcd(4, 6)
+    (2, -1, 1)
+    """
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while b:
+        q = a // b
+        a, b = b, a - q * b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    if a < 0:
+        return -a, -x0, -y0
+    return a, x0, y0
+
+def _linear_combination(coefficients_and_vectors):
+    result = {}
+    for q, v in coefficients_and_vectors:
+        if q:
+            add_to_row(result, q, v)
+    return result
+
+def _sparse_image(m, v):
+    image = {}
+    for i, row in enumerate(m.rows):
+        x = sum([ row[j] * y for j, y in v.iteritems() if j in row ])
+        if x:
+            image[i] = x
+    return image
+
+# vectors form a basis of Z^n if they are n vectors with determinant +-1
+def _is_basis(vectors, n):
+    if not len(vectors) == n:
+        return False
+    dense = [ [ v.get(k, 0) for k in range(n) ] for v in vectors ]
+    return abs(_determinant(dense)) == 1
+
+# determinant of a square integer matrix by fraction-free elimination
+def _determinant(m):
+    m = [ list(row) for row in m ]
+    n = len(m)
+    sign = 1
+    previous = 1
+    for k in range(n - 1):
+        if m[k][k] == 0:
+            for i in range(k + 1, n):
+                if m[i][k]:
+                    m[k], m[i] = m[i], m[k]
+                    sign = -sign
+                    break
+            else:
+                return 0
+        for i in range(k + 1, n):
+            for j in range(k + 1, n):
+                m[i][j] = (m[i][j] * m[k][k] - m[i][k] * m[k][j]) // previous
+        previous = m[k][k]
+    if n == 0:
+        return 1
+    return sign * m[n - 1][n - 1]
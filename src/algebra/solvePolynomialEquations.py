@@ -1,6 +1,8 @@
 import numpy
 import math
 from algebra.polynomial import Polynomial, uncomparablePrintCoefficientMethod
+from algebra.polynomial import SubstitutionPlan
+from algebra.univariatePolynomial import UnivariatePolynomial
 from algebra import pari
 
 from fractions import Fraction
@@ -21,7 +23,11 @@ def _printPoly(p):
         printCoefficientMethod = uncomparablePrintCoefficientMethod)
 
 def _filterPoly(polys, skip):
-    return [poly for poly in polys if not poly == skip]
+    # the cached hashes are compared first and only equal hashes
+    # need a comparison of the terms
+    skipHash = hash(skip)
+    return [poly for poly in polys
+            if not (hash(poly) == skipHash and poly == skip)]
 
 def exactSolutionsToNumerical(
         variableDict, nf, coeffConversion, polynomialSolver):
@@ -34,56 +40,54 @@ def exactSolutionsToNumerical(
     else:  # if no number field given, only solution is zero
         nfSolutions = [ coeffConversion(0) ]
 
-    # convert all the polynomials in the variable dict
-    variableDict = dict(
-        [ (k, p.convertCoefficients(coeffConversion))
-          for k, p in variableDict.items() ])
-
-    def computeVariableDict(nfSolution,
-                            variableDict = variableDict):
-        def computeNumeric(
-                p,
-                substituteDict = {'x' : 
-                                   Polynomial.constantPolynomial(
-                                       nfSolution)}):
-            
-            c = p.substitute(substituteDict)
-            
-            assert c.isConstant()
-            return c.getConstant()
+    # convert all the polynomials in the variable dict and evaluate
+    # each of them at all solutions at once
+    points = [ [ nfSolution ] for nfSolution in nfSolutions ]
 
-        return dict(
-            [(var, computeNumeric(val)) 
-             for var, val in variableDict.items()])
+    values = dict(
+        [ (k, p.convertCoefficients(coeffConversion).compile(['x'])(points))
+          for k, p in variableDict.items() ])
 
-    return [computeVariableDict(sol) for sol in nfSolutions]
+    return [ dict([ (var, val[i]) for var, val in values.items() ])
+             for i in range(len(nfSolutions)) ]
 
 def solvePolynomialEquationsExactly(polys, timeout = None):
 
+    # Internally, the number field, the values in the variable dictionary
+    # and the coefficients of the polynomials are UnivariatePolynomial's
+    # in x. They are converted back to Polynomial at the end.
+
     def conversionFunction(c):
-        return Polynomial.constantPolynomial(c)
+        return UnivariatePolynomial(c, 'x')
 
     polys = [ poly.convertCoefficients(conversionFunction) for poly in polys ]
     
-    return _solvePolynomialEquationsExactly(polys,
-                                            nf = None, variableDict = {},
-                                            timeout = timeout)
+    variableDict, nf = _solvePolynomialEquationsExactly(
+        polys,
+        nf = None, variableDict = {},
+        timeout = timeout)
+
+    if nf:
+        nf = nf.toPolynomial()
+
+    return (
+        dict([(k, v.toPolynomial()) for k, v in variableDict.items()]),
+        nf)
 
 def _transformVariableDict(variableDict, newExpressionForX, nf):
-    return dict( [(k, v.substitute( {'x': newExpressionForX}) % nf)
+    return dict( [(k, v.compose(newExpressionForX) % nf)
                    for k, v in variableDict.items()] )
 
 def _transformCoefficientsOfPolynomials(polys, newExpressionForX, nf):
     def substitute(p, newExpressionForX = newExpressionForX):
-        return p.substitute( {'x': newExpressionForX} ) % nf
+        return p.compose(newExpressionForX) % nf
     return [ poly.convertCoefficients(substitute)
              for poly in polys]
 
 def _setValueInPolynomials(polys, variable, value, nf = None):
-    res = [
-        poly.substitute(
-            {variable:Polynomial.constantPolynomial(value)})
-        for poly in polys]
+    plan = SubstitutionPlan({variable:Polynomial.constantPolynomial(value)})
+
+    res = [ poly.substitute(plan) for poly in polys ]
 
     if nf:
         res = [poly.convertCoefficients(lambda x: x % nf) for poly in res]
@@ -95,7 +99,7 @@ def _solveExactlyOverNumberField(univariatePoly, nf, timeout):
     variable = univariatePoly.variables()[0]
 
     def convertXtoY(p):
-        return p.substitute({'x' : Polynomial.fromVariableName('y')})
+        return p.toPolynomial('y')
 
     univariatePoly = univariatePoly.convertCoefficients(convertXtoY)
     univariatePoly = univariatePoly.substitute(
@@ -104,50 +108,54 @@ def _solveExactlyOverNumberField(univariatePoly, nf, timeout):
 
     if not nf:
         assert univariatePoly.isConstant()
-        newSolution       = Polynomial.fromVariableName('x')
-        newNf             = univariatePoly.getConstant()
-        newExpressionForX = Polynomial.constantPolynomial(0)
+        newSolution       = UnivariatePolynomial([0, 1], 'x')
+        newNf             = UnivariatePolynomial.fromPolynomial(
+            univariatePoly.getConstant(), 'x')
+        newExpressionForX = UnivariatePolynomial(0, 'x')
     else:
         nf = convertXtoY(nf)
 
         pariStr = "PRIAVTEsEONF = rnfequation(nfinit(%s), %s, 1)" % (
-            nf, univariatePoly)
+            nf.printPari(), univariatePoly)
 
         print pariStr
         print timeout
         r = pari.pari_eval(pariStr, timeout = timeout)
         # print r
 
-        newNf              = Polynomial.parseFromMagma(pari.pari_eval(
+        newNf              = _parseUnivariateFromPari(pari.pari_eval(
                 "PRIAVTEsEONF[1]", timeout = timeout))
-        newExpressionForX  = Polynomial.parseFromMagma(pari.pari_eval(
+        newExpressionForX  = _parseUnivariateFromPari(pari.pari_eval(
                 "PRIAVTEsEONF[2].pol", timeout = timeout))
         factor             = int(pari.pari_eval(
                 "PRIAVTEsEONF[3]", timeout = timeout))
         newSolution = (
-            Polynomial.fromVariableName('x')
-            - Polynomial.constantPolynomial(factor) * newExpressionForX)
+            UnivariatePolynomial([0, 1], 'x') - factor * newExpressionForX)
 
     return newSolution, newNf, newExpressionForX
 
 def _convertToMonicNf(nf, timeout):
 
-    pariStr = "PRIVATEconvertToMonicNf = nfinit(%s, 3)" % nf.printMagma()
+    pariStr = "PRIVATEconvertToMonicNf = nfinit(%s, 3)" % nf.printPari()
     print pariStr
     print timeout
     r       = pari.pari_eval(pariStr, timeout = timeout)
-    nf      = Polynomial.parseFromMagma(
+    nf      = _parseUnivariateFromPari(
         pari.pari_eval("PRIVATEconvertToMonicNf[1].pol", timeout = timeout))
-    newExpressionForX = Polynomial.parseFromMagma(
+    newExpressionForX = _parseUnivariateFromPari(
         pari.pari_eval("PRIVATEconvertToMonicNf[2].pol", timeout = timeout))
 
     return nf, newExpressionForX
 
+def _parseUnivariateFromPari(s):
+    return UnivariatePolynomial.fromPolynomial(
+        Polynomial.parseFromMagma(s), 'x')
+
 def _inverseOfConstantPolynomial(p):
     assert p.isConstant()
     constant = p.getConstant()
     invConstant = Fraction(1,1) / constant
-    return Polynomial.constantPolynomial(invConstant)
+    return UnivariatePolynomial(invConstant, 'x')
 
 def _solvePolynomialEquationsExactlyHandleLinear(
         polys,
@@ -157,8 +165,8 @@ def _solvePolynomialEquationsExactlyHandleLinear(
     
     factor, constant = linearPoly.getCoefficients()
 
-    assert isinstance(factor, Polynomial) 
-    assert isinstance(constant, Polynomial)
+    assert isinstance(factor, UnivariatePolynomial) 
+    assert isinstance(constant, UnivariatePolynomial)
 
     newSolution = -constant * _inverseOfConstantPolynomial(factor)
 
@@ -360,9 +368,10 @@ def solvePolynomialEquations(polys,
     for value in sol:
         new_variable_dict = dict(variable_dict)
         new_variable_dict[variable_name] = value
+        plan = SubstitutionPlan(
+            { variable_name : Polynomial.constantPolynomial(value) })
         new_polys = [
-            poly.substitute(
-                { variable_name : Polynomial.constantPolynomial(value) })
+            poly.substitute(plan)
             for poly in polys if not poly is univariate_poly]
         new_solutions = solvePolynomialEquations(
             new_polys,
@@ -0,0 +1,230 @@
+from algebra.matrix import matrix
+
+class SparseMatrix(object):
+    """
+    Represents a matrix as a list of rows, each row being a dict mapping
+    a column index to the non-zero entry in that column.
+
+    >>> m = SparseMatrix.from_entries([(0, 0, 1), (0, 2, 3), (1, 1, 2),
+    ...                                (1, 1, -2), (1, 2, 1)], 2, 3)
+    >>> m
+    SparseMatrix([{0: 1, 2: 3}, {2: 1}], no_columns = 3, the_type = int)
+    >>> m.to_matrix()
+    matrix([
+            [ 1, 0, 3],
+            [ 0, 0, 1]
+           ], the_type = int)
+    >>> m.transpose().to_matrix()
+    matrix([
+            [ 1, 0],
+            [ 0, 0],
+            [ 3, 1]
+           ], the_type = int)
+    >>> SparseMatrix.from_matrix(m.to_matrix()) == m
+    True
+    >>> m * [1, 1, 1]
+    [4, 1]
+    >>> (m * m.transpose()).to_matrix()
+    matrix([
+            [ 10, 3],
+            [ 3, 1]
+           ], the_type = int)
+
+    Converting to Z/3 drops the entries becoming zero
+    >>> from algebra.field_p import field_p
+    >>> m.convert(field_p(3))
+    SparseMatrix([{0: field_p(3)(1)}, {2: field_p(3)(1)}], no_columns = 3, the_type = field_p(3))
+    """
+
+    def __init__(self, rows, no_columns, the_type = int):
+        self.rows = rows
+        self._no_columns = no_columns
+        self.the_type = the_type
+
+    # constructs a matrix from a list of triples (row, column, value)
+    # the values for the same row and column are added
+    @classmethod
+    def from_entries(cls, entries, no_rows, no_columns, the_type = int):
+        rows = [ {} for i in range(no_rows) ]
+        for i, j, value in entries:
+            row = rows[i]
+            value = row.get(j, 0) + value
+            if value == 0:
+                row.pop(j, None)
+            else:
+                row[j] = value
+        return cls(rows, no_columns, the_type)
+
+    @classmethod
+    def from_matrix(cls, m):
+        if m.values:
+            no_columns = len(m.values[0])
+        else:
+            no_columns = 0
+        return cls([ dict([ (j, x) for j, x in enumerate(r) if not x == 0 ])
+                     for r in m.values ],
+                   no_columns, m.the_type)
+
+    def to_matrix(self):
+        zero = self._zero()
+        return matrix._from_values(
+            [ [ row.get(j, zero) for j in range(self._no_columns) ]
+              for row in self.rows ],
+            self.the_type)
+
+    # the matrix with entries converted by the_type, entries becoming
+    # zero are dropped
+    def convert(self, the_type):
+        rows = []
+        for row in self.rows:
+            new_row = {}
+            for j, x in row.iteritems():
+                x = the_type(x)
+                if not x == 0:
+                    new_row[j] = x
+            rows.append(new_row)
+        return SparseMatrix(rows, self._no_columns, the_type)
+
+    def no_rows(self):
+        return len(self.rows)
+
+    def no_columns(self):
+        return self._no_columns
+
+    def __eq__(self, other):
+        return (self._no_columns == other._no_columns and
+                self.rows == other.rows)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        try:
+            type_str = self.the_type.type_name()
+        except AttributeError:
+            type_str = self.the_type.__name__
+        return "SparseMatrix(%s, no_columns = %d, the_type = %s)" % (
+            self.rows, self._no_columns, type_str)
+
+    def transpose(self):
+        rows = [ {} for j in range(self._no_columns) ]
+        for i, row in enumerate(self.rows):
+            for j, x in row.iteritems():
+                rows[j][i] = x
+        return SparseMatrix(rows, len(self.rows), self.the_type)
+
+    # multiplication with a SparseMatrix or with a vector given as list
+    def __mul__(self, other):
+        if isinstance(other, SparseMatrix):
+            assert self._no_columns == other.no_rows()
+            return SparseMatrix([ combine_rows(other.rows, row)
+                                  for row in self.rows ],
+                                other._no_columns, self.the_type)
+
+        assert self._no_columns == len(other)
+        zero = self._zero()
+        result = []
+        for row in self.rows:
+            r = zero
+            for j, x in row.iteritems():
+                r = r + x * other[j]
+            result.append(r)
+        return result
+
+    def _zero(self):
+        if self.the_type in [int, long]:
+            return 0
+        return self.the_type.zero()
+
+    def row_echelon_form(self, start_row = 0):
+        """
+        The analogue of algebra.homology.reduced_row_echelon_form with the
+        same choice of pivots and row operations, only touching the
+        non-zero entries.
+
+        Returns (mA, A, Ainv_transpose) as lists of rows (dicts) such that
+        mA is A * self in row echelon form (except for the first start_row
+        rows) and Ainv_transpose is the transpose of the inverse of A.
+
+        >>> from fractions import Fraction
+        >>> Fraction.one = staticmethod(lambda : Fraction(1,1))
+        >>> m = SparseMatrix([{0: 2}, {0: 1, 1: 1}, {1: 1}], 2)
+        >>> m = m.convert(Fraction)
+        >>> mA, A, AinvT = m.row_echelon_form()
+        >>> mA
+        [{0: Fraction(1, 1)}, {1: Fraction(1, 1)}, {}]
+        >>> n = len(A)
+        >>> SparseMatrix(A, n, Fraction) * m == SparseMatrix(mA, 2, Fraction)
+        True
+        >>> SparseMatrix(A, n, Fraction) * SparseMatrix(AinvT, n).transpose()
+        SparseMatrix([{0: Fraction(1, 1)}, {1: Fraction(1, 1)}, {2: Fraction(1, 1)}], no_columns = 3, the_type = Fraction)
+        """
+
+        one = self.the_type.one()
+
+        rows = [ dict(row) for row in self.rows ]
+        n = len(rows)
+        A = [ { i : one } for i in range(n) ]
+        AinvT = [ { i : one } for i in range(n) ]
+
+        current_row = start_row
+        current_column = 0
+
+        while current_row < n and current_column < self._no_columns:
+
+            if not current_column in rows[current_row]:
+                for r in range(current_row + 1, n):
+                    if current_column in rows[r]:
+                        rows[current_row], rows[r] = rows[r], rows[current_row]
+                        A[current_row], A[r] = A[r], A[current_row]
+                        AinvT[current_row], AinvT[r] = (
+                            AinvT[r], AinvT[current_row])
+                        break
+
+            if not current_column in rows[current_row]:
+                current_column += 1
+
+            else:
+                t = one / rows[current_row][current_column]
+                pivot_row = scale_row(rows[current_row], t)
+                pivot_A = scale_row(A[current_row], t)
+                rows[current_row] = pivot_row
+                A[current_row] = pivot_A
+                AinvT[current_row] = scale_row(AinvT[current_row], one / t)
+
+                for j in range(current_row + 1, n):
+                    if current_column in rows[j]:
+                        t = -rows[j][current_column]
+                        add_to_row(rows[j], t, pivot_row)
+                        add_to_row(A[j], t, pivot_A)
+                        add_to_row(AinvT[current_row], -t, AinvT[j])
+
+                current_column += 1
+                current_row += 1
+
+        return rows, A, AinvT
+
+### Helper functions operating on rows given as dicts
+
+def scale_row(row, p):
+    return dict([ (j, p * x) for j, x in row.iteritems() ])
+
+# adds p times other_row to row in place
+def add_to_row(row, p, other_row):
+    for j, x in other_row.iteritems():
+        if j in row:
+            y = row[j] + p * x
+            if y == 0:
+                del row[j]
+            else:
+                row[j] = y
+        else:
+            row[j] = p * x
+
+# linear combination of the rows with the coefficients given by the dict
+# selection
+def combine_rows(rows, selection):
+    result = {}
+    for i, p in selection.iteritems():
+        add_to_row(result, p, rows[i])
+    return result
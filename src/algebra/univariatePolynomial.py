@@ -0,0 +1,439 @@
+from fractions import Fraction, gcd
+
+from algebra.polynomial import Monomial, Polynomial
+from algebra.polynomial import defaultPrintCoefficientMethod
+from algebra.polynomial import _sumsOfPairs
+
+### Definition of UnivariatePolynomial class
+
+### A dense polynomial in one variable. The coefficients can be of any
+### type supporting +, -, * and == 0, e.g., int, Fraction, mpmath.mpc or
+### pari.number. Division by the leading coefficient also requires the
+### inverse, for int this becomes a Fraction.
+###
+### If all coefficients are int or Fraction, multiplication and division
+### work on integral numerators with one common denominator, see
+### _clearedDenominators, and only build Fractions for the result.
+### A coefficient of the result is a Fraction if a Fraction (or the
+### inverse of a leading coefficient other than one) contributes to it,
+### like for the products and remainders of Polynomial.
+
+class UnivariatePolynomial(object):
+
+    """
+    >>> p = UnivariatePolynomial.fromPolynomial(
+    ...         Polynomial.parseFromMagma('x^3 + 2 * x + 1'))
+    >>> p
+    UnivariatePolynomial([1, 2, 0, 1], 'x')
+    >>> str(p)
+    '1 + 2 * x + x^3'
+    >>> p.degree()
+    3
+    >>> nf = UnivariatePolynomial([1, 0, 1])
+    >>> q, r = divmod(p, nf)
+    >>> str(q), str(r)
+    ('x', '1 + x')
+    >>> q * nf + r == p
+    True
+    >>> str(p % UnivariatePolynomial([1, 2]))
+    '- 1/8'
+    >>> str(Polynomial.parseFromMagma('x^2 + x + 1/2') %
+    ...     Polynomial.parseFromMagma('x^2'))
+    '1/2 + x'
+    >>> str(Polynomial.parseFromMagma('x^3 + 2 * x + 1') %
+    ...     Polynomial.parseFromMagma('x^2 + 1'))
+    '1 + 1 * x'
+    >>> str(UnivariatePolynomial([1, 1]) *
+    ...     UnivariatePolynomial([1, 0, Fraction(1, 1)]))
+    '1 + x + 1 * x^2 + 1 * x^3'
+    >>> p.evaluate(2)
+    13
+    >>> str(p.compose(UnivariatePolynomial([-1, 1])))
+    '- 2 + 5 * x - 3 * x^2 + x^3'
+    >>> p.getCoefficients()
+    [1, 0, 2, 1]
+    >>> p.toPolynomial() == Polynomial.parseFromMagma('x^3 + 2 * x + 1')
+    True
+    >>> UnivariatePolynomial(5) == 5
+    True
+    >>> (p - p).degree()
+    0
+    """
+
+    # Constructor takes a list of coefficients in ascending order, i.e.,
+    # coefficients[i] is the coefficient of variable^i, or a single
+    # constant
+    def __init__(self, coefficients = (), variable = 'x'):
+        if isinstance(coefficients, UnivariatePolynomial):
+            variable = coefficients._variable
+            coefficients = coefficients._coefficients
+        elif not isinstance(coefficients, (list, tuple)):
+            coefficients = [ coefficients ]
+
+        assert isinstance(variable, str)
+
+        self._coefficients = _stripped(list(coefficients))
+        self._variable = variable
+
+        # computed when needed, see _clearedDenominators
+        self._numeratorsAndDenominator = None
+
+    # constructs a UnivariatePolynomial from a univariate Polynomial
+    @classmethod
+    def fromPolynomial(cls, polynomial, variable = None):
+        assert isinstance(polynomial, Polynomial)
+        assert polynomial.isUnivariate()
+
+        variables = polynomial.variables()
+        if variable is None:
+            if variables:
+                variable = variables[0]
+            else:
+                variable = 'x'
+        assert (not variables) or variables == [ variable ]
+
+        coefficients = polynomial.getCoefficients()
+        coefficients.reverse()
+        return UnivariatePolynomial(coefficients, variable)
+
+    # converts to a Polynomial, optionally renaming the variable
+    def toPolynomial(self, variable = None):
+        if variable is None:
+            variable = self._variable
+        return Polynomial(tuple(
+                [Monomial(coefficient, ((variable, expo),) if expo else ())
+                 for expo, coefficient in enumerate(self._coefficients)]))
+
+    def __repr__(self):
+        return "UnivariatePolynomial(%s, %s)" % (repr(self._coefficients),
+                                                 repr(self._variable))
+
+    def __str__(self):
+        return self.printMagma()
+
+    # print using magma printing conventions
+    def printMagma(self,
+                   printCoefficientMethod = defaultPrintCoefficientMethod):
+        return self.toPolynomial().printMagma(printCoefficientMethod)
+
+    # print in a form suitable for pari, see Polynomial.printPari
+    def printPari(self):
+        return self.toPolynomial().printPari()
+
+    # returns the variable as a list like Polynomial.variables
+    def variables(self):
+        if len(self._coefficients) > 1:
+            return [ self._variable ]
+        return []
+
+    def isUnivariate(self):
+        return True
+
+    def isConstant(self):
+        return len(self._coefficients) <= 1
+
+    def getConstant(self):
+        if self._coefficients:
+            return self._coefficients[0]
+        return 0
+
+    # the degree of the zero polynomial is 0 like for Polynomial
+    def degree(self):
+        return max(len(self._coefficients) - 1, 0)
+
+    def leadingCoefficient(self):
+        if self._coefficients:
+            return self._coefficients[-1]
+        return 0
+
+    def isMonic(self):
+        return self.leadingCoefficient() == 1
+
+    # get coefficients in descending order like Polynomial.getCoefficients
+    def getCoefficients(self, conversionFunction = lambda x:x):
+        if not self._coefficients:
+            return [ conversionFunction(0) ]
+        return [ conversionFunction(coefficient)
+                 for coefficient in reversed(self._coefficients) ]
+
+    def convertCoefficients(self, conversionFunction):
+        return UnivariatePolynomial(
+            [ conversionFunction(coefficient)
+              for coefficient in self._coefficients ],
+            self._variable)
+
+    def __eq__(self, other):
+        if not isinstance(other, UnivariatePolynomial):
+            other = UnivariatePolynomial(other, self._variable)
+        return (self._coefficients == other._coefficients and
+                (self.isConstant() or self._variable == other._variable))
+
+    def __ne__(self, other):
+        return not self == other
+
+    # consistent with __eq__, i.e., constants hash like their coefficient
+    def __hash__(self):
+        if self.isConstant():
+            return hash(self.getConstant())
+        return hash((tuple(self._coefficients), self._variable))
+
+    def __neg__(self):
+        return UnivariatePolynomial(
+            [ -coefficient for coefficient in self._coefficients ],
+            self._variable)
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        a, b = self._coefficients, other._coefficients
+        if len(a) < len(b):
+            a, b = b, a
+        return UnivariatePolynomial(
+            [ x + y for x, y in zip(a, b) ] + a[len(b):],
+            self._variable)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self + (-self._coerce(other))
+
+    def __rsub__(self, other):
+        return self._coerce(other) - self
+
+    def __mul__(self, other):
+        if not isinstance(other, UnivariatePolynomial):
+            return UnivariatePolynomial(
+                [ coefficient * other for coefficient in self._coefficients ],
+                self._variable)
+
+        a, b = self._coefficients, other._coefficients
+        if not (a and b):
+            return UnivariatePolynomial([], self._variable)
+
+        cleared = self._clearedDenominators()
+        otherCleared = other._clearedDenominators()
+        if cleared and otherCleared:
+            numerators, denominator = cleared
+            otherNumerators, otherDenominator = otherCleared
+            return self._fromNumerators(
+                _convolve(numerators, otherNumerators),
+                denominator * otherDenominator,
+                _productFractions(a, b))
+
+        result = [ 0 ] * (len(a) + len(b) - 1)
+        for i, x in enumerate(a):
+            for j, y in enumerate(b):
+                result[i + j] = result[i + j] + x * y
+        return UnivariatePolynomial(result, self._variable)
+
+    def __rmul__(self, other):
+        return self * other
+
+    # returns quotient and remainder
+    def __divmod__(self, other):
+        other = self._coerce(other)
+        assert other._coefficients, "Division by zero polynomial"
+
+        cleared = self._clearedDenominators()
+        otherCleared = other._clearedDenominators()
+        if cleared and otherCleared:
+            return self._divmodNumerators(other, cleared, otherCleared)
+
+        divisor = other._coefficients
+        degree = len(divisor) - 1
+        leadingInverse = _inverse(divisor[-1])
+
+        rest = list(self._coefficients)
+        quotient = [ 0 ] * max(len(rest) - degree, 0)
+
+        for i in range(len(rest) - 1, degree - 1, -1):
+            coefficient = rest[i]
+            if coefficient == 0:
+                continue
+            if leadingInverse is not None:
+                coefficient = coefficient * leadingInverse
+            quotient[i - degree] = coefficient
+            for j in range(degree):
+                rest[i - degree + j] = (
+                    rest[i - degree + j] - coefficient * divisor[j])
+            rest[i] = 0
+
+        return (UnivariatePolynomial(quotient, self._variable),
+                UnivariatePolynomial(rest[:degree], self._variable))
+
+    def __mod__(self, other):
+        return divmod(self, other)[1]
+
+    def __floordiv__(self, other):
+        return divmod(self, other)[0]
+
+    # evaluates the polynomial at value using Horner's scheme
+    def evaluate(self, value):
+        result = 0
+        for coefficient in reversed(self._coefficients):
+            result = result * value + coefficient
+        return result
+
+    # returns the polynomial obtained by substituting other for the
+    # variable using Horner's scheme
+    def compose(self, other):
+        other = self._coerce(other)
+        result = UnivariatePolynomial([], other._variable)
+        for coefficient in reversed(self._coefficients):
+            result = result * other + coefficient
+        return result
+
+    # R / D divided by M / E where R and M are the integral numerators:
+    # (R / D) = (Q / s) * E / D * (M / E) + (R' / s) / D
+    # where Q / s and R' / s are quotient and remainder of R and M
+    def _divmodNumerators(self, other, cleared, otherCleared):
+        rest, denominator = cleared
+        divisor, otherDenominator = otherCleared
+        rest = list(rest)
+
+        degree = len(divisor) - 1
+        leading = divisor[-1]
+        quotient = [ 0 ] * max(len(rest) - degree, 0)
+
+        # which coefficients become Fractions, see _fromNumerators
+        restFractions = _fractions(self._coefficients)
+        divisorFractions = _fractions(other._coefficients)
+        quotientFractions = [ False ] * len(quotient)
+        isLeadingOne = other._coefficients[-1] == 1
+
+        # to keep the numerators integral, quotient and rest are
+        # multiplied by scale
+        scale = 1
+
+        for i in range(len(rest) - 1, degree - 1, -1):
+            coefficient = rest[i]
+            if coefficient == 0:
+                continue
+            if coefficient % leading:
+                factor = leading // gcd(coefficient, leading)
+                rest = [ r * factor for r in rest ]
+                quotient = [ q * factor for q in quotient ]
+                scale *= factor
+                coefficient = rest[i]
+            coefficient //= leading
+            quotient[i - degree] = coefficient
+            isFraction = restFractions[i] or not isLeadingOne
+            quotientFractions[i - degree] = isFraction
+            for j in range(degree):
+                if divisor[j]:
+                    rest[i - degree + j] -= coefficient * divisor[j]
+                    if isFraction or divisorFractions[j]:
+                        restFractions[i - degree + j] = True
+            rest[i] = 0
+
+        return (self._fromNumerators(quotient,
+                                     denominator * scale,
+                                     quotientFractions,
+                                     otherDenominator),
+                self._fromNumerators(rest[:degree],
+                                     denominator * scale,
+                                     restFractions[:degree]))
+
+    # returns a pair (list of integral numerators, common denominator) if
+    # all coefficients are int or Fraction, otherwise None
+    def _clearedDenominators(self):
+        if self._numeratorsAndDenominator is None:
+            self._numeratorsAndDenominator = _clearDenominators(
+                self._coefficients)
+        return self._numeratorsAndDenominator
+
+    # the polynomial with coefficients numerator * factor / denominator
+    # which are Fraction where fractions is True and int otherwise
+    def _fromNumerators(self, numerators, denominator, fractions,
+                        factor = 1):
+        if denominator < 0:
+            numerators = [ -n for n in numerators ]
+            denominator = -denominator
+        if factor != 1:
+            numerators = [ n * factor for n in numerators ]
+
+        return UnivariatePolynomial(
+            [ Fraction(n, denominator) if isFraction
+              else int(n // denominator)
+              for n, isFraction in zip(numerators, fractions) ],
+            self._variable)
+
+    def _coerce(self, other):
+        if isinstance(other, UnivariatePolynomial):
+            return other
+        return UnivariatePolynomial(other, self._variable)
+
+### Helper functions
+
+# removes zero leading coefficients
+def _stripped(coefficients):
+    while coefficients and coefficients[-1] == 0:
+        coefficients.pop()
+    return coefficients
+
+# returns a pair (integral numerators, common denominator) or False if
+# a coefficient is neither int nor Fraction
+def _clearDenominators(coefficients):
+    denominator = 1
+    for coefficient in coefficients:
+        if isinstance(coefficient, Fraction):
+            d = coefficient.denominator
+            denominator = denominator * d // gcd(denominator, d)
+        elif not isinstance(coefficient, (int, long)):
+            return False
+
+    if denominator == 1:
+        return [ int(coefficient) for coefficient in coefficients ], 1
+
+    return ([ coefficient.numerator * (denominator //
+                                       coefficient.denominator)
+              if isinstance(coefficient, Fraction)
+              else coefficient * denominator
+              for coefficient in coefficients ],
+            denominator)
+
+# whether the coefficients are Fractions
+def _fractions(coefficients):
+    return [ isinstance(coefficient, Fraction)
+             for coefficient in coefficients ]
+
+# whether a product of two non-zero coefficients of a and b one of which
+# is a Fraction contributes to the coefficients of the product of a and b
+def _productFractions(a, b):
+    length = len(a) + len(b) - 1
+    fractions = [ False ] * length
+
+    fractionsA = [ i for i, x in enumerate(a)
+                   if isinstance(x, Fraction) and x != 0 ]
+    fractionsB = [ j for j, y in enumerate(b)
+                   if isinstance(y, Fraction) and y != 0 ]
+    if not (fractionsA or fractionsB):
+        return fractions
+
+    supportA = [ i for i, x in enumerate(a) if x != 0 ]
+    supportB = [ j for j, y in enumerate(b) if y != 0 ]
+    if len(fractionsA) == len(supportA) or len(fractionsB) == len(supportB):
+        pairs = [ (supportA, supportB) ]
+    else:
+        pairs = [ (fractionsA, supportB), (supportA, fractionsB) ]
+
+    for exponentsA, exponentsB in pairs:
+        for k in _sumsOfPairs(exponentsA, exponentsB, length):
+            fractions[k] = True
+    return fractions
+
+# product of two lists of integers as polynomials
+def _convolve(a, b):
+    result = [ 0 ] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+# inverse of a leading coefficient, None if the coefficient is one
+def _inverse(coefficient):
+    if coefficient == 1:
+        return None
+    if isinstance(coefficient, (int, long)):
+        return Fraction(1, coefficient)
+    return 1 / coefficient
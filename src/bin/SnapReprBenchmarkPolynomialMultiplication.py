@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+import os
+import sys
+import optparse
+import random
+import timeit
+
+this_path, this_file = os.path.split(sys.argv[0])
+abs_path = os.path.abspath(this_path)
+base_path, this_dir = os.path.split(abs_path)
+sys.path.append(base_path)
+
+try:
+    import manifold.slN
+    from manifold.triangulation import read_triangulation_from_file
+    import algebra.polynomial
+    from algebra.polynomial import Polynomial, Monomial
+except ImportError as e:
+    print e
+    print
+    print "This program was called as       :", sys.argv[0]
+    print "Absolute path to this program is :", abs_path
+    print "Base path is                     :", base_path
+    sys.exit(1)
+
+# Times the multiplication methods of algebra.polynomial on products
+# appearing in the Ptolemy varieties and on number field polynomials.
+# This is used to find the thresholds _SCHOOLBOOK_MAX_PAIRS,
+# _PACKED_MAX_EXPONENTS_PER_PAIR and _HEAP_MIN_PAIRS in
+# algebra/polynomial.py.
+
+def ptolemy_products(trig_filename, N):
+    t = read_triangulation_from_file(trig_filename)
+    t.orient()
+
+    if N % 2 == 0:
+        h = manifold.slN.get_all_obstruction_classes(t)[0]
+    else:
+        h = None
+
+    eqns = manifold.slN.identify_c_parameters(
+        manifold.slN.get_Ptolemy_relations(t, N, h),
+        manifold.slN.get_identified_c_parameters(t, N))
+
+    # products of a growing product of Ptolemy relations with
+    # the next relation
+    prod = eqns[0]
+    for eqn in eqns[1:8]:
+        yield "product of relations", prod, eqn
+        prod = prod * eqn
+
+    # squares of sums of Ptolemy relations
+    for k in [2, 4, 8, 16]:
+        s = sum(eqns[1:k], eqns[0])
+        yield "square of sum of %d relations" % k, s, s
+
+def number_field_products(seed = 1):
+    random.seed(seed)
+    for degree in [2, 4, 8, 16, 32, 64, 128]:
+        p = Polynomial(tuple(
+                [ Monomial(random.randint(-1000, 1000),
+                           (('x', expo),) if expo else ())
+                  for expo in range(degree + 1) ]))
+        yield "square of dense integral degree %d" % degree, p, p
+
+    x = Polynomial.fromVariableName('x')
+    nf = x * x - x + Polynomial.constantPolynomial(1)
+    power = nf
+    for k in range(2, 9):
+        yield "power %d of x^2 - x + 1" % k, power, nf
+        power = power * nf
+
+    # the same with floating point coefficients, e.g., when evaluating
+    # numerically
+    power = nf.convertCoefficients(float)
+    for k in range(2, 17, 2):
+        yield "float power %d of x^2 - x + 1" % k, power, power
+        power = power * power
+
+def multivariate_products():
+    p = Polynomial.parseFromMagma('1 + x + y + z')
+    power = p
+    for k in range(2, 9):
+        yield "power %d of 1 + x + y + z" % k, power, p
+        power = power * p
+
+    power = power.convertCoefficients(float)
+    yield "float power 8 of 1 + x + y + z", power, power
+
+def time_method(method, repeat):
+    timer = timeit.Timer(method)
+    number = 1
+    while True:
+        t = min(timer.repeat(repeat = repeat, number = number))
+        if t > 0.02:
+            return t / number
+        number *= 10
+
+def benchmark(description, p1, p2, repeat):
+    terms1, terms2 = p1._terms, p2._terms
+    packing = algebra.polynomial._ExponentPacking(p1._variableDegrees,
+                                                  p2._variableDegrees)
+
+    methods = [
+        ("schoolbook",
+         lambda : algebra.polynomial._mulTermsSchoolbook(terms1, terms2)),
+        ("heap",
+         lambda : algebra.polynomial._mulTermsHeap(terms1, terms2, packing))]
+
+    pairs = len(terms1) * len(terms2)
+
+    # Kronecker is hopeless (and runs out of memory) for very sparse
+    # polynomials
+    if (algebra.polynomial._hasRationalCoefficients(terms1) and
+        algebra.polynomial._hasRationalCoefficients(terms2) and
+        packing.size <= 64 * pairs):
+        methods.append(
+            ("Kronecker",
+             lambda : algebra.polynomial._mulTermsKronecker(
+                    terms1, terms2, packing)))
+
+    times = [ (time_method(method, repeat), name) for name, method in methods ]
+
+    print "%-40s %7d pairs %5.2f exponents/pair" % (
+        description, pairs, float(packing.size) / pairs)
+    for t, name in times:
+        print "    %-12s %10.1f us" % (name, t * 1e6)
+    print "    fastest: %s" % min(times)[1]
+
+def main():
+    parser = optparse.OptionParser(
+        usage = "%prog [options] [TRIGFILES]",
+        description = (
+            "Benchmarks the polynomial multiplication methods on products "
+            "of Ptolemy relations of the given triangulations and on number "
+            "field polynomials."))
+    parser.add_option("-N", "--N", dest = "N", type = "int", default = 3,
+                      help = "Ptolemy relations for SL(N, C)")
+    parser.add_option("-r", "--repeat", dest = "repeat", type = "int",
+                      default = 3, help = "number of timing repetitions")
+    options, args = parser.parse_args()
+
+    if not args:
+        args = [ os.path.join(base_path, "tests", "triangulations",
+                              "m053.trig") ]
+
+    for trig_filename in args:
+        print "Ptolemy relations of %s for N = %d" % (
+            trig_filename, options.N)
+        for description, p1, p2 in ptolemy_products(trig_filename, options.N):
+            benchmark(description, p1, p2, options.repeat)
+        print
+
+    print "Number field polynomials"
+    for description, p1, p2 in number_field_products():
+        benchmark(description, p1, p2, options.repeat)
+    print
+
+    print "Dense multivariate polynomials"
+    for description, p1, p2 in multivariate_products():
+        benchmark(description, p1, p2, options.repeat)
+
+main()
@@ -59,9 +59,9 @@ def main():
     # Exit writing the header for the CSV file
     if options.print_csv_header:
         output = StringIO.StringIO()
-        csv_writer = csv.DictWriter(output, fieldnames = readCensusTable.header)
-        csv_writer.writerow(dict(zip(readCensusTable.header,
-                                     readCensusTable.header)))
+        header = get_csv_header(options)
+        csv_writer = csv.DictWriter(output, fieldnames = header)
+        csv_writer.writerow(dict(zip(header, header)))
         print output.getvalue()[:-1]
         sys.exit(0)
 
@@ -131,13 +131,24 @@ def write_magma_files(options, triangulation_filename):
 
     # if N is even, compute all cohomology obstruction classes
     # the cohomology obstruction is an element in H^2(M, partial M; Z/2)
-    if N % 2 == 0:
-        H = manifold.slN.get_all_obstruction_classes(t)
+    # If requested and the triangulation has symmetries, only one class
+    # per orbit under the symmetries is used since the others give
+    # isomorphic Ptolemy varieties
+    automorphisms = []
+    if N % 2 == 0 and options.orbits:
+        automorphisms = t.combinatorial_automorphisms()
+
+    if len(automorphisms) > 1:
+        H = manifold.slN.iter_obstruction_class_orbits(t, automorphisms)
+    elif N % 2 == 0:
+        H = ( (c, h, None) for c, h in basicAlgorithms.indexedIterable(
+                manifold.slN.iter_all_obstruction_classes(t)) )
     else:
-        H = [None] 
+        H = [ (0, None, None) ]
     
-    # For each cohomology obstruction class h with index c
-    for c, h in basicAlgorithms.indexedIterable(H):
+    # For each cohomology obstruction class h with index c representing
+    # orbit_size classes (None if not reduced by symmetries)
+    for c, h, orbit_size in H:
         # List all Ptolemy relations with respect to the cohomology class h
         pt_eqns = manifold.slN.get_Ptolemy_relations(t, N, h)
 
@@ -168,11 +179,16 @@ def write_magma_files(options, triangulation_filename):
         # pre_vars tells the procedure to list t in the term order used
         # for the computation of the Groebner basis
         term_order = algebra.magma.get_term_order(eqns, pre_vars = ['t'])
-        out = algebra.magma.primary_decomposition(eqns, term_order = term_order)
 
         # Compute the hash of the ideal
+        # This is done before removing duplicate equations so that the
+        # hash stays the same as in files written before
         hash_eqns = hash_ideal(eqns, term_order) 
 
+        # After the identification, several Ptolemy relations might
+        # have become the same, only keep one of them
+        eqns       = manifold.slN.remove_duplicate_eqns(eqns)
+
         # Human readable comment at the beginning of the magma file
         comment = generate_magma_comment(t, N, triangulation_filename, h, id_c_parms, pre_eqns)
 
@@ -181,6 +197,7 @@ def write_magma_files(options, triangulation_filename):
         # the triangulation, N, the cohomology obstruction...
         # when processing the output magma produced.
         header = generate_magma_header(t, N, triangulation_filename, c, 
+                                       orbit_size,
                                        outfile_base, fix_decoration_method,
                                        term_order, hash_eqns)
 
@@ -189,7 +206,11 @@ def write_magma_files(options, triangulation_filename):
         # outfile = outfile_base + "_sl%d_c%d_hash%s.magma" % (N,c,hash_eqns)
         outfile = outfile_base + "_sl%d_c%d.magma" % (N,c)
         print "          ", outfile
-        open(outfile,'w').write(comment + header + out)
+        f = open(outfile,'w')
+        f.write(comment + header)
+        algebra.magma.write_primary_decomposition(
+            f, eqns, term_order = term_order)
+        f.close()
 
 def process_magma_output_headers(options, magma_out, magma_filename):
 
@@ -277,7 +298,7 @@ def process_magma_output_headers_stage2(options, magma_out, magma_filename):
     cross_ratios = []
 
     csv_writer = csv.DictWriter(output, 
-                                fieldnames = readCensusTable.header,
+                                fieldnames = get_csv_header(options),
                                 restval = "")
     csv_dict = { "File": magma_filename }
 
@@ -290,6 +311,11 @@ def process_magma_output_headers_stage2(options, magma_out, magma_filename):
     except:
         error_condition = "Could not parse Cohomology class given in magma output file"
 
+    # only files written for one class per orbit have an orbit size
+    orbit_size = re.search("ORBIT SIZE       : (.*)",magma_out)
+    if options.orbits and orbit_size:
+        csv_dict['Orbit Size'] = int(orbit_size.group(1))
+
     try:
         cputime = float(re.search("CPUTIME          : (.*)",magma_out).group(1))
         csv_dict['CPUTIME'] = cputime
@@ -569,8 +595,7 @@ def get_complex_volumes_and_cross_ratios(t, N, c, primeIdeal, not_paranoid = Fal
 
     id_c_parms = manifold.slN.get_identified_c_parameters(t, N)
     if N % 2 == 0:
-        H = manifold.slN.get_all_obstruction_classes(t)
-        h = H[c]
+        h = manifold.slN.get_obstruction_class(t, c)
     else:
         h = None
 
@@ -679,6 +704,13 @@ def create_parser():
                       dest = "N", default = 2,
                       type = "int",
                       help = "N of SL(N,C) representation, default 2")
+    parser.add_option("-o", "--orbits",
+                      dest = "orbits", default = False,
+                      action = "store_true",
+                      help = ("write MAGMA files only for one obstruction "
+                              "class per orbit under the symmetries of the "
+                              "triangulation and add the orbit sizes to "
+                              "the csv file"))
     parser.add_option("-m", "--magma-base",
                       dest = "magma_base", default = None,
                       help = "base filename for MAGMA files")
@@ -741,12 +773,15 @@ def generate_magma_comment(t,N,triangulation_filename,h,id_c_parms, pre_eqns):
     
     return comment
 
-def generate_magma_header(t, N, triangulation_filename, c, outfile_base,
+def generate_magma_header(t, N, triangulation_filename, c, orbit_size,
+                          outfile_base,
                           fix_decoration_method, term_order, hash_eqns):
     header  = 'print "MAGMA=OUTPUT" cat "=FOR=SNAPREPR";\n'
     header += '/* MAGMA=INPUT=FROM=SNAPREPR */\n'
     header += 'print "MAGMA BASE       : %s";\n' % outfile_base
     header += 'print "IND OF COH CLASS : %s";\n' % c
+    if orbit_size is not None:
+        header += 'print "ORBIT SIZE       : %d";\n' % orbit_size
     header += 'print "TRIANGULATION    : %s";\n' % (os.path.abspath(triangulation_filename))
     header += 'print "NAME             : %s";\n' % t.name
     header += 'print "N                : %d";\n' % N
@@ -759,6 +794,12 @@ def generate_magma_header(t, N, triangulation_filename, c, outfile_base,
     header += 'print "==TRIANGULATION=ENDS==";\n'
     return header
 
+# the columns of the csv file, with the orbit sizes if requested
+def get_csv_header(options):
+    if options.orbits:
+        return readCensusTable.header + ["Orbit Size"]
+    return readCensusTable.header
+
 def get_outfile_base(triangulation_filename):
     base = os.path.abspath(triangulation_filename)
     directory, filename = os.path.split(base)
@@ -29,11 +29,12 @@ def get_term_order(polys, pre_vars = [], post_vars = []):
     return pre_vars + sort_vars + post_vars
 
 
-def produce_magma_out(trig):
+def write_magma_out(stream, trig):
 
     eqns = sl3NeumannZagierType.produce_all_equations_non_degenerate(trig)
     term_order = get_term_order(eqns, pre_vars = ['t'])
-    return algebra.magma.primary_decomposition(eqns, term_order = term_order)
+    algebra.magma.write_primary_decomposition(stream, eqns,
+                                              term_order = term_order)
 
 def main():
     
@@ -46,7 +47,8 @@ def main():
 
     trig = read_triangulation_from_file(trig_filename)
 
-    open(base_filename+'_sl3NeumannZagier.magma','w').write(
-        produce_magma_out(trig))
+    f = open(base_filename+'_sl3NeumannZagier.magma','w')
+    write_magma_out(f, trig)
+    f.close()
 
 main()
@@ -6,7 +6,8 @@ conversionDict = {
     'Volume' : mpmath.mpf,
     'Tetrahedra' : int,
     'InvariantTraceFieldDegree' : int,
-    'SL(N,C)' : int
+    'SL(N,C)' : int,
+    'Orbit Size' : int
 
     }
 
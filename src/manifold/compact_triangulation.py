@@ -0,0 +1,368 @@
+import copy
+
+import numpy
+
+import globalsettings
+from manifold.triangulation import triangulation, tetrahedron, S4, S4_element
+
+class CompactTriangulation(triangulation, object):
+    """
+    A triangulation storing the data of the tetrahedra in NumPy arrays
+    instead of tetrahedron objects holding nested lists:
+
+        neighbor_index        int32 array of shape (num_tets, 4)
+        gluing                int8 array of shape (num_tets, 4), the
+                              numbers of the permutations in S4
+        cusp_index            int32 array of shape (num_tets, 4)
+        peripheral_curves     int32 array of shape (num_tets, 2, 2, 4, 4)
+        positive_orientation  bool array of shape (num_tets,)
+        edge_orientation      int8 array of shape (num_tets, 4, 4)
+
+    tet_list and t[i] give views of the tetrahedra with the same attributes
+    as tetrahedron (reading and writing through to the arrays), so all
+    methods of triangulation and the code using them work unchanged.
+
+    >>> dir = globalsettings.getSetting("testTriangulationsPath")
+    >>> t = read_compact_triangulation_from_file(dir + "/m003.trig")
+    >>> len(t), t.neighbor_index.dtype, t.gluing.dtype
+    (2, dtype('int32'), dtype('int8'))
+    >>> t[0]
+    tetrahedron(index=0,neighbor_index=[1, 1, 1, 1],gluing=[permutation([0, 1, 3, 2]), permutation([2, 1, 0, 3]), permutation([0, 3, 2, 1]), permutation([1, 0, 2, 3])],cusp_index=[0, 0, 0, 0],positive_orientation=True)
+    >>> t[0].gluing[1]
+    permutation([2, 1, 0, 3])
+    >>> t.cusp_structure()
+    [0]
+
+    Writing the gluings drops the cached invariants
+
+    >>> len(t.get_face_classes())
+    4
+    >>> t[0].neighbor_index[0] = 0
+    >>> len(t.get_face_classes()), t.cache_misses['face_classes']
+    (4, 2)
+    >>> t[0].neighbor_index[0] = 1
+
+    Other attributes of the tetrahedra are kept by the triangulation
+
+    >>> t[1].cohomology_coefficients = [1, 0, 0, 1]
+    >>> t[1].cohomology_coefficients
+    [1, 0, 0, 1]
+    >>> t.to_triangulation()[1].cohomology_coefficients
+    [1, 0, 0, 1]
+    >>> t[0].cohomology_coefficients
+    Traceback (most recent call last):
+    ...
+    AttributeError: cohomology_coefficients
+
+    while the attributes of tetrahedron are written to the arrays
+
+    >>> faces = t.get_face_classes()
+    >>> t[0].neighbor_index = [0, 1, 1, 1]
+    >>> t.neighbor_index[0], t._tet_attributes.keys()
+    (array([0, 1, 1, 1], dtype=int32), [1])
+    >>> t.get_face_classes() == faces
+    False
+    >>> t[0].neighbor_index = [1, 1, 1, 1]
+    >>> t.get_face_classes() == faces
+    True
+    >>> t[0].gluing = t[1].gluing
+    >>> t.gluing[0] == t.gluing[1]
+    array([ True,  True,  True,  True])
+    >>> t[0].edge_orientation = [[0, 1, 0, 0]] * 4
+    >>> t[0].edge_orientation[3]
+    [0, 1, 0, 0]
+    >>> t[0].to_tetrahedron = None
+    Traceback (most recent call last):
+    ...
+    AttributeError: '_TetrahedronView' object attribute 'to_tetrahedron' is read-only
+    >>> t = read_compact_triangulation_from_file(dir + "/m003.trig")
+    >>> t.orient()
+    >>> t.check_consistency()
+
+    It behaves like the triangulation read from the same file
+
+    >>> from manifold.triangulation import read_triangulation_from_file
+    >>> for name in ["m003", "m053"]:
+    ...     s = read_triangulation_from_file(dir + "/" + name + ".trig")
+    ...     t = read_compact_triangulation_from_file(dir + "/" + name + ".trig")
+    ...     assert t.to_SnapPea() == s.to_SnapPea()
+    ...     assert t.get_face_classes() == s.get_face_classes()
+    ...     assert t.get_edge_classes() == s.get_edge_classes()
+    ...     assert t.find_orderings() == s.find_orderings()
+    ...     assert t.combinatorial_automorphisms() == (
+    ...         s.combinatorial_automorphisms())
+    >>> t.reorder_tets(t.find_orderings()[0])
+    >>> t.is_ordered()
+    True
+    >>> CompactTriangulation(t).to_SnapPea() == t.to_SnapPea()
+    True
+    >>> triangulation(t.to_triangulation()).to_SnapPea() == t.to_SnapPea()
+    True
+    >>> s = t.to_triangulation()
+    >>> faces = s.get_face_classes()
+    >>> s[0].neighbor_index[0] = 0
+    >>> s.get_face_classes() == faces
+    False
+    """
+
+    def __init__(self, s = None):
+        if isinstance(s, CompactTriangulation):
+            for k, v in s.__dict__.items():
+                self.__dict__[k] = copy.deepcopy(v)
+        elif isinstance(s, triangulation):
+            for k, v in s.__dict__.items():
+                if not k == 'tet_list':
+                    self.__dict__[k] = copy.deepcopy(v)
+            self.tet_list = s.tet_list
+        elif isinstance(s, str):
+            self.invalidate_invariants()
+            self.cache_hits = {}
+            self.cache_misses = {}
+            self.check_invariants = False
+            tets = self.read_SnapPea(s)
+            self._tet_attributes = {}
+            self._allocate(self.num_tets)
+            for i, data in enumerate(tets):
+                self._store(i, **data)
+        else:
+            raise ValueError, "Argument to constructor needs to be a string or a triangulation"
+
+    def _allocate(self, num_tets):
+        self.neighbor_index = numpy.zeros((num_tets, 4), dtype = numpy.int32)
+        self.gluing = numpy.zeros((num_tets, 4), dtype = numpy.int8)
+        self.cusp_index = numpy.zeros((num_tets, 4), dtype = numpy.int32)
+        self.peripheral_curves = numpy.zeros((num_tets, 2, 2, 4, 4),
+                                             dtype = numpy.int32)
+        self.positive_orientation = numpy.ones(num_tets, dtype = bool)
+        self.edge_orientation = numpy.zeros((num_tets, 4, 4),
+                                            dtype = numpy.int8)
+
+    # stores the data of tetrahedron i given like the arguments of
+    # tetrahedron, the gluings as permutations or strings like "0132"
+    def _store(self, i, neighbor_index, gluing, cusp_index,
+               peripheral_curves, positive_orientation,
+               edge_orientation = None):
+        self.neighbor_index[i] = list(neighbor_index)
+        self.gluing[i] = [ S4_element(g).number for g in gluing ]
+        self.cusp_index[i] = list(cusp_index)
+        self.peripheral_curves[i] = numpy.array(peripheral_curves)
+        self.positive_orientation[i] = bool(positive_orientation)
+        if edge_orientation is not None:
+            self.edge_orientation[i] = numpy.array(edge_orientation)
+
+    def _get_tet_list(self):
+        return _TetrahedraView(self)
+
+    # converts a list of tetrahedron objects or views into the arrays
+    # (views are converted first since they refer to the old arrays)
+    def _set_tet_list(self, tets):
+        data = [ (list(tet.neighbor_index), list(tet.gluing),
+                  list(tet.cusp_index), _to_list(tet.peripheral_curves),
+                  tet.positive_orientation, _to_list(tet.edge_orientation))
+                 for tet in tets ]
+        self._allocate(len(tets))
+        for i, d in enumerate(data):
+            self._store(i, *d)
+        self._tet_attributes = {}
+        self.invalidate_invariants()
+
+    tet_list = property(_get_tet_list, _set_tet_list)
+
+    # the views drop the cached invariants themselves
+    def _adopt_tetrahedra(self):
+        pass
+
+    def _gluing_fingerprint(self):
+        return (self.neighbor_index.tostring(), self.gluing.tostring(),
+                self.positive_orientation.tostring())
+
+    def to_triangulation(self):
+        """
+        Returns the same triangulation with tetrahedron objects.
+        """
+        t = triangulation()
+        for k, v in self.__dict__.items():
+            if not k in _array_names:
+                t.__dict__[k] = copy.deepcopy(v)
+        t.tet_list = [ tet.to_tetrahedron() for tet in self.tet_list ]
+        t._adopt_tetrahedra()
+        return t
+
+_array_names = [ 'neighbor_index', 'gluing', 'cusp_index',
+                 'peripheral_curves', 'positive_orientation',
+                 'edge_orientation' ]
+
+def read_compact_triangulation_from_file(filename):
+    return CompactTriangulation(open(filename,'r').read())
+
+### Views of the arrays
+
+class _TetrahedraView(object):
+    def __init__(self, t):
+        self._t = t
+
+    def __len__(self):
+        return len(self._t.gluing)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k = k + len(self)
+        if not 0 <= k < len(self):
+            raise IndexError, "tetrahedron index out of range"
+        return _TetrahedronView(self._t, k)
+
+    def __iter__(self):
+        for k in xrange(len(self)):
+            yield _TetrahedronView(self._t, k)
+
+    def __repr__(self):
+        return repr(list(self))
+
+# Views are created on every access, so attributes other than those of
+# tetrahedron (e.g. cohomology_coefficients) are stored in the
+# _tet_attributes of the triangulation.
+class _TetrahedronView(object):
+    __slots__ = ('_t', 'index')
+
+    def __init__(self, t, index):
+        self._t = t
+        self.index = index
+
+    def __getattr__(self, name):
+        try:
+            return self._t._tet_attributes[self.index][name]
+        except KeyError:
+            raise AttributeError, name
+
+    def __setattr__(self, name, value):
+        if hasattr(_TetrahedronView, name):
+            object.__setattr__(self, name, value)
+        else:
+            self._t._tet_attributes.setdefault(self.index, {})[name] = value
+
+    def _get_positive_orientation(self):
+        return bool(self._t.positive_orientation[self.index])
+
+    def _set_positive_orientation(self, value):
+        self._t.positive_orientation[self.index] = bool(value)
+        self._t.invalidate_invariants()
+
+    positive_orientation = property(_get_positive_orientation,
+                                    _set_positive_orientation)
+
+    def _get_neighbor_index(self):
+        return _ArrayView(self._t.neighbor_index[self.index], self._t)
+
+    def _set_neighbor_index(self, value):
+        self._t.neighbor_index[self.index] = list(value)
+        self._t.invalidate_invariants()
+
+    neighbor_index = property(_get_neighbor_index, _set_neighbor_index)
+
+    def _get_gluing(self):
+        return _GluingView(self._t.gluing[self.index], self._t)
+
+    def _set_gluing(self, value):
+        self._t.gluing[self.index] = [ S4_element(g).number for g in value ]
+        self._t.invalidate_invariants()
+
+    gluing = property(_get_gluing, _set_gluing)
+
+    def _get_cusp_index(self):
+        return _ArrayView(self._t.cusp_index[self.index])
+
+    def _set_cusp_index(self, value):
+        self._t.cusp_index[self.index] = list(value)
+
+    cusp_index = property(_get_cusp_index, _set_cusp_index)
+
+    def _get_peripheral_curves(self):
+        return _ArrayView(self._t.peripheral_curves[self.index])
+
+    def _set_peripheral_curves(self, value):
+        self._t.peripheral_curves[self.index] = numpy.array(_to_list(value))
+
+    peripheral_curves = property(_get_peripheral_curves,
+                                 _set_peripheral_curves)
+
+    def _get_edge_orientation(self):
+        return _ArrayView(self._t.edge_orientation[self.index])
+
+    def _set_edge_orientation(self, value):
+        self._t.edge_orientation[self.index] = numpy.array(_to_list(value))
+
+    edge_orientation = property(_get_edge_orientation,
+                                _set_edge_orientation)
+
+    def to_tetrahedron(self):
+        tet = tetrahedron(
+            self.index,
+            neighbor_index = list(self.neighbor_index),
+            gluing = list(self.gluing),
+            cusp_index = list(self.cusp_index),
+            positive_orientation = self.positive_orientation,
+            peripheral_curves = self._t.peripheral_curves[self.index].tolist())
+        tet.edge_orientation = self._t.edge_orientation[self.index].tolist()
+        for name, value in self._t._tet_attributes.get(self.index, {}).items():
+            setattr(tet, name, value)
+        return tet
+
+    __repr__ = tetrahedron.__dict__['__repr__']
+    is_edge_orientation_consistent_on_face = (
+        tetrahedron.__dict__['is_edge_orientation_consistent_on_face'])
+    is_edge_orientation_consistent = (
+        tetrahedron.__dict__['is_edge_orientation_consistent'])
+
+# A row of a NumPy array behaving like a (nested) list of ints, writing
+# through to the array. Writes drop the cached invariants of the
+# triangulation t if given.
+class _ArrayView(object):
+    def __init__(self, array, t = None):
+        self._array = array
+        self._t = t
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, k):
+        x = self._array[k]
+        if isinstance(x, numpy.ndarray):
+            return _ArrayView(x, self._t)
+        return int(x)
+
+    def __setitem__(self, k, value):
+        self._array[k] = value
+        if self._t is not None:
+            self._t.invalidate_invariants()
+
+    def __iter__(self):
+        for k in xrange(len(self._array)):
+            yield self[k]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self._array.tolist())
+
+def _to_list(x):
+    if isinstance(x, _ArrayView):
+        return x._array.tolist()
+    return x
+
+# The gluings of a tetrahedron as permutations, writing through to the
+# array of permutation numbers.
+class _GluingView(_ArrayView):
+    def __getitem__(self, k):
+        return S4[self._array[k]]
+
+    def __setitem__(self, k, value):
+        self._array[k] = S4_element(value).number
+        if self._t is not None:
+            self._t.invalidate_invariants()
+
+    def __repr__(self):
+        return repr(list(self))
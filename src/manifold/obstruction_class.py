@@ -4,6 +4,13 @@
 from manifold.triangulation import triangulation
 from algebra.matrix import matrix
 from algebra.homology import homology_generators
+from algebra.field_p import is_field_p_class, FieldPMatrix, FieldPVector
+from algebra.gf2_matrix import GF2Matrix, combine_rows, bits_to_list, set_bits
+from algebra.sparse_matrix import SparseMatrix
+from algebra.smith_normal_form import smith_normal_form
+from algebra.field_p import field_p
+
+import itertools
 
 
 """
@@ -14,61 +21,75 @@ C_1 the edge classes from t.get_edge_classes()
 
 """
 
+def sparse_d3(t):
+    """
+    the differential C_3 -> C_2 of chains with Z coefficients as a
+    SparseMatrix, computed in one pass over the face classes
+    """
+
+    faces = t.get_face_classes()
+
+    entries = []
+    for i, a_face_class in enumerate(faces):
+        entries.append((i, a_face_class.tet1(), +1))
+        entries.append((i, a_face_class.tet2(), a_face_class.orient()))
+
+    return SparseMatrix.from_entries(entries, len(faces), len(t.tet_list))
+
 def d3(t):
 
     """
     the differential C_3 -> C_2 of chains with Z coefficients as a matrix
     """
-    
-    tets = t.tet_list
-    faces = t.get_face_classes()
-
-    def boundary(tet,a_face_class):
-        res = 0
-        if tet.index==a_face_class.tet1():
-            res += +1
-            #res += (-1)**a_face_class.face1()
-        if tet.index==a_face_class.tet2():
-            res += a_face_class.orient()
-            #res += ((-1)**a_face_class.face2()) * a_face_class.orient()
-        return res
 
-    return matrix([[boundary(i,j) for i in tets] for j in faces],int)
+    return sparse_d3(t).to_matrix()
 
-    return m
-    
-def d2(t):
+def sparse_d2(t):
     """
-    the differential C_2 -> C_1 of chains with Z coefficients as a matrix
+    the differential C_2 -> C_1 of chains with Z coefficients as a
+    SparseMatrix, computed in one pass over the edges of each edge class.
+
+    Each edge of an edge class contributes to the two face classes whose
+    first face is a face of the edge's tetrahedron containing the edge.
     """
 
     faces = t.get_face_classes()
     edges = t.get_edge_classes()
+    face_labels = t.get_class_labels()[1]
 
-    def boundary(face,an_edge_class):
-        res = 0
-
+    entries = []
+    for j, an_edge_class in enumerate(edges):
         for an_edge in an_edge_class:
-            if face.tet1()==an_edge.tet():
-                if not (face.face1()==an_edge.vert_0() or
-                        face.face1()==an_edge.vert_1()):
-                    
-                    if an_edge.vert_0()>face.face1():
-                        vert0 = an_edge.vert_0()-1
-                    else:
-                        vert0 = an_edge.vert_0()
-                    if an_edge.vert_1()>face.face1():
-                        vert1 = an_edge.vert_1()-1
-                    else:
-                        vert1 = an_edge.vert_1()
-                    if (vert0,vert1) in [(0,1),(1,2),(2,0)]:
-                        res += + (-1) ** face.face1()
-                    else:
-                        assert (vert0,vert1) in [(1,0),(2,1),(0,2)]
-                        res += - (-1) ** face.face1()
-        return res
-
-    return matrix([[boundary(i,j) for i in faces] for j in edges],int)
+            for face1 in range(4):
+                if face1 == an_edge.vert_0() or face1 == an_edge.vert_1():
+                    continue
+                i = face_labels[4 * an_edge.tet() + face1]
+                if not (faces[i].tet1() == an_edge.tet() and
+                        faces[i].face1() == face1):
+                    continue
+
+                if an_edge.vert_0()>face1:
+                    vert0 = an_edge.vert_0()-1
+                else:
+                    vert0 = an_edge.vert_0()
+                if an_edge.vert_1()>face1:
+                    vert1 = an_edge.vert_1()-1
+                else:
+                    vert1 = an_edge.vert_1()
+                if (vert0,vert1) in [(0,1),(1,2),(2,0)]:
+                    entries.append((j, i, + (-1) ** face1))
+                else:
+                    assert (vert0,vert1) in [(1,0),(2,1),(0,2)]
+                    entries.append((j, i, - (-1) ** face1))
+
+    return SparseMatrix.from_entries(entries, len(edges), len(faces))
+
+def d2(t):
+    """
+    the differential C_2 -> C_1 of chains with Z coefficients as a matrix
+    """
+
+    return sparse_d2(t).to_matrix()
 
 def cohomology_2_rel_boundary(t, field, as_matrix_with_column_vectors = False):
     """
@@ -116,21 +137,370 @@ def cohomology_2_rel_boundary(t, field, as_matrix_with_column_vectors = False):
     """
 
     assert isinstance(t,triangulation)
-    
-    m_d3 = matrix(d3(t), field).transpose()
-    m_d2 = matrix(d2(t), field).transpose()
+
+    return _cohomology_2_rel_boundary(sparse_d2(t), sparse_d3(t), field,
+                                      as_matrix_with_column_vectors)
+
+def _cohomology_2_rel_boundary(d2, d3, field, as_matrix_with_column_vectors):
+    if is_field_p_class(field, 2):
+        # bitsets instead of matrices of field_p(2) elements
+        m_d3 = GF2Matrix.from_sparse_matrix(d3).transpose()
+        m_d2 = GF2Matrix.from_sparse_matrix(d2).transpose()
+    else:
+        m_d3 = d3.convert(field).transpose()
+        m_d2 = d2.convert(field).transpose()
     
     H = homology_generators(m_d2, m_d3, as_matrix_with_column_vectors)
 
     return H
 
 
+class IntegralCohomology(object):
+    """
+    H^2(t, boundary of t; Z) computed once from the Smith normal forms of
+    the integral coboundary maps delta_1 = d2^t and delta_2 = d3^t.
+    By Poincare-Lefschetz duality, this is also H_1(t).
+
+    The cohomology with coefficients in Z/p is eliminated over Z/p from
+    the same sparse matrices as cohomology_2_rel_boundary(t, field_p(p)),
+    so the basis and the order of the classes are the ones of
+    cohomology_2_rel_boundary_classes which index the obstruction classes.
+    Its dimension follows from the invariant factors by the universal
+    coefficient theorem.
+
+    >>> import globalsettings
+    >>> from manifold.triangulation import read_triangulation_from_file
+    >>> dir = globalsettings.getSetting("testTriangulationsPath")
+    >>> t = read_triangulation_from_file(dir + "/m003.trig")
+    >>> H = IntegralCohomology(t)
+    >>> H
+    IntegralCohomology(Z + Z/5)
+    >>> H.free_rank, H.torsion
+    (1, [5])
+    >>> H.dimension_mod_p(5), H.dimension_mod_p(2)
+    (2, 1)
+    >>> len(H.cohomology_mod_p(5)), len(H.cohomology_mod_p(2))
+    (2, 1)
+    >>> len(H.classes_mod_p(2))
+    2
+
+    The representatives are cocycles
+
+    >>> from algebra.field_p import field_p
+    >>> delta_2 = matrix(d3(t), field_p(5)).transpose()
+    >>> for h in H.cohomology_mod_p(5):
+    ...     assert delta_2 * h == [ 0, 0 ]
+
+    The classes and their order are the ones obtained by eliminating
+    the dense matrices over Z/2, here on a triangulation with
+    H_1 = Z + Z/2 + Z/10
+
+    >>> from algebra.homology import _homology_generators_generic
+    >>> t = read_triangulation_from_file(dir + "/m003_triple_cover.trig")
+    >>> H = IntegralCohomology(t)
+    >>> H
+    IntegralCohomology(Z + Z/2 + Z/10)
+    >>> F = field_p(2)
+    >>> gens = _homology_generators_generic(matrix(d2(t), F).transpose(),
+    ...                                     matrix(d3(t), F).transpose())
+    >>> old = all_linear_combinations(matrix(gens, F).transpose(), F)
+    >>> len(old), H.classes_mod_p(2) == old
+    (8, True)
+    >>> [ H.class_mod_p(2, c) for c in range(8) ] == old
+    True
+    """
+
+    def __init__(self, t):
+        assert isinstance(t,triangulation)
+
+        self._d2 = sparse_d2(t)
+        self._d3 = sparse_d3(t)
+        delta_1 = self._d2.transpose()
+        delta_2 = self._d3.transpose()
+        no_faces = delta_1.no_rows()
+
+        # delta_1 * s_i = d_i * t_i, so the invariant factors d_i > 1
+        # are the torsion
+        d, s, t = smith_normal_form(delta_1)
+        r1 = len(d)
+        self.torsion = [ d_i for d_i in d if d_i > 1 ]
+
+        # delta_2 vanishes on t_i for i < r1 since delta_2 * delta_1 = 0.
+        # On the span of the remaining t_i, delta_2 * v_j = e_j * w_j,
+        # so there are len(rest) - r2 free generators and the v_j with
+        # j < r2 are cocycles modulo the primes dividing e_j (these come
+        # from the torsion of H^3)
+        rest = t[r1:]
+        e, u, w = smith_normal_form(
+            delta_2 * SparseMatrix(rest, no_faces).transpose())
+        r2 = len(e)
+        self.free_rank = len(rest) - r2
+        self._h3_torsion = [ e_j for e_j in e if e_j > 1 ]
+
+    def __repr__(self):
+        summands = ['Z'] * self.free_rank + [
+            'Z/%d' % d_i for d_i in self.torsion ]
+        return "IntegralCohomology(%s)" % (' + '.join(summands) or '0')
+
+    def dimension_mod_p(self, p):
+        """
+        The dimension of H^2(t, boundary of t; Z/p)
+        """
+
+        return (len([ d_i for d_i in self.torsion if d_i % p == 0 ]) +
+                self.free_rank +
+                len([ e_j for e_j in self._h3_torsion if e_j % p == 0 ]))
+
+    def cohomology_mod_p(self, p, as_matrix_with_column_vectors = False):
+        """
+        Representatives of a basis of H^2(t, boundary of t; Z/p), the
+        same as cohomology_2_rel_boundary(t, field_p(p))
+        """
+
+        H = _cohomology_2_rel_boundary(self._d2, self._d3, field_p(p),
+                                       as_matrix_with_column_vectors)
+
+        if as_matrix_with_column_vectors:
+            assert H.no_columns() == self.dimension_mod_p(p)
+        else:
+            assert len(H) == self.dimension_mod_p(p)
+
+        return H
+
+    def classes_mod_p(self, p):
+        """
+        All classes in H^2(t, boundary of t; Z/p) like
+        cohomology_2_rel_boundary_classes(t, field_p(p))
+        """
+
+        return list(self.iter_classes_mod_p(p))
+
+    def iter_classes_mod_p(self, p):
+        """
+        Yields the classes of classes_mod_p one at a time.
+        """
+
+        return iter_linear_combinations(
+            self.cohomology_mod_p(p, as_matrix_with_column_vectors = True),
+            field_p(p))
+
+    def class_mod_p(self, p, index):
+        """
+        The class at position index in classes_mod_p.
+        """
+
+        return linear_combination(
+            self.cohomology_mod_p(p, as_matrix_with_column_vectors = True),
+            field_p(p), index)
+
+def integral_cohomology(t):
+    """
+    IntegralCohomology(t) cached on t, see triangulation.invariant.
+    """
+
+    return t.invariant('integral_cohomology',
+                       lambda : IntegralCohomology(t))
+
+def iter_class_orbits_mod_2(t, automorphisms = None):
+    """
+    Yields (index, class, orbit_size) for each orbit of the classes in
+    H^2(t, boundary of t; Z/2) under the combinatorial automorphisms of t
+    (see triangulation.combinatorial_automorphisms). The class is the one
+    at position index in IntegralCohomology(t).classes_mod_p(2) which is
+    the smallest index in its orbit.
+
+    An automorphism permutes the face classes and thus acts linearly on
+    H^2, so the orbits follow from the images of the generators without
+    listing all classes first.
+
+    >>> import globalsettings
+    >>> from manifold.triangulation import read_triangulation_from_file
+    >>> dir = globalsettings.getSetting("testTriangulationsPath")
+    >>> t = read_triangulation_from_file(dir + "/m003.trig")
+    >>> for c, h, orbit_size in iter_class_orbits_mod_2(t):
+    ...     print c, [ int(x) for x in h ], orbit_size
+    0 [0, 0, 0, 0] 1
+    1 [0, 0, 1, 1] 1
+
+    The deck transformations of a cyclic triple cover of m003 permute
+    the classes, the orbit sizes add up to the number of classes
+
+    >>> t = read_triangulation_from_file(dir + "/m003_triple_cover.trig")
+    >>> orbits = list(iter_class_orbits_mod_2(t))
+    >>> [ (c, orbit_size) for c, h, orbit_size in orbits ]
+    [(0, 1), (1, 3), (3, 3), (6, 1)]
+    >>> dim = len(IntegralCohomology(t).cohomology_mod_p(2))
+    >>> dim, sum([ orbit_size for c, h, orbit_size in orbits ]) == 2 ** dim
+    (3, True)
+    """
+
+    if automorphisms is None:
+        automorphisms = t.combinatorial_automorphisms()
+
+    H = integral_cohomology(t).cohomology_mod_p(
+        2, as_matrix_with_column_vectors = True)
+    n = H.no_columns()
+
+    # the class with index c is the sum of the generators j for which
+    # bit n - 1 - j of c is set
+    generators = GF2Matrix.from_matrix(H).transpose().rows
+    coboundaries = GF2Matrix.from_sparse_matrix(sparse_d2(t)).rows
+    index_of_cocycle = _class_index_mod_2(generators, coboundaries)
+
+    faces = t.get_face_classes()
+    face_labels = t.get_class_labels()[1]
+
+    # images[g][b] is the index of the image of the class with index 2^b
+    # under the automorphism g
+    images = []
+    for sigma in automorphisms:
+        face_permutation = [
+            face_labels[4 * sigma[face.tet1()] + face.face1()]
+            for face in faces ]
+        images.append(
+            [ index_of_cocycle(
+                    _permute_bits(generators[n - 1 - b], face_permutation))
+              for b in range(n) ])
+
+    for c, h in enumerate(iter_linear_combinations(H, field_p(2))):
+        orbit = set([ combine_rows(image, c) for image in images ])
+        if not orbit or min(orbit) == c:
+            yield c, h, max(len(orbit), 1)
+
+# Returns a function mapping a cocycle over Z/2 given as bitset to the
+# index of its class as in iter_class_orbits_mod_2.
+def _class_index_mod_2(generators, coboundaries):
+    n = len(generators)
+
+    # echelon basis of the span of the generators and coboundaries as
+    # triples (pivot bit, vector, index of the generators contributing)
+    basis = []
+    for j, v in enumerate(generators + coboundaries):
+        if j < n:
+            index = 1 << (n - 1 - j)
+        else:
+            index = 0
+        v, index = _reduce_mod_2(basis, v, index)
+        if v:
+            basis.append((v & -v, v, index))
+
+    def index_of_cocycle(v):
+        v, index = _reduce_mod_2(basis, v, 0)
+        assert v == 0, "Not a cocycle"
+        return index
+
+    return index_of_cocycle
+
+def _reduce_mod_2(basis, v, index):
+    for pivot, w, w_index in basis:
+        if v & pivot:
+            v ^= w
+            index ^= w_index
+    return v, index
+
+# moves bit k of bits to bit permutation[k]
+def _permute_bits(bits, permutation):
+    result = 0
+    for k in set_bits(bits):
+        result |= 1 << permutation[k]
+    return result
+
 def cohomology_2_rel_boundary_classes(t, field):
     H = cohomology_2_rel_boundary(t, field,
                                   as_matrix_with_column_vectors = True)
 
-    return [H * v for v in all_vectors(field, H.no_columns())]
+    return all_linear_combinations(H, field)
 
+def all_linear_combinations(H, field):
+    """
+    Lists H * v for all vectors v in the order of all_vectors.
+    """
+
+    return list(iter_linear_combinations(H, field))
+
+def iter_linear_combinations(H, field):
+    """
+    Yields H * v for all vectors v in the order of all_vectors.
+
+    Over Z/p, H * v is updated incrementally: going to the next v adds 1 to
+    the last few entries of v (wrapping around from p - 1 to 0 also adds 1
+    modulo p), so H * v changes by the sum of the corresponding columns.
+    On average, these are less than two column additions per vector.
+    Over Z/2, the columns are bitsets and the additions XORs.
+
+    >>> from algebra.field_p import field_p
+    >>> H = matrix([[1, 0], [1, 1], [0, 2]], field_p(3))
+    >>> [ [ int(x) for x in h ] for h in iter_linear_combinations(H, field_p(3)) ]
+    [[0, 0, 0], [0, 1, 2], [0, 2, 1], [1, 1, 0], [1, 2, 2], [1, 0, 1], [2, 2, 0], [2, 0, 2], [2, 1, 1]]
+    >>> H = matrix([[1, 0], [1, 1], [0, 1]], field_p(2))
+    >>> [ [ int(x) for x in h ] for h in iter_linear_combinations(H, field_p(2)) ]
+    [[0, 0, 0], [0, 1, 1], [1, 1, 0], [1, 0, 1]]
+    >>> linear_combination(H, field_p(2), 2)
+    [field_p(2)(1), field_p(2)(1), field_p(2)(0)]
+    """
+
+    n = H.no_columns()
+
+    if n > 0 and is_field_p_class(field, 2):
+        no_rows = H.no_rows()
+        elements = field.elements()
+        columns = GF2Matrix.from_matrix(H).transpose().rows
+
+        # going from k - 1 to k flips the last b + 1 entries of v where b
+        # is the number of trailing zeros of k, changes[b] is the XOR of
+        # the corresponding columns
+        changes = []
+        change = 0
+        for column in reversed(columns):
+            change ^= column
+            changes.append(change)
+
+        current = 0
+        yield [ elements[x] for x in bits_to_list(current, no_rows) ]
+
+        for k in itertools.count(1):
+            if k >> n:
+                return
+            current ^= changes[(k & -k).bit_length() - 1]
+            yield [ elements[x] for x in bits_to_list(current, no_rows) ]
+
+    elif n > 0 and is_field_p_class(field):
+        p = field.p
+        elements = field.elements()
+        columns = FieldPMatrix.from_matrix(H).transpose()
+        columns = [ FieldPVector(p, column) for column in columns.rows ]
+
+        current = FieldPVector(p, [ 0 ] * H.no_rows())
+        digits = [ 0 ] * n
+        yield [ elements[x] for x in current.values ]
+
+        while True:
+            j = n - 1
+            while j >= 0 and digits[j] == p - 1:
+                digits[j] = 0
+                current = current + columns[j]
+                j -= 1
+            if j < 0:
+                return
+            digits[j] += 1
+            current = current + columns[j]
+            yield [ elements[x] for x in current.values ]
+
+    else:
+        for v in iter_vectors(field, n):
+            yield H * v
+
+def linear_combination(H, field, index):
+    """
+    H * v for the vector v at position index in all_vectors.
+    """
+
+    elements = field.elements()
+    v = []
+    for j in range(H.no_columns()):
+        index, digit = divmod(index, len(elements))
+        v.insert(0, elements[digit])
+    return H * v
 
 def all_vectors(field, length):
     """
@@ -146,19 +516,20 @@ def all_vectors(field, length):
     625
     """
 
-    if length == 0:
-        return [ [] ]
+    return list(iter_vectors(field, length))
+
+def iter_vectors(field, length):
+    """
+    Yields the vectors of all_vectors one at a time.
+    """
+
     try:
         elems = field.elements()
     except:
         raise Exception("field has no method elements, field is %s of type: %s" % (field, type(field)))
 
-    v = all_vectors(field, length - 1)
-
-    r = []
-    for e in elems:
-        r = r + [[e]+x for x in v]
-    return r
+    for v in itertools.product(elems, repeat = length):
+        yield list(v)
 
 def cohomology_2_rel_boundary_class_to_coeffs(trig, cohomology_class):
     """
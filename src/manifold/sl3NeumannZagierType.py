@@ -1,7 +1,7 @@
 import operator
 
 from manifold.triangulation import left_out_number,permutation
-from algebra.polynomial import Monomial, Polynomial
+from algebra.polynomial import Monomial, Polynomial, PolynomialBuilder
 from manifold.slN import polynomialNonZeroCondition
 
 class NeumannZagierTypeEquation(object):
@@ -77,9 +77,9 @@ class NeumannZagierTypeEquation(object):
                 for var in newLeft.variables() + newRight.variables()
                 if 'OneMinusz' in var])
 
-        return (
-              newLeft.substitute(substDict) 
-            - newRight.substitute(substDict))
+        result = PolynomialBuilder(newLeft.substitute(substDict))
+        result.iadd(-newRight.substitute(substDict))
+        return result.freeze()
 
 def get_edge_parameter(vert0, vert1, small_tet_vert, tet):
     
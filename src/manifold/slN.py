@@ -6,11 +6,13 @@
 # Part III
 # Procedures to check consistency
 
-from manifold.obstruction_class import cohomology_2_rel_boundary_classes
+from manifold.obstruction_class import integral_cohomology
+from manifold.obstruction_class import iter_class_orbits_mod_2
 from manifold.obstruction_class import cohomology_2_rel_boundary_class_to_coeffs
 from manifold.bloch_group import PtolemyCochain
+from manifold.triangulation import S4_restricted_signs
 from algebra.field_p import field_p
-from algebra.polynomial import Polynomial
+from algebra.polynomial import Monomial, Polynomial, PolynomialBuilder
 from algebra.pari import pari_eval, pari_eval_bool, number, get_pari_allowed_error, NumericalError
 
 from fractions import Fraction
@@ -173,9 +175,32 @@ def c_parameter(coords, tet_index):
 
 def get_all_obstruction_classes(t):
     """
-    Computes all classes in H^2(M, partial M; Z/2)
+    Computes all classes in H^2(M, partial M; Z/2) from the integral
+    cohomology, see IntegralCohomology.
     """
-    return cohomology_2_rel_boundary_classes(t, field_p(2))
+    return integral_cohomology(t).classes_mod_p(2)
+
+def iter_all_obstruction_classes(t):
+    """
+    Yields the classes of get_all_obstruction_classes one at a time.
+    """
+    return integral_cohomology(t).iter_classes_mod_p(2)
+
+def get_obstruction_class(t, c):
+    """
+    The class with index c in get_all_obstruction_classes.
+    """
+    return integral_cohomology(t).class_mod_p(2, c)
+
+def iter_obstruction_class_orbits(t, automorphisms = None):
+    """
+    Yields (c, h, orbit_size) for one class h per orbit of the obstruction
+    classes under the combinatorial automorphisms of t (or the given
+    ones). The Ptolemy varieties of classes in the same orbit are
+    isomorphic. c is the index of h in get_all_obstruction_classes, see
+    iter_class_orbits_mod_2.
+    """
+    return iter_class_orbits_mod_2(t, automorphisms)
 
 def Z2_to_sign(f):
     """
@@ -322,51 +347,58 @@ def get_identified_c_parameters(t, N):
                                                 for x in tet.gluing[face].inverse()])
                     adj_var = c_parameter_var(adj_coord, adj_tet)
 
-                    new_perm = []
-
-                    for i in range(4):
-                        if coord[i] % 2:
-                            new_perm.append(tet.gluing[face][i])
-                    n=[x for x in new_perm]
-                    n.sort()
-                    d = dict(zip(n,range(len(n))))
-                    new_perm = [d[x] for x in new_perm]
-                    l = 0
-                    for i in [(0,1),(0,2),(1,2)]:
-                        if i[1] < len(new_perm):
-                            if new_perm[i[0]] > new_perm[i[1]]:
-                                l = l + 1
-                            
-                    e.identify(self_var, adj_var, sign = (-1) ** l)
+                    # the sign of the gluing restricted to the odd
+                    # coordinates
+                    odd = sum([ 1 << i for i in range(4) if coord[i] % 2 ])
+                    sign = S4_restricted_signs[tet.gluing[face].number][odd]
+
+                    e.identify(self_var, adj_var, sign = sign)
 
     return e
 
 # gets eqns and equivalence relationship
 def identify_c_parameters(eqns, e):
-    d = e.dict_canonical_representatives_poly()
-    return [eqn.substitute(d) for eqn in eqns]
+    d = e.dict_canonical_representatives()
+    return [eqn.renameVariables(d) for eqn in eqns]
 
 def get_all_variables(poly_list):
-    variables = []
+    variables = set()
     for p in poly_list:
         assert isinstance(p, Polynomial)
-        variables = variables + p.variables()
-    variables = list(set(variables))
+        variables.update(p.variables())
+    variables = list(variables)
     variables.sort()
     return variables
 
+# removes duplicate equations keeping the first occurrence of each
+def remove_duplicate_eqns(eqns):
+    """
+    >>> eqns = [Polynomial.parseFromMagma(s) for s in ['x - y', 'y - x', 'x - y']]
+    >>> [str(eqn) for eqn in remove_duplicate_eqns(eqns)]
+    ['x - y', '- x + y']
+    """
+    seen = set()
+    result = []
+    for eqn in eqns:
+        if not eqn in seen:
+            seen.add(eqn)
+            result.append(eqn)
+    return result
+
 def polynomialNonZeroCondition(eqns, var, andNonOne = False):
     variables = get_all_variables(eqns)
 
-    prod = Polynomial.fromVariableName(var)
+    prod = PolynomialBuilder(Polynomial.fromVariableName(var))
 
     for i in variables:
-        prod = prod * Polynomial.fromVariableName(i)
+        prod.imul_by_monomial(Monomial.fromVariableName(i))
         if andNonOne:
-            prod = prod * (Polynomial.constantPolynomial(1) -
-                           Polynomial.fromVariableName(i))
+            prod.imul(Polynomial.constantPolynomial(1) -
+                      Polynomial.fromVariableName(i))
+
+    prod.add_monomial(Monomial.constantMonomial(-1))
 
-    return prod - Polynomial.constantPolynomial(1)
+    return prod.freeze()
 
 # Part II
 # Procedures needed to process the solutions of the Ptolemy variety
@@ -472,22 +504,10 @@ def check_solution_identification(t, N, solution):
                                                 in tet.gluing[face].inverse()])
                     adj_var = c_parameter_var(adj_coord, adj_tet)
 
-                    new_perm = []
-
-                    for i in range(4):
-                        if coord[i] % 2:
-                            new_perm.append(tet.gluing[face][i])
-                    n=[x for x in new_perm]
-                    n.sort()
-                    d = dict(zip(n,range(len(n))))
-                    new_perm = [d[x] for x in new_perm]
-                    l = 0
-                    for i in [(0,1),(0,2),(1,2)]:
-                        if i[1] < len(new_perm):
-                            if new_perm[i[0]] > new_perm[i[1]]:
-                                l = l + 1
-                            
-                    sign = (-1) ** l
+                    # the sign of the gluing restricted to the odd
+                    # coordinates
+                    odd = sum([ 1 << i for i in range(4) if coord[i] % 2 ])
+                    sign = S4_restricted_signs[tet.gluing[face].number][odd]
 
                     if not pari_eval_bool("abs( (%s) * (%s) - (%s) ) < (%s)" % 
                                           (sign,
@@ -1,5 +1,8 @@
+import collections
 import copy
+import itertools
 import operator
+import weakref
 import globalsettings
 
 def left_out_number(l):
@@ -13,6 +16,47 @@ def left_out_number(l):
         i = i + 1
     return i
 
+def union_find_labels(n,pairs):
+    """
+    Labels 0, ..., n-1 by the classes of the equivalence relation generated
+    by pairs, the classes are numbered in the order of their smallest
+    element.
+
+    >>> union_find_labels(6,[(0,3),(5,1),(3,5)])
+    [0, 0, 1, 0, 2, 0]
+    """
+    parent=range(n)
+
+    def find(x):
+        while not parent[x]==x:
+            parent[x]=parent[parent[x]]
+            x=parent[x]
+        return x
+
+    # the root of each class is its smallest element
+    for a, b in pairs:
+        a=find(a)
+        b=find(b)
+        if a<b:
+            parent[b]=a
+        elif b<a:
+            parent[a]=b
+
+    labels=[]
+    numbers={}
+    for x in range(n):
+        root=find(x)
+        if not root in numbers:
+            numbers[root]=len(numbers)
+        labels.append(numbers[root])
+    return labels
+
+# the oriented edges of a tetrahedron, the first six are oriented by the
+# vertex order
+oriented_edges=[(0,1),(0,2),(0,3),(1,2),(1,3),(2,3),
+                (1,0),(2,0),(3,0),(2,1),(3,1),(3,2)]
+oriented_edge_numbers=dict([(e,k) for k, e in enumerate(oriented_edges)])
+
 class edge(list):
     def __init__(self,tetrahedron,vert_0,vert_1):
         super(edge,self).__init__((tetrahedron,vert_0,vert_1))
@@ -62,7 +106,36 @@ class face_class(list):
     def orient(self):
         return self[4]
 
+### The elements of S4 are numbered 0, ..., 23 in lexicographic order of
+### their images. The following tables give the products, inverses and
+### signs by number, S4[n] is the (shared) permutation with number n.
+
+S4_images = list(itertools.permutations(range(4)))
+S4_numbers = dict([ (p, n) for n, p in enumerate(S4_images) ])
+S4_products = [ [ S4_numbers[tuple([ p[q[x]] for x in range(4) ])]
+                  for q in S4_images ]
+                for p in S4_images ]
+S4_inverses = [ S4_products[n].index(0) for n in range(24) ]
+S4_signs = [ (-1) ** len([ (i, j) for i in range(4) for j in range(i + 1, 4)
+                           if p[i] > p[j] ])
+             for p in S4_images ]
+# S4_restricted_signs[n][mask] is the sign of the order of the images
+# under permutation n of the positions i with bit i of mask set
+S4_restricted_signs = [
+    [ (-1) ** len([ (i, j) for i in range(4) for j in range(i + 1, 4)
+                    if (mask >> i) & 1 and (mask >> j) & 1 and p[i] > p[j] ])
+      for mask in range(16) ]
+    for p in S4_images ]
+
 class permutation(list):
+    """
+    A facade for an element of S4 using the tables above.
+
+    >>> p = permutation("1023")
+    >>> p.number, p.sign(), p.inverse(), p * permutation([0,2,3,1])
+    (6, -1, permutation([1, 0, 2, 3]), permutation([1, 2, 3, 0]))
+    """
+
     def __init__(self,p=[0,1,2,3]):
         """
         permutation("0132")
@@ -72,39 +145,80 @@ class permutation(list):
             super(permutation,self).__init__(map(int,p))
         else:
             super(permutation,self).__init__(p)
+        self.number=S4_numbers[tuple(self)]
     def inverse(self):
-        inv=[0 for i in range(len(self))]
-        for i in range(len(self)):
-            inv[self[i]]=i
-        return permutation(inv)
+        return S4[S4_inverses[self.number]]
     def is_odd(self):
-        l = 0
-        for i in [(0,1),(0,2),(0,3),(1,2),(1,3),(2,3)]:
-            if self[i[0]] > self[i[1]]:
-                l = l + 1
-        return bool(l % 2)
+        return S4_signs[self.number] < 0
     def is_even(self):
         return not self.is_odd()
     def sign(self):
-        if self.is_odd():
-            return -1
-        else:
-            return +1
+        return S4_signs[self.number]
     def __mul__(self,other):
         assert isinstance(other,permutation)
-        assert len(self)==len(other)
-        return permutation([self[other[x]] for x in range(len(self))])
+        return S4[S4_products[self.number][other.number]]
     def __repr__(self):
         return "permutation(%s)" % super(permutation,self).__repr__()
 
+# The shared permutations must not be modified.
+S4 = [ permutation(list(p)) for p in S4_images ]
+
+def S4_element(p):
+    """
+    The shared permutation given as permutation, list or string like "0132".
+    """
+    if isinstance(p,permutation):
+        return S4[p.number]
+    return S4[S4_numbers[tuple(map(int,p))]]
+
+# The neighbors and gluings of a tetrahedron, changing an entry drops the
+# cached invariants of the triangulation the tetrahedron belongs to.
+class _GluingData(list):
+    def __init__(self,values,tet):
+        list.__init__(self,values)
+        self._tet=tet
+
+    def __setitem__(self,k,value):
+        list.__setitem__(self,k,value)
+        self._tet._gluings_changed()
+
+    def __setslice__(self,i,j,values):
+        list.__setslice__(self,i,j,values)
+        self._tet._gluings_changed()
+
+# the attributes of a tetrahedron the invariants of a triangulation depend on
+_gluing_attributes=['neighbor_index','gluing','positive_orientation']
+
 class tetrahedron:
+    """
+    A tetrahedron of a triangulation. Changing neighbor_index, gluing or
+    positive_orientation (or an entry of the first two) drops the cached
+    invariants of the triangulation, see triangulation.invariant.
+
+    >>> dir = globalsettings.getSetting("testTriangulationsPath")
+    >>> t=read_triangulation_from_file(dir + "/m003.trig")
+    >>> len(t.get_face_classes())
+    4
+    >>> t[0].gluing[0]=permutation([0,1,2,3]); t[0].neighbor_index[0]=0
+    >>> t.cache_misses['face_classes']
+    1
+    >>> len(t.get_face_classes()), t.cache_misses['face_classes']
+    (4, 2)
+    >>> t[0].positive_orientation=False
+    >>> t.is_ordered(), t.cache_misses['is_ordered']
+    (False, 1)
+    >>> t[1].neighbor_index=[1,1,1,1]
+    >>> len(t.get_face_classes()), t.cache_misses['face_classes']
+    (5, 3)
+    """
+
     def __init__(self,index,neighbor_index,gluing,
                  cusp_index=[-1,-1,-1,-1],positive_orientation=True,
                  peripheral_curves = None):
         self.index=index
         self.neighbor_index=neighbor_index
         self.cusp_index=cusp_index
-        self.gluing=map(permutation,gluing)
+        self.gluing=map(S4_element,gluing)
         self.positive_orientation = bool(positive_orientation)
         self.edge_orientation=[[0 for y in range(4)] for x in range(4)]
         if peripheral_curves:
@@ -117,6 +231,22 @@ class tetrahedron:
                                       for a in range(2)]
         # marks whether edge from x and y is oriented positive or not
 
+    def __setattr__(self,name,value):
+        if name in ['neighbor_index','gluing']:
+            value=_GluingData(value,self)
+        self.__dict__[name]=value
+        if name in _gluing_attributes:
+            self._gluings_changed()
+
+    def _gluings_changed(self):
+        # a weak reference so that copying a tetrahedron does not copy its
+        # triangulation, see triangulation._adopt_tetrahedra
+        t=self.__dict__.get('_triangulation')
+        if t:
+            t=t()
+            if t is not None:
+                t.invalidate_invariants()
+
     def __repr__(self):
         return ("tetrahedron(index=%d,neighbor_index=%s,gluing=%s,"
                 "cusp_index=%s,positive_orientation=%s)"
@@ -193,74 +323,66 @@ class triangulation:
         self.reorder_tets(perms)
     
     def orient(self):
-
-        oriented_tets = [set([])]
-
-        def orient_tet(tet,
-                       positive_orientation=True,
-                       tets = self.tet_list,
-                       oriented_tets = oriented_tets):
-
-            if not tet.index in oriented_tets[0]:
-                tet.positive_orientation = positive_orientation
-                oriented_tets[0] = oriented_tets[0] | set([tet.index])
-                for face_index in range(4):
-                    orient_tet(tets[tet.neighbor_index[face_index]],
-                               bool(positive_orientation ^ tet.gluing[face_index].is_even()))
-
-        orient_tet(self.tet_list[0])
+        # breadth first search from tetrahedron 0, the orientation changes
+        # along faces glued by even permutations
+        tets=self.tet_list
+        orientations=[None for tet in tets]
+        if orientations:
+            orientations[0]=True
+        queue=collections.deque([0] if orientations else [])
+        while queue:
+            tet=tets[queue.popleft()]
+            positive_orientation=orientations[tet.index]
+            for face_index in range(4):
+                neighbor=tet.neighbor_index[face_index]
+                if orientations[neighbor] is None:
+                    orientations[neighbor]=bool(
+                        positive_orientation ^
+                        (S4_signs[tet.gluing[face_index].number] > 0))
+                    queue.append(neighbor)
+
+        for tet, positive_orientation in zip(tets,orientations):
+            if not positive_orientation is None:
+                tet.positive_orientation=positive_orientation
+        self.invalidate_invariants()
     
     def allTetsPositiveOrientation(self):
-        self.orient()
-        return reduce(
-            operator.and_,
-            [tet.positive_orientation for tet in self.tet_list],
-            True)
+        def compute():
+            self.orient()
+            return reduce(
+                operator.and_,
+                [tet.positive_orientation for tet in self.tet_list],
+                True)
+        return self.invariant('all_tets_positive_orientation',compute)
         
     def cusp_structure(self):
-        self.num_or_cusps=0
-        self.num_nonor_cusps=0
-        
-        def one_vertex(tet_index,vert_index,cusp_index,tet_list=self.tet_list):
-            if tet_list[tet_index].cusp_index[vert_index]==-1:
-                tet_list[tet_index].cusp_index[vert_index]=cusp_index
-                for face_index in range(4):
-                    if not face_index==vert_index:
-                        one_vertex(tet_list[tet_index].neighbor_index[face_index],
-                                   tet_list[tet_index].gluing[face_index][vert_index],
-                                   cusp_index)
-        for tet in self.tet_list:
-            for vert_index in range(4):
-                tet.cusp_index[vert_index]=-1
-                
+        return list(self.invariant('cusp_structure',self._cusp_structure))
+
+    def _cusp_structure(self):
+        vertex_labels=self.get_class_labels()[2]
+        edge_labels=self.get_class_labels()[0]
+
         for tet in self.tet_list:
             for vert_index in range(4):
-                if tet.cusp_index[vert_index]==-1:
-                    one_vertex(tet.index,vert_index,self.num_or_cusps)
-                    self.num_or_cusps += 1
-
-        def get_euler(cusp_index,
-                      tet_list=self.tet_list,
-                      edge_classes=self.get_edge_classes(both_orientations=True)):
-            verts=[]
-            no_verts=0
-            triangs=0
-            for tet in tet_list:
-                for vert_index in range(4):
-                    if tet.cusp_index[vert_index]==cusp_index:
-                        # for every vertex of every tetrahedron belonging to the cusp
-                        triangs += 1
-                        for vert2_index in range(4):
-                            if not vert2_index==vert_index:
-                                for edge_class in edge_classes:
-                                    if edge(tet.index,
-                                            vert_index,
-                                            vert2_index) in edge_class:
-                                        if not edge_class in verts:
-                                            verts.append(edge_class)
-                                            no_verts += 1
-            assert triangs % 2 == 0, "odd number of triangles"
-            return no_verts - (triangs/2)
+                tet.cusp_index[vert_index]=vertex_labels[4*tet.index+vert_index]
+        self.num_or_cusps=max(vertex_labels)+1 if vertex_labels else 0
+        self.num_nonor_cusps=0
+
+        # the vertices of the triangulation of a cusp are the edge classes
+        # starting at the cusp, the triangles are the vertices of
+        # tetrahedra in the cusp
+        verts=[set() for x in range(self.num_or_cusps)]
+        triangs=[0 for x in range(self.num_or_cusps)]
+        for v, cusp_index in enumerate(vertex_labels):
+            triangs[cusp_index] += 1
+        for slot, edge_label in enumerate(edge_labels):
+            tet_index, k = divmod(slot,12)
+            vert_index=oriented_edges[k][0]
+            verts[vertex_labels[4*tet_index+vert_index]].add(edge_label)
+
+        def get_euler(cusp_index):
+            assert triangs[cusp_index] % 2 == 0, "odd number of triangles"
+            return len(verts[cusp_index]) - (triangs[cusp_index]/2)
 
         self.cusp_shape=[('torus',0.0,0.0) for x in range(self.num_or_cusps)]
         return [get_euler(x) for x in range(self.num_or_cusps)]
@@ -273,57 +395,79 @@ class triangulation:
 
     def __init__(self,s=None):
         self.tet_list=[]
+        self.invalidate_invariants()
+        self.cache_hits={}
+        self.cache_misses={}
+        self.check_invariants=False
 
         if isinstance(s, triangulation):
             for k, v in s.__dict__.items():
                 self.__dict__[k] = copy.deepcopy(v)
         elif isinstance(s,str):
-            l=s.split('\n')
-            self.comment_line=l[0].split()
-            self.name=l[1]
-            self.solution_type=l[2]
-            self.orientation=l[3]
-            self.cs=l[4]
-            l=' '.join(l[5:])
-            l=l.split()
-            self.num_or_cusps=int(l[0])
-            self.num_nonor_cusps=int(l[1])
-
-            self.num_or_cusps = self.num_or_cusps + self.num_nonor_cusps
-            self.num_nonor_cusps = 0
-
-            self.cusp_shape=[]
-            l=l[2:]
-            for i in range(self.num_or_cusps+self.num_nonor_cusps):
-                self.cusp_shape.append((l[0],float(l[1]),float(l[2])))
-                l=l[3:]
-            self.num_tets=int(l[0])
-            l=l[1:]
-            for i in range(self.num_tets):
-                positive_orientation=True
-                if (len(self.comment_line)>2+i and 
-                    self.comment_line[1]=='orientations:' and 
-                    self.comment_line[2+i]=='negative'):
-                    positive_orientation=False
-                if (len(self.comment_line)>3+i and 
-                    self.comment_line[2]=='orientations:' and 
-                    self.comment_line[3+i]=='negative'):
-                    positive_orientation=False
-                self.tet_list.append(
-                    tetrahedron(index = i,
-                                neighbor_index = map(int,l[0:4]),
-                                gluing = l[4:8],
-                                cusp_index = map(int,l[8:12]),
-                                peripheral_curves = 
-                                 [[[[int(l[12+16*merdLong+8*handedness+4*vert+face])
-                                     for face in range(4)]
-                                    for vert in range(4)]
-                                   for handedness in range(2)]
-                                  for merdLong in range(2)],
-                                positive_orientation = positive_orientation))
-                l=l[4*3+4*16+2:]
-        else:
+            self.tet_list=[tetrahedron(index = i, **data)
+                           for i, data in enumerate(self.read_SnapPea(s))]
+        elif not s is None:
             raise ValueError, "Argument to constructor needs to be a string or a triangulation"
+        self._adopt_tetrahedra()
+
+    # lets the tetrahedra in tet_list drop the cached invariants when their
+    # gluings change, needs to be called when tet_list is replaced
+    def _adopt_tetrahedra(self):
+        owner=weakref.ref(self)
+        for tet in self.tet_list:
+            tet._triangulation=owner
+
+    def read_SnapPea(self,s):
+        """
+        Sets the attributes given by the header of the SnapPea triangulation
+        file s and returns an iterator yielding the keyword arguments of
+        tetrahedron (except for index) for each tetrahedron.
+        """
+        l=s.split('\n')
+        self.comment_line=l[0].split()
+        self.name=l[1]
+        self.solution_type=l[2]
+        self.orientation=l[3]
+        self.cs=l[4]
+        l=' '.join(l[5:])
+        l=l.split()
+        self.num_or_cusps=int(l[0])
+        self.num_nonor_cusps=int(l[1])
+
+        self.num_or_cusps = self.num_or_cusps + self.num_nonor_cusps
+        self.num_nonor_cusps = 0
+
+        self.cusp_shape=[]
+        pos=2
+        for i in range(self.num_or_cusps+self.num_nonor_cusps):
+            self.cusp_shape.append((l[pos],float(l[pos+1]),float(l[pos+2])))
+            pos=pos+3
+        self.num_tets=int(l[pos])
+        return self._iter_SnapPea_tetrahedra(l,pos+1)
+
+    def _iter_SnapPea_tetrahedra(self,l,pos):
+        for i in range(self.num_tets):
+            positive_orientation=True
+            if (len(self.comment_line)>2+i and 
+                self.comment_line[1]=='orientations:' and 
+                self.comment_line[2+i]=='negative'):
+                positive_orientation=False
+            if (len(self.comment_line)>3+i and 
+                self.comment_line[2]=='orientations:' and 
+                self.comment_line[3+i]=='negative'):
+                positive_orientation=False
+            yield dict(
+                neighbor_index = map(int,l[pos:pos+4]),
+                gluing = l[pos+4:pos+8],
+                cusp_index = map(int,l[pos+8:pos+12]),
+                peripheral_curves = 
+                 [[[[int(l[pos+12+16*merdLong+8*handedness+4*vert+face])
+                     for face in range(4)]
+                    for vert in range(4)]
+                   for handedness in range(2)]
+                  for merdLong in range(2)],
+                positive_orientation = positive_orientation)
+            pos=pos+4*3+4*16+2
 
     def to_SnapPea(self):
         out = "% Triangulation orientations:"
@@ -352,24 +496,23 @@ class triangulation:
     def check_consistency(self):
         assert len(self.tet_list) == self.num_tets
         for tet_index in range(self.num_tets):
+            tet=self.tet_list[tet_index]
             for face_index in range(4):
-                tet=self.tet_list[tet_index]
+                gluing=tet.gluing[face_index]
                 new_tet_index=tet.neighbor_index[face_index]
-                new_face_index=tet.gluing[face_index][face_index]
+                new_face_index=gluing[face_index]
                 new_tet=self.tet_list[new_tet_index]
                 assert (
-                    self.tet_list[new_tet_index].positive_orientation ==
+                    new_tet.positive_orientation ==
                     tet.positive_orientation ^
-                    tet.gluing[face_index].is_even())
+                    (S4_signs[gluing.number] > 0))
                 
-                for vert_index in range(4):
-                    new_vert_index=tet.gluing[face_index][vert_index]
-                    assert (tet_index==
-                            new_tet.neighbor_index[new_face_index])
-                    assert (face_index==
-                            new_tet.gluing[new_face_index][new_face_index])
-                    assert (vert_index==
-                            new_tet.gluing[new_face_index][new_vert_index])
+                assert (tet_index==
+                        new_tet.neighbor_index[new_face_index])
+                # the gluing back is the inverse, this includes
+                # that new_tet is glued back along new_face_index
+                assert (S4_products[new_tet.gluing[new_face_index].number]
+                                   [gluing.number] == 0)
 
     # vertex i of tet j will be named vertex perm[j][i]
     def reorder_tets(self,perms_or_edge_ordering):
@@ -383,32 +526,38 @@ class triangulation:
         
         inv_perms=[perm.inverse() for perm in perms]
 
+        # the face inv_perms[tet.index][i] of tet is glued to the neighbor
+        # by the gluing g, the new gluing of face i is perms[neighbor] * g *
+        # inv_perms[tet.index]
         def new_tet(tet,s=self,inv_perms=inv_perms,perms=perms):
+            inv_perm=inv_perms[tet.index]
+            neighbors=[tet.neighbor_index[inv_perm[i]] for i in range(4)]
             return tetrahedron(
                 tet.index,
-                neighbor_index=[
-                    tet.neighbor_index[inv_perms[tet.index][i]]
-                    for i in range(4)],
+                neighbor_index=neighbors,
                 gluing=[
-                    permutation(
-                        [
-                        perms[tet.neighbor_index[inv_perms[tet.index][i]]]
-                             [tet.gluing[inv_perms[tet.index][i]]
-                                        [inv_perms[tet.index][j]]]
-                        for j in range(4)])
+                    S4[S4_products[
+                            S4_products[perms[neighbors[i]].number]
+                                       [tet.gluing[inv_perm[i]].number]]
+                                  [inv_perm.number]]
                     for i in range(4)],
-                cusp_index=[tet.cusp_index[inv_perms[tet.index][i]]
+                cusp_index=[tet.cusp_index[inv_perm[i]]
                             for i in range(4)],
                 positive_orientation=(tet.positive_orientation
                                       ^ perms[tet.index].is_odd()))
         
         new_tet_list = [new_tet(tet) for tet in self.tet_list]
         self.tet_list=new_tet_list
+        self._adopt_tetrahedra()
+        self.invalidate_invariants()
                     
     def __repr__(self):
         return str(self.tet_list)
     
     def is_ordered(self):
+        return self.invariant('is_ordered',self._is_ordered)
+
+    def _is_ordered(self):
         for i in self.tet_list:
             for j in range(4):
                 g=i.gluing[j]
@@ -427,26 +576,150 @@ class triangulation:
                                             [left_out_number([v0,v1,face])])
         return next_tet,next_vert0,next_vert1,next_face
 
-    def get_face_classes(self):
-        face_classes = []
-        processed_faces = set()
+    def invariant(self,name,compute):
+        """
+        Returns the combinatorial invariant called name, calling compute()
+        only if it is not cached yet. The cache is dropped by reorder_tets
+        and orient and whenever the neighbors, gluings or orientations of
+        the tetrahedra are changed (see tetrahedron, the views of a
+        CompactTriangulation do the same). Code replacing tet_list has to
+        call invalidate_invariants. If check_invariants is set, every
+        lookup checks that the gluings did not change since the cache was
+        filled, this is slow and meant for debugging.
+        The invariants are shared, so they must not be modified.
+
+        cache_hits and cache_misses count the lookups by name.
+
+        >>> dir = globalsettings.getSetting("testTriangulationsPath")
+        >>> t=read_triangulation_from_file(dir + "/m003.trig")
+        >>> len(t.get_face_classes()), len(t.get_face_classes())
+        (4, 4)
+        >>> t.cache_hits['face_classes'], t.cache_misses['face_classes']
+        (1, 1)
+        >>> t.orient()
+        >>> len(t.get_face_classes())
+        4
+        >>> t.cache_hits['face_classes'], t.cache_misses['face_classes']
+        (1, 2)
+        >>> t.check_invariants=True
+        >>> len(t.get_face_classes())
+        4
+        >>> list.__setitem__(t[0].gluing,0,permutation([0,1,2,3]))
+        >>> t.get_face_classes()
+        Traceback (most recent call last):
+        ...
+        AssertionError: Gluings changed without invalidate_invariants
+        >>> t.invalidate_invariants()
+        >>> len(t.get_face_classes())
+        4
+        """
+        if self.check_invariants:
+            self._check_invariants_key()
+        if name in self._invariants:
+            self.cache_hits[name]=self.cache_hits.get(name,0)+1
+            return self._invariants[name]
+        self.cache_misses[name]=self.cache_misses.get(name,0)+1
+        value=compute()
+        if self.check_invariants:
+            # compute might have changed the triangulation, e.g. by orient
+            self._check_invariants_key()
+        self._invariants[name]=value
+        return value
+
+    def invalidate_invariants(self):
+        """
+        Drops the cached invariants, see invariant.
+        """
+        self._invariants={}
+        self._invariants_key=None
+
+    # the debugging check of invariant
+    def _check_invariants_key(self):
+        key=self._gluing_fingerprint()
+        if self._invariants and not self._invariants_key is None:
+            assert self._invariants_key==key, (
+                "Gluings changed without invalidate_invariants")
+        self._invariants_key=key
+
+    # the data of the tetrahedra the invariants depend on
+    def _gluing_fingerprint(self):
+        return tuple([
+                (tuple(tet.neighbor_index),
+                 tuple([g.number for g in tet.gluing]),
+                 tet.positive_orientation)
+                for tet in self.tet_list])
+
+    def get_class_labels(self):
+        """
+        Labels the classes of oriented edges, faces and vertices under the
+        gluings with one union-find pass over the slots of the tetrahedra.
+        Returns (edge_labels, face_labels, vertex_labels) such that
+        edge_labels[12*i+k] is the class of the edge oriented_edges[k] of
+        tetrahedron i, face_labels[4*i+f] the class of face f and
+        vertex_labels[4*i+v] the class (cusp) of vertex v. The classes are
+        numbered in order of their first slot.
+
+        The result is cached, see invariant.
+
+        >>> dir = globalsettings.getSetting("testTriangulationsPath")
+        >>> t=read_triangulation_from_file(dir + "/m003.trig")
+        >>> edge_labels, face_labels, vertex_labels = t.get_class_labels()
+        >>> face_labels
+        [0, 1, 2, 3, 0, 1, 2, 3]
+        >>> max(edge_labels) + 1, max(vertex_labels) + 1
+        (4, 1)
+        """
+        return self.invariant('class_labels',self._class_labels)
+
+    def _class_labels(self):
+        edge_pairs=[]
+        face_pairs=[]
+        vertex_pairs=[]
         for tet in self.tet_list:
+            i=tet.index
             for f in range(4):
-                if not (tet.index,f) in processed_faces:
-                    #gluing = [(x-1 if x > tet.gluing[f][f] else x) for x in tet.gluing[f] if not x == tet.gluing[f][f]]
-                    #if gluing in [ [0,1,2], [1,2,0], [2,0,1] ]:
-                    #    orient = +1
-                    #else:
-                    #    orient = -1
-                    orient = tet.gluing[f].sign() # does not work
-                    face_classes.append(face_class(tet.index,
-                                                   f,
-                                                   tet.neighbor_index[f],
-                                                   tet.gluing[f][f],
-                                                   orient))
-                    processed_faces.add((tet.index,f))
-                    processed_faces.add((tet.neighbor_index[f],
-                                         tet.gluing[f][f]))
+                g=tet.gluing[f]
+                n=tet.neighbor_index[f]
+                face_pairs.append((4*i+f,4*n+g[f]))
+                for v in range(4):
+                    if not v==f:
+                        vertex_pairs.append((4*i+v,4*n+g[v]))
+            for k, (v0, v1) in enumerate(oriented_edges):
+                for f in range(4):
+                    if not f in (v0,v1):
+                        g=tet.gluing[f]
+                        edge_pairs.append(
+                            (12*i+k,
+                             12*tet.neighbor_index[f]+
+                             oriented_edge_numbers[(g[v0],g[v1])]))
+        num_tets=len(self.tet_list)
+        return (
+            union_find_labels(12*num_tets,edge_pairs),
+            union_find_labels(4*num_tets,face_pairs),
+            union_find_labels(4*num_tets,vertex_pairs))
+
+    def get_face_classes(self):
+        return list(self.invariant('face_classes',self._face_classes))
+
+    def _face_classes(self):
+        face_labels=self.get_class_labels()[1]
+        face_classes = []
+        for slot, label in enumerate(face_labels):
+            # the first face of each class
+            if label == len(face_classes):
+                tet=self.tet_list[slot // 4]
+                f=slot % 4
+                #gluing = [(x-1 if x > tet.gluing[f][f] else x) for x in tet.gluing[f] if not x == tet.gluing[f][f]]
+                #if gluing in [ [0,1,2], [1,2,0], [2,0,1] ]:
+                #    orient = +1
+                #else:
+                #    orient = -1
+                orient = tet.gluing[f].sign() # does not work
+                face_classes.append(face_class(tet.index,
+                                               f,
+                                               tet.neighbor_index[f],
+                                               tet.gluing[f][f],
+                                               orient))
         return face_classes
     
     def get_edge_class(self,tet,vert0,vert1):
@@ -465,27 +738,108 @@ class triangulation:
         on each edge.
         I.e. the edge in each edge class will be 01, 02, 03, 12, 13, 23.
         """
-        
+
+        if both_orientations:
+            name='edge_classes_both_orientations'
+        else:
+            name='edge_classes'
+        edge_classes=list(self.invariant(
+                name,lambda:self._edge_classes(both_orientations)))
+        self.edge_classes=edge_classes
+        return edge_classes
+
+    def _edge_classes(self,both_orientations):
+        edge_labels=self.get_class_labels()[0]
+
+        members={}
+        for slot, label in enumerate(edge_labels):
+            tet_index, k = divmod(slot,12)
+            members.setdefault(label,[]).append(
+                edge(tet_index,*oriented_edges[k]))
+
         if both_orientations:
-            the_edges=[(0,1),(0,2),(0,3),(1,2),(1,3),(2,3),
-                       (1,0),(2,0),(3,0),(2,1),(3,1),(3,2)]
+            the_edges=range(12)
         else:
-            the_edges=[(0,1),(0,2),(0,3),(1,2),(1,3),(2,3)]
-       
-        processed_edges=set()
+            the_edges=range(6)
+
+        processed_labels=set()
         edge_classes=[]
-        for i in range(self.num_tets):
-            for j, k in the_edges:
-                if not edge(i,j,k) in processed_edges:
-                    e=self.get_edge_class(i,j,k)
+        for i in range(len(self.tet_list)):
+            for k in the_edges:
+                label=edge_labels[12*i+k]
+                if not label in processed_labels:
+                    e=members[label]
                     e.sort()
                     edge_classes.append(e)
-                    processed_edges=processed_edges | set(e)
+                    processed_labels.add(label)
                     if not both_orientations:
-                        processed_edges=processed_edges | set([ed.flip() for ed in e])
-        self.edge_classes=edge_classes
+                        # the class of the flipped edges
+                        processed_labels.add(edge_labels[12*i+k+6])
         return edge_classes
 
+    def combinatorial_automorphisms(self):
+        """
+        Lists the combinatorial automorphisms of the triangulation which
+        preserve the vertex labels of the tetrahedra. Each automorphism is
+        a list sigma mapping the index of a tetrahedron to the index of its
+        image such that tetrahedron sigma[i] is glued along face f to
+        tetrahedron sigma[j] with the same permutation as tetrahedron i is
+        glued to tetrahedron j. The identity comes first.
+
+        >>> dir = globalsettings.getSetting("testTriangulationsPath")
+        >>> t=read_triangulation_from_file(dir + "/m003.trig")
+        >>> t.combinatorial_automorphisms()
+        [[0, 1], [1, 0]]
+        >>> t=read_triangulation_from_file(dir + "/m053.trig")
+        >>> t.combinatorial_automorphisms()
+        [[0, 1, 2, 3]]
+        >>> t=read_triangulation_from_file(dir + "/m003_triple_cover.trig")
+        >>> t.combinatorial_automorphisms()
+        [[0, 1, 2, 3, 4, 5], [1, 0, 5, 4, 3, 2], [2, 3, 4, 5, 0, 1], [3, 2, 1, 0, 5, 4], [4, 5, 0, 1, 2, 3], [5, 4, 3, 2, 1, 0]]
+        """
+
+        # the triangulation is connected, so an automorphism is determined
+        # by the image of tetrahedron 0
+        automorphisms = []
+        for image in range(self.num_tets):
+            sigma = self.extend_automorphism(image)
+            if sigma:
+                automorphisms.append(sigma)
+        return automorphisms
+
+    def extend_automorphism(self,image):
+        """
+        Returns the automorphism (see combinatorial_automorphisms) mapping
+        tetrahedron 0 to tetrahedron image or None if there is none.
+        """
+
+        sigma = [None for i in range(self.num_tets)]
+        sigma[0] = image
+        used = set([image])
+        todo = [0]
+
+        while todo:
+            tet = self.tet_list[todo.pop()]
+            tet_image = self.tet_list[sigma[tet.index]]
+            for face_index in range(4):
+                if not (tet.gluing[face_index].number ==
+                        tet_image.gluing[face_index].number):
+                    return None
+                neighbor = tet.neighbor_index[face_index]
+                neighbor_image = tet_image.neighbor_index[face_index]
+                if sigma[neighbor] is None:
+                    if neighbor_image in used:
+                        return None
+                    sigma[neighbor] = neighbor_image
+                    used.add(neighbor_image)
+                    todo.append(neighbor)
+                elif not sigma[neighbor] == neighbor_image:
+                    return None
+
+        if None in sigma:
+            return None
+        return sigma
+
     def turn_edge_ordering_into_relabel_tets(self,edge_ordering):
         edge_ordering_tet=[[] for i in range(self.num_tets)]
         for i in edge_ordering: